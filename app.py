@@ -1,27 +1,60 @@
 """Main Flask application for Adik Tiri yang Nakal visual novel."""
 from __future__ import annotations
 
+import atexit
+import hmac
+import io
 import json
 import logging
+import math
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
+import click
 import eventlet
-from flask import Flask, jsonify, redirect, render_template, request, send_file, session, url_for
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    send_from_directory,
+    session,
+    stream_with_context,
+    url_for,
+)
 from flask_caching import Cache
 from flask_login import LoginManager, UserMixin, current_user, login_required, login_user, logout_user
 from flask_socketio import SocketIO, emit, join_room
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from story_engine.achievement_system import AchievementSystem
-from story_engine.flag_manager import FlagManager
+from story_engine.compiled_story import write_compiled_story
+from story_engine.flag_manager import GameState, StateLayout, story_state_names
 from story_engine.inventory_system import InventorySystem
 from story_engine.relationship_system import RelationshipSystem
 from story_engine.save_manager import SaveManager
-from story_engine.story_loader import StoryLoader
+from story_engine.session_store import create_session_store
+from story_engine.story_analysis import analyze_story
+from story_engine.story_loader import TERMINAL_SCENES, StoryLoader
+from utils.asset_manifest import MANIFEST_NAME, AssetManifest
+from utils.db_profile import RoutingSession, install_pragmas, read_only, sqlite_config, supports_profile
+from utils.data_validator import validate_story
+from utils.emit_batcher import EmitBatcher
+from utils.http_cache import encode_variants, pick_variant
+from utils.instrumentation import Instrumentation
+from utils.password_hasher import HasherBusy, PasswordHasher
+from utils.rate_limit import TokenBucket
+from utils.save_archive import UploadTooLarge, read_saves, stream_zip
+from utils.text_to_speech import VoiceCache
+from utils.write_behind import WriteBehindQueue
 
 eventlet.monkey_patch()
 
@@ -37,7 +70,31 @@ app.config.update(
     SQLALCHEMY_DATABASE_URI=os.getenv("DATABASE_URL", config.get("database_url", "sqlite:///data/game.db")),
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
     MAX_CONTENT_LENGTH=16 * 1024 * 1024,
+    WRITE_BEHIND=os.getenv("WRITE_BEHIND", str(config.get("write_behind", False))).lower() in ("1", "true"),
+    WRITE_BEHIND_WINDOW=float(os.getenv("WRITE_BEHIND_WINDOW", config.get("write_behind_window", 0.5))),
+    STORY_CACHE_MAX_AGE=int(os.getenv("STORY_CACHE_MAX_AGE", config.get("story_cache_max_age", 300))),
+    VARIANT_MAX_AGE=365 * 24 * 3600,
+    PREFETCH_DEPTH=int(os.getenv("PREFETCH_DEPTH", config.get("prefetch_depth", 2))),
+    BULK_SCENE_LIMIT=int(config.get("bulk_scene_limit", 32)),
+    TTS_LANG=config.get("tts_lang", "id"),
+    TTS_VOICE=config.get("tts_voice", "com"),
+    PROFILE_SLOW_MS=float(os.getenv("PROFILE_SLOW_MS", config.get("profile_slow_ms", 0))),
+    PASSWORD_HASH_THREADS=int(os.getenv("PASSWORD_HASH_THREADS", config.get("password_hash_threads", 4))),
+    LOGIN_RATE_LIMIT=os.getenv("LOGIN_RATE_LIMIT", str(config.get("login_rate_limit", True))).lower() in ("1", "true"),
+    DB_PROFILE=os.getenv("DB_PROFILE", config.get("db_profile", "default")),
+    MAX_SAVE_SLOTS=int(config.get("max_save_slots", 20)),
+    SAVE_IMPORT_MAX_BYTES=int(os.getenv("SAVE_IMPORT_MAX_BYTES", config.get("save_import_max_bytes", 1024 * 1024))),
+    SOCKETIO_MESSAGE_QUEUE=os.getenv("SOCKETIO_MESSAGE_QUEUE", config.get("socketio_message_queue")),
+    METRICS_TOKEN=os.getenv("METRICS_TOKEN", config.get("metrics_token")),
 )
+if app.config["DB_PROFILE"] == "sqlite-tuned" and supports_profile(app.config["SQLALCHEMY_DATABASE_URI"]):
+    app.config.update(
+        sqlite_config(
+            app.config["SQLALCHEMY_DATABASE_URI"],
+            write_pool=int(config.get("db_write_pool", 4)),
+            read_pool=int(config.get("db_read_pool", 8)),
+        )
+    )
 
 Path(BASE_DIR / "data").mkdir(exist_ok=True)
 Path(BASE_DIR / "logs").mkdir(exist_ok=True)
@@ -49,11 +106,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+if "SQLALCHEMY_BINDS" in app.config:
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            install_pragmas(engine, read_only=bind_key is not None)
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
-cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+# serve.py switches to FileSystemCache so every worker shares one cache without an external service.
+cache_type = os.getenv("CACHE_TYPE", config.get("cache_type", "SimpleCache"))
+cache = Cache(
+    app,
+    config={
+        "CACHE_TYPE": cache_type,
+        "CACHE_DIR": os.getenv("CACHE_DIR", str(BASE_DIR / "instance" / "cache")),
+        "CACHE_THRESHOLD": int(config.get("cache_threshold", 10_000)),
+    },
+)
+# Game states get a cache of their own, so pruning story entries never evicts a player mid-game. Past the
+# threshold the least recently used states go first (CacheSessionStore refreshes an entry on every read).
+session_cache = Cache(
+    app,
+    config={
+        "CACHE_TYPE": cache_type,
+        "CACHE_DIR": os.getenv("SESSION_CACHE_DIR", str(BASE_DIR / "instance" / "sessions")),
+        "CACHE_THRESHOLD": int(config.get("session_cache_threshold", 100_000)),
+    },
+)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode="eventlet",
+    # e.g. redis://localhost:6379/0 so emits from any worker reach sockets held by the others.
+    message_queue=app.config["SOCKETIO_MESSAGE_QUEUE"],
+)
+emitter = EmitBatcher(
+    socketio,
+    tick=config.get("socketio_batch_tick", 0.02),
+    enabled=config.get("socketio_batch", True),
+)
+instrumentation = Instrumentation(
+    app,
+    profile_dir=BASE_DIR / "logs" / "profiles",
+    slow_ms=app.config["PROFILE_SLOW_MS"],
+)
+emitter.on_emit = instrumentation.record_emit
 
 
 class User(UserMixin, db.Model):
@@ -65,12 +162,15 @@ class User(UserMixin, db.Model):
 
 
 class SaveSlot(db.Model):
+    __table_args__ = (db.Index("ix_save_slot_user_slot", "user_id", "slot", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     slot = db.Column(db.Integer, nullable=False)
     chapter = db.Column(db.Integer, default=1)
     scene_id = db.Column(db.String(120), default="ch1_scene_1")
     payload = db.Column(db.Text, nullable=False)
+    base_payload = db.Column(db.Text, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
@@ -84,6 +184,8 @@ class UserSetting(db.Model):
 
 
 class UserAchievement(db.Model):
+    __table_args__ = (db.Index("ix_user_achievement_user_key", "user_id", "key", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     key = db.Column(db.String(120), nullable=False)
@@ -91,23 +193,233 @@ class UserAchievement(db.Model):
 
 
 class UserInventory(db.Model):
+    __table_args__ = (db.Index("ix_user_inventory_user_item", "user_id", "item_id", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     item_id = db.Column(db.String(120), nullable=False)
     qty = db.Column(db.Integer, default=1)
 
 
+# Statements that collapse duplicate rows left by databases created before the unique indexes.
+DEDUPE_STATEMENTS = (
+    "DELETE FROM save_slot WHERE id NOT IN (SELECT MAX(id) FROM save_slot GROUP BY user_id, slot)",
+    "DELETE FROM user_achievement WHERE id NOT IN (SELECT MIN(id) FROM user_achievement GROUP BY user_id, key)",
+    "UPDATE user_inventory SET qty = (SELECT SUM(dup.qty) FROM user_inventory AS dup "
+    "WHERE dup.user_id = user_inventory.user_id AND dup.item_id = user_inventory.item_id) "
+    "WHERE id IN (SELECT MAX(id) FROM user_inventory GROUP BY user_id, item_id)",
+    "DELETE FROM user_inventory WHERE id NOT IN (SELECT MAX(id) FROM user_inventory GROUP BY user_id, item_id)",
+)
+
+
+# Columns added after the first release, created in place on older databases.
+ADDED_COLUMNS = {
+    "save_slot": {"base_payload": "TEXT"},
+}
+
+
+def upgrade_schema() -> None:
+    db.create_all()
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        for statement in DEDUPE_STATEMENTS:
+            conn.execute(text(statement))
+        for model in (SaveSlot, UserAchievement, UserInventory):
+            for index in model.__table__.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def upsert(
+    model: type[db.Model],
+    index_elements: list[str],
+    values: dict[str, Any] | list[dict[str, Any]],
+    update: dict[str, Any] | Callable[[Any], dict[str, Any]] | None = None,
+):
+    insert = postgresql_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(model).values(values)
+    if callable(update):
+        update = update(stmt.excluded)
+    if update:
+        return stmt.on_conflict_do_update(index_elements=index_elements, set_=update)
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
 @login_manager.user_loader
 def load_user(user_id: str) -> User | None:
     return db.session.get(User, int(user_id))
 
 
-story_loader = StoryLoader(BASE_DIR / "story_data")
-flag_manager = FlagManager()
+STORY_DIR = BASE_DIR / "story_data"
+story_pack = os.getenv("STORY_PACK", config.get("story_pack"))
+story_compiled = os.getenv("STORY_COMPILED", config.get("story_compiled"))
+story_loader = StoryLoader(
+    STORY_DIR,
+    pack_path=Path(story_pack) if story_pack else None,
+    compiled_path=Path(story_compiled) if story_compiled else None,
+)
 relationship_system = RelationshipSystem()
-inventory_system = InventorySystem(BASE_DIR / "story_data" / "items" / "items.json")
-achievement_system = AchievementSystem(BASE_DIR / "story_data" / "events" / "achievements.json")
-save_manager = SaveManager()
+inventory_system = InventorySystem(STORY_DIR / "items" / "items.json")
+achievement_system = AchievementSystem(STORY_DIR / "events" / "achievements.json")
+asset_manifest = AssetManifest(BASE_DIR / "static" / "images" / "variants")
+voice_cache = VoiceCache(
+    Path(os.getenv("TTS_CACHE_DIR", BASE_DIR / "instance" / "voice")),
+    max_bytes=int(config.get("tts_cache_max_mb", 512)) * 1024 * 1024,
+)
+START_SCENE = config.get("default_scene", "ch1_scene_1")
+STATE_LAYOUT_PATH = STORY_DIR / "state_layout.json"
+state_layout = StateLayout.load(STATE_LAYOUT_PATH)
+if not story_loader.lazy:
+    # Never intern here: indexes given only in memory can differ from the ones a later compile-story
+    # persists, and compact saves written with them would then decode as other flags. Unknown names
+    # are kept by name (GameState.extra_flags/extra_stats) until the layout file is updated.
+    flags, stats = story_state_names(story_loader.iter_scenes())
+    unindexed = (flags - state_layout.flag_index.keys()) | (stats - state_layout.stat_index.keys())
+    if unindexed:
+        logger.warning(
+            "%s belum memuat %d flag/stat story; jalankan flask compile-story", STATE_LAYOUT_PATH.name, len(unindexed)
+        )
+save_manager = SaveManager(
+    codec=config.get("save_codec", "zlib"),
+    delta=config.get("save_delta", False),
+    layout=state_layout if config.get("save_compact", True) else None,
+)
+session_states = create_session_store(
+    os.getenv("SESSION_STORE", config.get("session_store", "memory")),
+    cache=session_cache,
+    ttl=config.get("session_state_ttl", 3600),
+    dumps=GameState.to_bytes,
+    loads=lambda raw: GameState.from_bytes(state_layout, raw),
+)
+
+
+def session_state(user_id: int) -> GameState | None:
+    """The player's server-side state, or None once it expired or was evicted.
+
+    Never substitutes an empty state: a save made from one would overwrite real progress.
+    """
+    state = session_states.get(user_id)
+    if state is None or isinstance(state, GameState):
+        return state
+    state = GameState.from_dict(state_layout, state)
+    session_states.set(user_id, state)
+    return state
+
+
+def new_game_state() -> GameState:
+    state = GameState(state_layout)
+    state.scene_id = START_SCENE
+    return state
+
+
+def state_missing() -> tuple[Response, int]:
+    return jsonify({"error": "State permainan tidak ditemukan, mulai game baru atau muat save"}), 409
+
+
+def story_response(name: str, producer: Any):
+    """Serve static story data from pre-encoded bodies, answering conditional requests with 304."""
+    key = f"story:{story_loader.version}:{name}"
+    variants = cache.get(key)
+    if variants is None:
+        data = producer()
+        if data is None:
+            return None
+        variants = encode_variants(jsonify(data).get_data())
+        cache.set(key, variants, timeout=0)
+
+    encoding, body, etag = pick_variant(variants, request.accept_encodings)
+    response = Response(status=304) if etag in request.if_none_match else Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config["STORY_CACHE_MAX_AGE"]
+    response.vary.add("Accept-Encoding")
+    if encoding != "identity" and response.status_code == 200:
+        response.content_encoding = encoding
+    return response
+
+
+def save_values(user_id: int, slot: int, data: dict[str, Any]) -> dict[str, Any]:
+    previous = None
+    if save_manager.delta:
+        previous = db.session.execute(
+            db.select(SaveSlot.payload, SaveSlot.base_payload).filter_by(user_id=user_id, slot=slot)
+        ).first()
+    payload, base_payload = save_manager.pack_slot(data.get("state", {}), *(previous or ()))
+    return {
+        "payload": payload,
+        "base_payload": base_payload,
+        "scene_id": data.get("scene_id", "ch1_scene_1"),
+        "chapter": int(data.get("chapter", 1)),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def write_save(user_id: int, slot: int, data: dict[str, Any]) -> None:
+    values = save_values(user_id, slot, data)
+    db.session.execute(upsert(SaveSlot, ["user_id", "slot"], {"user_id": user_id, "slot": slot, **values}, values))
+
+
+def write_settings(user_id: int, fields: dict[str, Any]) -> None:
+    db.session.execute(upsert(UserSetting, ["user_id"], {"user_id": user_id, **fields}, fields))
+
+
+def flush_writes(batch: dict[tuple[Any, ...], dict[str, Any]]) -> None:
+    """Apply a coalesced batch of queued writes in one transaction.
+
+    Each write gets its own savepoint: one that fails is logged and dropped instead of failing
+    (and re-queueing) the whole batch forever.
+    """
+    with app.app_context():
+        for key, data in batch.items():
+            kind, user_id, *rest = key
+            try:
+                with db.session.begin_nested():
+                    if kind == "save":
+                        write_save(user_id, rest[0], data)
+                    else:
+                        write_settings(user_id, data)
+            except Exception:
+                logger.exception("Write-behind %s dibuang", key)
+        db.session.commit()
+
+
+write_queue = WriteBehindQueue(flush_writes, window=app.config["WRITE_BEHIND_WINDOW"])
+atexit.register(write_queue.stop)
+instrumentation.gauges["vn_write_queue_depth"] = lambda: write_queue.metrics()["depth"]
+
+password_hasher = PasswordHasher(
+    threads=app.config["PASSWORD_HASH_THREADS"], max_queue=int(config.get("password_hash_queue", 64))
+)
+instrumentation.gauges["vn_password_hash_waiting"] = lambda: password_hasher.waiting
+# Every attempt counts against its IP; failures also count against (IP, username), so guessing one account
+# is slower than guessing many, without letting other addresses lock its owner out.
+login_ip_bucket = TokenBucket(config.get("login_ip_per_minute", 30) / 60, config.get("login_ip_burst", 10))
+login_user_bucket = TokenBucket(config.get("login_user_per_minute", 5) / 60, config.get("login_user_burst", 5))
+
+
+def login_retry_after(username: str) -> int:
+    """Seconds until this client may try to log in again as ``username``; 0 when allowed now."""
+    if not app.config["LOGIN_RATE_LIMIT"]:
+        return 0
+    wait = login_ip_bucket.take(request.remote_addr)
+    if not wait:
+        wait = login_user_bucket.wait((request.remote_addr, username.lower()))
+    return math.ceil(wait)
+
+
+def record_login_failure(username: str) -> None:
+    if app.config["LOGIN_RATE_LIMIT"]:
+        login_user_bucket.take((request.remote_addr, username.lower()))
+
+
+@app.after_request
+def flush_socket_events(response: Response) -> Response:
+    emitter.flush()
+    return response
 
 
 @app.context_processor
@@ -130,7 +442,11 @@ def register() -> str:
         if User.query.filter((User.username == username) | (User.email == email)).first():
             return render_template("register.html", error="Username/email sudah dipakai")
 
-        user = User(username=username, email=email, password_hash=generate_password_hash(password))
+        try:
+            password_hash = password_hasher.hash(password)
+        except HasherBusy:
+            return render_template("register.html", error="Server sedang sibuk, coba lagi"), 503, {"Retry-After": "1"}
+        user = User(username=username, email=email, password_hash=password_hash)
         db.session.add(user)
         db.session.commit()
         login_user(user)
@@ -141,12 +457,23 @@ def register() -> str:
 
 
 @app.route("/login", methods=["GET", "POST"])
+@read_only
 def login() -> str:
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"]
+        retry_after = login_retry_after(username)
+        if retry_after:
+            error = f"Terlalu banyak percobaan login, coba lagi dalam {retry_after} detik"
+            return render_template("login.html", error=error), 429, {"Retry-After": str(retry_after)}
+
         user = User.query.filter_by(username=username).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, password)
+        except HasherBusy:
+            return render_template("login.html", error="Server sedang sibuk, coba lagi"), 503, {"Retry-After": "1"}
+        if not valid:
+            record_login_failure(username)
             return render_template("login.html", error="Login gagal")
 
         login_user(user)
@@ -163,9 +490,16 @@ def logout() -> Any:
 
 
 @app.get("/dashboard")
+@read_only
 @login_required
 def dashboard() -> str:
-    saves = SaveSlot.query.filter_by(user_id=current_user.id).all()
+    write_queue.flush()
+    # Metadata only: listing slots must not pull their payloads.
+    saves = db.session.execute(
+        db.select(SaveSlot.slot, SaveSlot.chapter, SaveSlot.scene_id, SaveSlot.updated_at)
+        .filter_by(user_id=current_user.id)
+        .order_by(SaveSlot.slot)
+    ).all()
     return render_template("dashboard.html", saves=saves)
 
 
@@ -194,12 +528,71 @@ def settings_page() -> str:
 
 
 @app.get("/api/scene/<scene_id>")
+@read_only
 @login_required
 def get_scene(scene_id: str):
-    scene = story_loader.get_scene(scene_id)
-    if scene is None:
+    asset_manifest.refresh()
+    response = story_response(f"scene:{scene_id}:{asset_manifest.version}", lambda: scene_payload(scene_id))
+    if response is None:
         return jsonify({"error": "Scene tidak ditemukan"}), 404
-    return jsonify(scene)
+    return response
+
+
+def scene_payload(scene_id: str) -> dict[str, Any] | None:
+    scene = asset_manifest.with_variants(story_loader.get_scene(scene_id))
+    if scene is not None:
+        scene["prefetch"] = story_loader.prefetch_hints(scene_id, app.config["PREFETCH_DEPTH"])
+        if scene.get("dialogue"):
+            scene["voice"] = f"/voice/{voice_line(scene['dialogue'])}"
+    return scene
+
+
+def voice_line(text: str) -> str:
+    return voice_cache.key(text, app.config["TTS_LANG"], app.config["TTS_VOICE"])
+
+
+@app.get("/voice/<name>")
+def get_voice(name: str):
+    # Voice lines are rendered ahead of time by `flask prerender-voices`; requests never wait on synthesis.
+    path = voice_cache.get(name)
+    if path is None:
+        return jsonify({"error": "Suara belum tersedia"}), 404
+    response = send_file(path, mimetype="audio/mpeg", max_age=app.config["VARIANT_MAX_AGE"])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.get("/api/scenes")
+@read_only
+@login_required
+def get_scenes():
+    """Several scenes in one response so the client can warm its cache from prefetch hints."""
+    ids = list(dict.fromkeys(filter(None, request.args.get("ids", "").split(","))))
+    if not ids or len(ids) > app.config["BULK_SCENE_LIMIT"]:
+        return jsonify({"error": f"ids wajib diisi (maksimal {app.config['BULK_SCENE_LIMIT']})"}), 400
+    asset_manifest.refresh()
+    # Same shape as /api/scene, so a scene served from the client's cache still carries prefetch and voice.
+    scenes = {scene_id: scene_payload(scene_id) for scene_id in ids}
+    response = jsonify({
+        "scenes": {scene_id: scene for scene_id, scene in scenes.items() if scene is not None},
+        "missing": [scene_id for scene_id, scene in scenes.items() if scene is None],
+    })
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config["STORY_CACHE_MAX_AGE"]
+    return response
+
+
+@app.get("/variants/<path:filename>")
+def get_variant(filename: str):
+    if filename == MANIFEST_NAME:
+        # The manifest keeps its name across rebuilds: short max-age plus the ETag send_file adds.
+        return send_from_directory(asset_manifest.directory, filename, max_age=app.config["STORY_CACHE_MAX_AGE"])
+    # Variant file names carry a content hash, so a cached copy can never go stale.
+    response = send_from_directory(asset_manifest.directory, filename, max_age=app.config["VARIANT_MAX_AGE"])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @app.post("/api/choice")
@@ -208,58 +601,184 @@ def process_choice():
     data = request.get_json(force=True)
     current_scene = data.get("scene_id")
     choice_id = data.get("choice_id")
-    game_state = data.get("state", {})
+    # Clients that still post "state" get it echoed back; otherwise the server-side copy is authoritative.
+    server_state = "state" not in data
+    game_state = session_state(current_user.id) if server_state else data["state"]
+    if game_state is None:
+        return state_missing()
+    if server_state and current_scene != game_state.scene_id:
+        # Only the scene the player is at may be answered, so choices cannot be replayed to farm stats.
+        return jsonify({"error": "Pilihan bukan dari scene saat ini", "scene_id": game_state.scene_id}), 409
+    previous_stats = game_state.stats_dict() if server_state else dict(game_state.get("stats", {}))
 
     result = story_loader.process_choice(current_scene, choice_id, game_state)
     if "error" in result:
         return jsonify(result), 400
 
-    achievements = achievement_system.evaluate(game_state)
-    for ach_key in achievements:
-        if not UserAchievement.query.filter_by(user_id=current_user.id, key=ach_key).first():
-            db.session.add(UserAchievement(user_id=current_user.id, key=ach_key))
-            socketio.emit("achievement_unlocked", {"achievement": ach_key}, room=f"user-{current_user.id}")
+    choice = story_loader.get_choice(current_scene, choice_id)
+    if server_state:
+        game_state.scene_id = result["next_scene"]
+        session_states.set(current_user.id, game_state)
+        result = {
+            "next_scene": result["next_scene"],
+            "chapter": result["chapter"],
+            "changes": {
+                "stats": {key: game_state.get_stat(key) for key, _ in choice.stat_deltas},
+                "flags": dict(choice.set_flags),
+            },
+        }
+    if result["next_scene"] is not None:
+        result["prefetch"] = story_loader.prefetch_hints(result["next_scene"], app.config["PREFETCH_DEPTH"])
+
+    current_stats = game_state.stats_dict() if server_state else game_state["stats"]
+    if session.get("achievement_version") == achievement_system.version:
+        changed = [name for name, _ in choice.stat_deltas]
+        crossed = achievement_system.evaluate_delta(previous_stats, current_stats, changed)
+    else:
+        # First choice since login, a load or a change to the rules: backfill everything the stats already earn.
+        crossed = achievement_system.evaluate({"stats": current_stats})
+        session["achievement_version"] = achievement_system.version
+    if crossed:
+        rows = [{"user_id": current_user.id, "key": key} for key in crossed]
+        stmt = upsert(UserAchievement, ["user_id", "key"], rows)
+        unlocked = db.session.scalars(stmt.returning(UserAchievement.key)).all()
+        db.session.commit()
+        for ach_key in unlocked:
+            emitter.emit("achievement_unlocked", {"achievement": ach_key}, room=f"user-{current_user.id}")
 
-    db.session.commit()
     return jsonify(result)
 
 
+def parse_save_request(data: Any) -> dict[str, Any]:
+    """Coerce a save request up front, so a queued write-behind save cannot fail later at flush time."""
+    if not isinstance(data, dict) or not isinstance(data.get("state", {}), dict):
+        raise ValueError("state harus berupa object")
+    scene_id = data.get("scene_id", "ch1_scene_1")
+    if not isinstance(scene_id, str) or len(scene_id) > 120:
+        raise ValueError("scene_id tidak valid")
+    slot, chapter = int(data.get("slot", 1)), int(data.get("chapter", 1))
+    if not 1 <= slot <= app.config["MAX_SAVE_SLOTS"]:
+        raise ValueError("slot di luar jangkauan")
+    return {**data, "slot": slot, "chapter": chapter, "scene_id": scene_id}
+
+
 @app.post("/api/save")
 @login_required
 def save_game():
     data = request.get_json(force=True)
-    slot = int(data.get("slot", 1))
-    payload = save_manager.pack_state(data.get("state", {}))
-
-    save = SaveSlot.query.filter_by(user_id=current_user.id, slot=slot).first()
-    if save is None:
-        save = SaveSlot(user_id=current_user.id, slot=slot, payload=payload)
-        db.session.add(save)
-    else:
-        save.payload = payload
-
-    save.scene_id = data.get("scene_id", "ch1_scene_1")
-    save.chapter = int(data.get("chapter", 1))
+    try:
+        data = parse_save_request(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Data save tidak valid"}), 400
+    slot = data["slot"]
+    if "state" not in data:
+        state = session_state(current_user.id)
+        if state is None:
+            return state_missing()
+        data["state"] = state.to_dict()
+        if state.scene_id is not None:
+            data["scene_id"] = state.scene_id
+    if app.config["WRITE_BEHIND"]:
+        write_queue.put(("save", current_user.id, slot), data)
+        return jsonify({"status": "ok", "slot": slot})
+
+    write_save(current_user.id, slot, data)
     db.session.commit()
     return jsonify({"status": "ok", "slot": slot})
 
 
+def slot_state(save: SaveSlot) -> dict[str, Any]:
+    base = save_manager.unpack_state(save.base_payload) if save.base_payload else None
+    return save_manager.unpack_state(save.payload, base)
+
+
 @app.get("/api/load/<int:slot>")
+@read_only
 @login_required
 def load_game(slot: int):
+    write_queue.flush()
     save = SaveSlot.query.filter_by(user_id=current_user.id, slot=slot).first()
     if not save:
         return jsonify({"error": "Slot kosong"}), 404
-    state = save_manager.unpack_state(save.payload)
+    state = slot_state(save)
+    game_state = GameState.from_dict(state_layout, state)
+    game_state.scene_id = save.scene_id
+    session_states.set(current_user.id, game_state)
+    session.pop("achievement_version", None)  # the loaded stats may already earn achievements
     return jsonify({"slot": slot, "chapter": save.chapter, "scene_id": save.scene_id, "state": state})
 
 
+@app.get("/api/state")
+@read_only
+@login_required
+def get_state():
+    state = session_state(current_user.id)
+    if state is None:
+        return state_missing()
+    return jsonify(state.to_dict())
+
+
+@app.delete("/api/state")
+@login_required
+def reset_state():
+    session_states.set(current_user.id, new_game_state())
+    return jsonify({"status": "reset"})
+
+
+def metrics_denied() -> tuple[Response, int] | None:
+    """Metrics are off unless METRICS_TOKEN is set, and then need ``Authorization: Bearer <token>``."""
+    token = app.config["METRICS_TOKEN"]
+    if not token:
+        return jsonify({"error": "Metrics tidak diaktifkan"}), 404
+    given = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(given, f"Bearer {token}".encode("utf-8")):
+        return jsonify({"error": "Token metrics salah"}), 401
+    return None
+
+
+@app.get("/api/metrics/write-queue")
+def write_queue_metrics():
+    return metrics_denied() or jsonify(write_queue.metrics())
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    return metrics_denied() or Response(instrumentation.render(), mimetype="text/plain; version=0.0.4")
+
+
+def apply_inventory_deltas(user_id: int, deltas: dict[str, int]) -> tuple[dict[str, int], list[str]]:
+    """Apply all deltas in one relative upsert; on any shortage nothing is written.
+
+    Returns the new quantities and the items that would have gone negative.
+    """
+    rows = [{"user_id": user_id, "item_id": item_id, "qty": qty} for item_id, qty in deltas.items() if qty]
+    if not rows:
+        return {}, []
+    stmt = upsert(
+        UserInventory, ["user_id", "item_id"], rows, lambda excluded: {"qty": UserInventory.qty + excluded.qty}
+    )
+    quantities = dict(db.session.execute(stmt.returning(UserInventory.item_id, UserInventory.qty)).all())
+    shortages = [item_id for item_id, qty in quantities.items() if qty < 0]
+    if shortages:
+        db.session.rollback()
+        return {}, shortages
+
+    empty = [item_id for item_id, qty in quantities.items() if qty == 0]
+    if empty:
+        db.session.execute(
+            db.delete(UserInventory).where(UserInventory.user_id == user_id, UserInventory.item_id.in_(empty))
+        )
+    return quantities, []
+
+
 @app.get("/api/inventory")
+@read_only
 @login_required
 def get_inventory():
-    rows = UserInventory.query.filter_by(user_id=current_user.id).all()
-    payload = [{"item_id": row.item_id, "qty": row.qty} for row in rows]
-    return jsonify(inventory_system.enrich_inventory(payload))
+    rows = db.session.execute(
+        db.select(UserInventory.item_id, UserInventory.qty).filter_by(user_id=current_user.id)
+    ).all()
+    return Response(inventory_system.render_inventory(rows), mimetype="application/json")
 
 
 @app.post("/api/inventory/use")
@@ -267,18 +786,43 @@ def get_inventory():
 def use_inventory_item():
     data = request.get_json(force=True)
     item_id = data.get("item_id")
-    row = UserInventory.query.filter_by(user_id=current_user.id, item_id=item_id).first()
-    if not row or row.qty <= 0:
+    if not isinstance(item_id, str):
+        return jsonify({"error": "Item tidak tersedia"}), 404
+    _, shortages = apply_inventory_deltas(current_user.id, {item_id: -1})
+    if shortages:
         return jsonify({"error": "Item tidak tersedia"}), 404
 
-    row.qty -= 1
-    if row.qty == 0:
-        db.session.delete(row)
     db.session.commit()
     return jsonify({"status": "used", "item_id": item_id})
 
 
+@app.post("/api/inventory/batch")
+@login_required
+def batch_inventory():
+    data = request.get_json(force=True)
+    ops = data.get("ops", []) if isinstance(data, dict) else None
+    if not isinstance(ops, list):
+        return jsonify({"error": "ops harus berupa list"}), 400
+    deltas: dict[str, int] = {}
+    for op in ops:
+        item_id, delta = (op.get("item_id"), op.get("delta")) if isinstance(op, dict) else (None, None)
+        if not isinstance(item_id, str) or item_id not in inventory_system.catalogue or type(delta) is not int:
+            return jsonify({"error": "Operasi inventory tidak valid", "op": op}), 400
+        if delta > 0:
+            # Clients may only consume; items are granted server-side via apply_inventory_deltas.
+            return jsonify({"error": "Item hanya bisa didapat dari cerita", "op": op}), 403
+        deltas[item_id] = deltas.get(item_id, 0) + delta
+
+    quantities, shortages = apply_inventory_deltas(current_user.id, deltas)
+    if shortages:
+        return jsonify({"error": "Item tidak cukup", "items": shortages}), 409
+
+    db.session.commit()
+    return jsonify({"status": "ok", "items": quantities})
+
+
 @app.get("/api/achievements")
+@read_only
 @login_required
 def get_achievements():
     unlocked = {x.key for x in UserAchievement.query.filter_by(user_id=current_user.id).all()}
@@ -287,65 +831,105 @@ def get_achievements():
 
 
 @app.get("/api/gallery")
+@read_only
 @login_required
 def get_gallery():
-    return jsonify(story_loader.get_gallery_data())
+    return story_response("gallery", story_loader.get_gallery_data)
 
 
 @app.get("/api/characters")
+@read_only
 @login_required
 def get_characters():
-    return jsonify(story_loader.characters)
+    return story_response("characters", lambda: story_loader.characters)
 
 
 @app.post("/api/settings")
 @login_required
 def update_settings():
     data = request.get_json(force=True)
-    settings = UserSetting.query.filter_by(user_id=current_user.id).first()
-    if settings is None:
-        settings = UserSetting(user_id=current_user.id)
-        db.session.add(settings)
-
-    settings.music_volume = float(data.get("music_volume", settings.music_volume))
-    settings.sfx_volume = float(data.get("sfx_volume", settings.sfx_volume))
-    settings.text_speed = int(data.get("text_speed", settings.text_speed))
-    settings.language = data.get("language", settings.language)
-    db.session.commit()
+    fields: dict[str, Any] = {}
+    for name, cast in (("music_volume", float), ("sfx_volume", float), ("text_speed", int), ("language", str)):
+        if name in data:
+            try:
+                fields[name] = cast(data[name])
+            except (TypeError, ValueError):
+                return jsonify({"error": f"{name} tidak valid"}), 400
+
+    if app.config["WRITE_BEHIND"]:
+        write_queue.put(("settings", current_user.id), fields, merge=True)
+    else:
+        write_settings(current_user.id, fields)
+        db.session.commit()
     return jsonify({"status": "updated"})
 
 
+def export_document(slot: int, save: Any) -> bytes:
+    payload = save_manager.pack_state(slot_state(save), portable=True)
+    return json.dumps({"slot": slot, "payload": payload}, ensure_ascii=False).encode("utf-8")
+
+
 @app.post("/api/export-save/<int:slot>")
 @login_required
 def export_save(slot: int):
-    save = SaveSlot.query.filter_by(user_id=current_user.id, slot=slot).first()
+    write_queue.flush()
+    save = db.session.execute(
+        db.select(SaveSlot.payload, SaveSlot.base_payload).filter_by(user_id=current_user.id, slot=slot)
+    ).first()
     if not save:
         return jsonify({"error": "Slot kosong"}), 404
+    document = io.BytesIO(export_document(slot, save))
+    return send_file(document, mimetype="application/json", as_attachment=True, download_name=f"save_{slot}.json")
+
 
-    out_path = BASE_DIR / "temp" / f"save_{current_user.id}_{slot}.json"
-    out_path.parent.mkdir(exist_ok=True)
-    out_path.write_text(json.dumps({"slot": slot, "payload": save.payload}, ensure_ascii=False), encoding="utf-8")
-    return send_file(out_path, as_attachment=True)
+@app.post("/api/export-saves")
+@login_required
+def export_all_saves():
+    write_queue.flush()
+    rows = db.session.execute(
+        db.select(SaveSlot.slot, SaveSlot.payload, SaveSlot.base_payload)
+        .filter_by(user_id=current_user.id)
+        .order_by(SaveSlot.slot)
+    )
+    entries = ((f"save_{row.slot}.json", export_document(row.slot, row)) for row in rows)
+    return Response(
+        stream_with_context(stream_zip(entries)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=saves.zip"},
+    )
 
 
 @app.post("/api/import-save")
 @login_required
 def import_save():
+    """Import one exported ``.json`` or a bulk ``.zip``; every save is validated before any is written."""
+    limit = app.config["SAVE_IMPORT_MAX_BYTES"]
+    if (request.content_length or 0) > limit + 64 * 1024:  # room for the multipart envelope
+        return jsonify({"error": "File terlalu besar"}), 413
     uploaded = request.files.get("file")
     if uploaded is None:
         return jsonify({"error": "File tidak ditemukan"}), 400
 
-    data = json.loads(uploaded.read().decode("utf-8"))
-    slot = int(data["slot"])
-    save = SaveSlot.query.filter_by(user_id=current_user.id, slot=slot).first()
-    if save is None:
-        save = SaveSlot(user_id=current_user.id, slot=slot, payload=data["payload"])
-        db.session.add(save)
-    else:
-        save.payload = data["payload"]
-
+    try:
+        saves = read_saves(uploaded.stream, limit, app.config["MAX_SAVE_SLOTS"])
+        for data in saves:
+            if not 1 <= data["slot"] <= app.config["MAX_SAVE_SLOTS"]:
+                raise ValueError("slot di luar jangkauan")
+            save_manager.unpack_state(data["payload"])
+    except UploadTooLarge:
+        return jsonify({"error": "File terlalu besar"}), 413
+    except ValueError:
+        return jsonify({"error": "Save tidak valid"}), 400
+    write_queue.flush()
+    for data in saves:
+        values = {"payload": data["payload"], "base_payload": None, "updated_at": datetime.utcnow()}
+        row = {"user_id": current_user.id, "slot": data["slot"], **values}
+        db.session.execute(upsert(SaveSlot, ["user_id", "slot"], row, values))
     db.session.commit()
-    return jsonify({"status": "imported", "slot": slot})
+    slots = [data["slot"] for data in saves]
+    if len(slots) == 1:
+        return jsonify({"status": "imported", "slot": slots[0]})
+    return jsonify({"status": "imported", "slots": slots})
 
 
 @socketio.on("join_game")
@@ -354,28 +938,110 @@ def ws_join_game(data: dict[str, Any]):
         return
     room = f"user-{current_user.id}"
     join_room(room)
+    instrumentation.record_emit("scene_update")
     emit("scene_update", {"message": "connected", "session_id": data.get("session_id")})
 
 
 @socketio.on("player_action")
 def ws_player_action(data: dict[str, Any]):
-    emit("expression_change", {"character": "rina", "expression": "teasing"}, room=f"user-{current_user.id}")
+    emitter.emit("expression_change", {"character": "rina", "expression": "teasing"}, room=f"user-{current_user.id}")
 
 
 @socketio.on("save_game")
 def ws_save_game(data: dict[str, Any]):
-    emit("background_change", {"background": "living_room_day.png", "slot": data.get("slot", 1)})
+    emitter.emit(
+        "background_change", {"background": "living_room_day.png", "slot": data.get("slot", 1)}, room=request.sid
+    )
 
 
 @app.cli.command("init-db")
 def init_db_command() -> None:
-    db.create_all()
+    upgrade_schema()
     print("Database initialized")
 
 
+@app.cli.command("upgrade-db")
+def upgrade_db_command() -> None:
+    upgrade_schema()
+    print("Database upgraded")
+
+
+@app.cli.command("prerender-voices")
+@click.option("--workers", default=8, show_default=True)
+def prerender_voices_command(workers: int) -> None:
+    loader = StoryLoader(STORY_DIR)
+    lang, voice = app.config["TTS_LANG"], app.config["TTS_VOICE"]
+    lines = ((scene["dialogue"], lang, voice) for scene in loader.iter_scenes() if scene.get("dialogue"))
+    result = voice_cache.prerender(lines, workers=workers)
+    print(f"{result['lines']} dialog: {result['synthesized']} disintesis, {result['cached']} dari cache")
+
+
+@app.cli.command("compile-story")
+@click.option("--out", type=click.Path(path_type=Path), default=BASE_DIR / "instance" / "story.compiled")
+@click.option("--workers", type=int, default=None, help="Proses validasi paralel (default: jumlah CPU).")
+@click.option("--strict", is_flag=True, help="Anggap peringatan sebagai error.")
+def compile_story_command(out: Path, workers: int | None, strict: bool) -> None:
+    report = validate_story(
+        (STORY_DIR / "chapters").glob("chapter_*.json"),
+        start_scene=START_SCENE,
+        achievements=achievement_system.achievements,
+        endings=StoryLoader.load_json(STORY_DIR / "endings" / "endings.json"),
+        terminal_scenes=TERMINAL_SCENES,
+        workers=workers,
+    )
+    for message in report.errors:
+        click.echo(f"ERROR   {message}", err=True)
+    for message in report.warnings:
+        click.echo(f"WARNING {message}", err=True)
+    if not report.ok or (strict and report.warnings):
+        raise click.ClickException(f"{len(report.errors)} error, {len(report.warnings)} peringatan")
+
+    version = write_compiled_story(
+        out,
+        report.scenes,
+        StoryLoader.compile_graph(report.scenes),
+        StoryLoader.load_json(STORY_DIR / "characters" / "characters.json"),
+        StoryLoader.load_json(STORY_DIR / "endings" / "endings.json"),
+    )
+    click.echo(f"{len(report.scenes)} scene dikompilasi ke {out} (versi {version})")
+    layout = StateLayout.load(STATE_LAYOUT_PATH)
+    if layout.intern(*story_state_names(report.scenes.values())):
+        layout.save(STATE_LAYOUT_PATH)
+        click.echo(f"{STATE_LAYOUT_PATH.name}: {len(layout.flags)} flag, {len(layout.stats)} stat")
+    click.echo(f"Jalankan app dengan STORY_COMPILED={out} untuk memuatnya saat startup.")
+
+
+@app.cli.command("analyze-story")
+@click.option("--json", "as_json", is_flag=True, help="Cetak laporan lengkap sebagai JSON.")
+@click.option("--strict", is_flag=True, help="Gagal bila ada ending atau achievement yang tidak bisa dicapai.")
+def analyze_story_command(as_json: bool, strict: bool) -> None:
+    loader = StoryLoader(STORY_DIR)
+    analysis = analyze_story(
+        {scene["id"]: scene for scene in loader.iter_scenes()},
+        START_SCENE,
+        achievement_system.achievements,
+        loader.endings,
+        TERMINAL_SCENES,
+    )
+    if as_json:
+        click.echo(json.dumps(analysis.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        for key, reachable in analysis.endings.items():
+            click.echo(f"ending {key:<12} {'bisa dicapai' if reachable else 'TIDAK bisa dicapai'}")
+        for stat, (low, high) in analysis.exit_bounds.items():
+            click.echo(f"stat {stat:<14} akhir cerita {low:g} .. {high:g}")
+        locked = [key for key, reachable in analysis.achievements.items() if not reachable]
+        total = len(analysis.achievements)
+        click.echo(f"achievement    {total - len(locked)}/{total} bisa dicapai")
+        for key in locked:
+            click.echo(f"  TIDAK bisa dicapai: {key}")
+    if strict and not (all(analysis.endings.values()) and all(analysis.achievements.values())):
+        raise click.ClickException("ada ending atau achievement yang tidak bisa dicapai")
+
+
 def bootstrap() -> None:
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
 
 
 if __name__ == "__main__":
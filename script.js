@@ -12,8 +12,6 @@ const EXPRESSION_MAP = {
   sleep: "assets/sleep.png.gitkeep",
 };
 
-const SYSTEM_PROMPT = `Kamu adalah companion AI yang terinspirasi Mahiru: tenang, cerdas, perhatian, dan praktis. Kamu tidak genit, tidak romantis, tidak menggoda, dan tidak mengklaim kepemilikan user. Jawaban harus rapi, lembut tapi tegas, fokus membantu dan menemani berpikir. Jika informasi tidak jelas, minta klarifikasi. Jangan mengada-ada. Gunakan memori percakapan untuk konsistensi, tetapi jangan menyebut sistem internal.`;
-
 const STATE = {
   shortTerm: [],
   longTerm: {
@@ -27,6 +25,13 @@ const STATE = {
   sleepTimer: null,
 };
 
+// Each browser gets its own memory and chat queue slot; the old shared "default" memory is only used by
+// clients that send no id at all.
+const USER_ID = localStorage.getItem("mahiru-user-id") || crypto.randomUUID();
+localStorage.setItem("mahiru-user-id", USER_ID);
+const SHORT_TERM_LIMIT = 40;
+const SUMMARY_EVERY = 10;
+
 const POSITIVE_WORDS = ["senang", "bahagia", "suka", "bagus", "mantap", "terima kasih", "puas", "lega"];
 const NEGATIVE_WORDS = ["sedih", "kesal", "marah", "kecewa", "capek", "bingung", "khawatir", "lelah"];
 
@@ -54,6 +59,7 @@ function appendMessage(role, text) {
   bubble.textContent = text;
   chatLog.appendChild(bubble);
   chatLog.scrollTop = chatLog.scrollHeight;
+  return bubble;
 }
 
 function sentimentScore(text) {
@@ -128,29 +134,18 @@ function analyzeInput(input) {
   };
 }
 
-function buildPrompt(analysis) {
-  const memorySummary = STATE.longTerm.summary || "Belum ada ringkasan.";
-  const facts = STATE.longTerm.facts.length ? STATE.longTerm.facts.join("; ") : "Tidak ada fakta tersimpan.";
-  const prefs = STATE.longTerm.preferences.length ? STATE.longTerm.preferences.join("; ") : "Tidak ada preferensi tersimpan.";
+// Per-turn hints go after the conversation so the prompt prefix stays identical between turns.
+function buildNote(analysis) {
   const emotionPatterns = Object.keys(STATE.longTerm.emotion_patterns).length
     ? JSON.stringify(STATE.longTerm.emotion_patterns)
     : "Belum ada pola emosi.";
-
-  return `SYSTEM: ${SYSTEM_PROMPT}
-MEMORY SUMMARY: ${memorySummary}
-LONG TERM FACTS: ${facts}
-LONG TERM PREFERENCES: ${prefs}
-EMOTION PATTERNS: ${emotionPatterns}
-SHORT TERM: ${summarizeShortTerm()}
-
-ANALYSIS: Tujuan=${analysis.goal}; Nada=${analysis.tone}; Gaya=${analysis.responseStyle}; FollowUp=${analysis.followUp}
-
-INSTRUCTION: Balas sebagai Mahiru yang konsisten, sesuai analisis. Jangan menyebutkan bagian SYSTEM atau MEMORY.`;
+  return `Tujuan=${analysis.goal}; Nada=${analysis.tone}; Gaya=${analysis.responseStyle}; `
+    + `FollowUp=${analysis.followUp}; Pola emosi=${emotionPatterns}`;
 }
 
 async function loadMemory() {
   try {
-    const response = await fetch("/api/memory");
+    const response = await fetch(`/api/memory?user_id=${encodeURIComponent(USER_ID)}`);
     if (!response.ok) throw new Error("Gagal memuat memori");
     const data = await response.json();
     STATE.longTerm = data;
@@ -161,7 +156,7 @@ async function loadMemory() {
 
 async function saveMemory() {
   try {
-    await fetch("/api/memory", {
+    await fetch(`/api/memory?user_id=${encodeURIComponent(USER_ID)}`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(STATE.longTerm),
@@ -171,26 +166,54 @@ async function saveMemory() {
   }
 }
 
-async function sendToModel(prompt, userMessage) {
+// Streams the reply into `bubble` token by token and resolves with the full text.
+async function sendToModel(note, history, userMessage, bubble) {
   setStatus("Mengirim ke model lokal...");
   const response = await fetch("/api/chat", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
     body: JSON.stringify({
-      prompt,
+      note,
+      history,
       message: userMessage,
+      user_id: USER_ID,
       max_tokens: 256,
       temperature: 0.7,
       stop: ["USER:", "SYSTEM:"],
+      stream: true,
     }),
   });
 
+  if (response.status === 429) {
+    throw new Error("Model sedang sibuk.");
+  }
   if (!response.ok) {
     throw new Error("Model lokal tidak merespons.");
   }
 
-  const data = await response.json();
-  return data.reply;
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const lines = buffer.slice(0, boundary).split("\n");
+      buffer = buffer.slice(boundary + 2);
+      const event = (lines.find((line) => line.startsWith("event:")) || "").slice(6).trim();
+      const data = JSON.parse((lines.find((line) => line.startsWith("data:")) || "data:{}").slice(5));
+      if (event === "token") {
+        bubble.textContent += data.content;
+        chatLog.scrollTop = chatLog.scrollHeight;
+      } else if (event === "done") {
+        return data.reply;
+      } else if (event === "error") {
+        throw new Error(data.reply);
+      }
+    }
+  }
+  throw new Error("Model lokal terputus.");
 }
 
 function updateEmotionPattern(score) {
@@ -207,8 +230,8 @@ chatForm.addEventListener("submit", async (event) => {
   resetSleepTimer();
 
   appendMessage("user", input);
+  const history = STATE.shortTerm.slice();
   STATE.shortTerm.push({ role: "USER", text: input });
-  STATE.shortTerm = STATE.shortTerm.slice(-10);
   STATE.interactionCount += 1;
 
   const analysis = analyzeInput(input);
@@ -216,15 +239,21 @@ chatForm.addEventListener("submit", async (event) => {
     updateLongTermMemory(input);
   }
 
-  STATE.longTerm.summary = summarizeShortTerm();
-  STATE.longTerm.last_updated = new Date().toISOString();
+  // Refreshing the summary every turn would invalidate the model's cached prompt prefix.
+  if (STATE.interactionCount % SUMMARY_EVERY === 0) {
+    STATE.longTerm.summary = summarizeShortTerm();
+    STATE.longTerm.last_updated = new Date().toISOString();
+  }
 
   try {
-    const prompt = buildPrompt(analysis);
-    const reply = await sendToModel(prompt, input);
-    appendMessage("ai", reply);
+    const bubble = appendMessage("ai", "");
+    const reply = await sendToModel(buildNote(analysis), history, input, bubble).catch((error) => {
+      bubble.remove();
+      throw error;
+    });
+    bubble.textContent = reply;
     STATE.shortTerm.push({ role: "ASSISTANT", text: reply });
-    STATE.shortTerm = STATE.shortTerm.slice(-10);
+    STATE.shortTerm = STATE.shortTerm.slice(-SHORT_TERM_LIMIT);
 
     const replySentiment = sentimentScore(reply);
     updateEmotionPattern(replySentiment);
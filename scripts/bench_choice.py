@@ -0,0 +1,61 @@
+"""Micro-benchmark for StoryLoader.process_choice on the bundled chapters."""
+from __future__ import annotations
+
+import sys
+import timeit
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from story_engine.story_loader import StoryLoader  # noqa: E402
+
+
+def legacy_process_choice(loader: StoryLoader, scene_id: str, choice_id: str, state: dict[str, Any]) -> dict[str, Any]:
+    scene = loader.get_scene(scene_id)
+    if not scene:
+        return {"error": "Scene tidak ditemukan"}
+
+    choices = {choice["id"]: choice for choice in scene.get("choices", [])}
+    choice = choices.get(choice_id)
+    if not choice:
+        return {"error": "Choice tidak valid"}
+
+    stats = state.setdefault("stats", {})
+    flags = state.setdefault("flags", {})
+    for key, val in choice.get("stat_changes", {}).items():
+        stats[key] = int(stats.get(key, 0)) + int(val)
+
+    flags.update(scene.get("set_flags", {}))
+    return {"next_scene": choice.get("next_scene"), "state": state, "chapter": scene.get("chapter", 1)}
+
+
+def main(rounds: int = 200) -> None:
+    loader = StoryLoader(ROOT / "story_data")
+    calls = [
+        (scene_id, choice["id"])
+        for scene_id, scene in loader._scene_cache.items()
+        for choice in scene.get("choices", [])
+    ]
+
+    def run_legacy() -> None:
+        state: dict[str, Any] = {}
+        for scene_id, choice_id in calls:
+            legacy_process_choice(loader, scene_id, choice_id, state)
+
+    def run_compiled() -> None:
+        state: dict[str, Any] = {}
+        for scene_id, choice_id in calls:
+            loader.process_choice(scene_id, choice_id, state)
+
+    total = rounds * len(calls)
+    legacy = min(timeit.repeat(run_legacy, number=rounds, repeat=5)) / total
+    compiled = min(timeit.repeat(run_compiled, number=rounds, repeat=5)) / total
+    print(f"{len(calls)} choices x {rounds} rounds")
+    print(f"legacy   : {legacy * 1e9:8.1f} ns/choice")
+    print(f"compiled : {compiled * 1e9:8.1f} ns/choice ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Throughput of serve.py with 1 worker versus N workers on /api/scene and /api/choice.
+
+    python scripts/bench_cluster.py --workers 4 --clients 16 --seconds 10
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from multiprocessing import Pool
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parents[1]
+SCENE_IDS = {f"ch{c}_scene_{s}" for c in range(1, 11) for s in range(1, 11)}
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"serve.py tidak merespons di port {port}")
+
+
+def client_loop(args: tuple[int, float]) -> tuple[int, int]:
+    port, seconds = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    name = uuid.uuid4().hex[:12]
+    form = urlencode({"username": name, "email": f"{name}@bench.local", "password": "bench-pass"})
+    conn.request("POST", "/register", form, {"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    headers = {"Cookie": response.getheader("Set-Cookie").split(";", 1)[0], "Content-Type": "application/json"}
+
+    scenes = choices = 0
+    scene_id = "ch1_scene_1"
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if scene_id == "ch1_scene_1":  # new game
+            conn.request("DELETE", "/api/state", headers=headers)
+            conn.getresponse().read()
+        conn.request("GET", f"/api/scene/{scene_id}", headers=headers)
+        scene = json.loads(conn.getresponse().read())
+        scenes += 1
+        body = json.dumps({"scene_id": scene_id, "choice_id": scene["choices"][0]["id"]})
+        conn.request("POST", "/api/choice", body, headers)
+        result = json.loads(conn.getresponse().read())
+        choices += 1
+        scene_id = result["next_scene"] if result["next_scene"] in SCENE_IDS else "ch1_scene_1"
+    return scenes, choices
+
+
+def run(workers: int, clients: int, seconds: float, port: int) -> float:
+    scratch = tempfile.mkdtemp(prefix=f"vn-bench-{workers}-")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{scratch}/game.db", "CACHE_DIR": f"{scratch}/cache"}
+    env["SESSION_CACHE_DIR"] = f"{scratch}/sessions"
+    command = [sys.executable, str(ROOT / "serve.py"), "--workers", str(workers), "--port", str(port)]
+    server = subprocess.Popen(
+        [*command, "--host", "127.0.0.1", "--allow-local-emits"],  # these benches emit nothing across workers
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        with Pool(clients) as pool:
+            results = pool.map(client_loop, [(port, seconds)] * clients)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    total = sum(scenes + choices for scenes, choices in results)
+    return total / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    single = run(1, args.clients, args.seconds, args.port)
+    print(f"1 worker : {single:8.0f} req/s")
+    multi = run(args.workers, args.clients, args.seconds, args.port)
+    print(f"{args.workers} workers: {multi:8.0f} req/s ({multi / single:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Concurrent reads and writes against serve.py with ``DB_PROFILE=default`` versus ``sqlite-tuned``.
+
+Writer clients loop a new game, ``POST /api/choice`` and ``POST /api/save``; reader clients loop
+``GET /api/load/1`` and ``GET /api/achievements``. Each profile gets its own scratch database.
+
+    python scripts/bench_db_profile.py --workers 2 --writers 8 --readers 8 --seconds 10
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import quantiles
+
+import requests
+
+from bench_cluster import wait_for_port
+
+ROOT = Path(__file__).resolve().parents[1]
+PROFILES = ("default", "sqlite-tuned")
+
+
+def login(base_url: str) -> requests.Session:
+    session = requests.Session()
+    name = uuid.uuid4().hex[:12]
+    form = {"username": name, "email": f"{name}@bench.local", "password": "bench-pass"}
+    session.post(f"{base_url}/register", data=form, allow_redirects=False).raise_for_status()
+    session.post(f"{base_url}/api/save", json={"slot": 1, "scene_id": "ch1_scene_1", "chapter": 1}).raise_for_status()
+    return session
+
+
+def client(session: requests.Session, base_url: str, writer: bool, stop: threading.Event) -> tuple[list[float], int]:
+    latencies, errors = [], 0
+    while not stop.is_set():
+        if writer:
+            calls = [
+                ("DELETE", "/api/state", None),
+                ("POST", "/api/choice", {"scene_id": "ch1_scene_1", "choice_id": "ch1_scene_1_choice_1"}),
+                ("POST", "/api/save", {"slot": 1, "chapter": 1}),
+            ]
+        else:
+            calls = [("GET", "/api/load/1", None), ("GET", "/api/achievements", None)]
+        for method, path, body in calls:
+            started = time.perf_counter()
+            try:
+                ok = session.request(method, base_url + path, json=body, timeout=30).status_code < 500
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+    return latencies, errors
+
+
+def summary(kind: str, latencies: list[float], errors: int, seconds: float) -> str:
+    cuts = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else (latencies or [0.0]) * 99
+    return f"  {kind:<6} {len(latencies) / seconds:8.1f} req/s  p95 {cuts[94] * 1000:7.1f} ms  error {errors}"
+
+
+def run(profile: str, workers: int, writers: int, readers: int, seconds: float, port: int) -> None:
+    scratch = tempfile.mkdtemp(prefix="vn-bench-db-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{scratch}/game.db",
+        "CACHE_DIR": f"{scratch}/cache",
+        "SESSION_CACHE_DIR": f"{scratch}/sessions",
+        "DB_PROFILE": profile,
+        "LOGIN_RATE_LIMIT": "0",
+    }
+    command = [sys.executable, str(ROOT / "serve.py"), "--workers", str(workers), "--port", str(port)]
+    server = subprocess.Popen(
+        [*command, "--host", "127.0.0.1", "--allow-local-emits"],  # these benches emit nothing across workers
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_port(port)
+        with ThreadPoolExecutor(8) as pool:
+            sessions = list(pool.map(lambda _: login(base_url), range(writers + readers)))
+        stop = threading.Event()
+        with ThreadPoolExecutor(writers + readers) as pool:
+            futures = [
+                pool.submit(client, session, base_url, index < writers, stop) for index, session in enumerate(sessions)
+            ]
+            time.sleep(seconds)
+            stop.set()
+            results = [future.result() for future in futures]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    print(f"{profile} ({workers} worker, {writers} writer, {readers} reader)")
+    for kind, part in (("write", results[:writers]), ("read", results[writers:])):
+        print(summary(kind, [value for latencies, _ in part for value in latencies], sum(e for _, e in part), seconds))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5096)
+    args = parser.parse_args()
+    for profile in PROFILES:
+        run(profile, args.workers, args.writers, args.readers, args.seconds, args.port)
+
+
+if __name__ == "__main__":
+    main()
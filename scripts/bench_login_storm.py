@@ -0,0 +1,135 @@
+"""Socket.IO round-trip latency while a storm of logins hits the same worker.
+
+One probe client keeps sending ``player_action`` and times the ``expression_change`` reply, first
+while idle and then while ``--storm`` threads log in as fast as they can. Runs serve.py with a
+single worker twice: hashing inline (``PASSWORD_HASH_THREADS=0``) and offloaded to OS threads.
+
+    python scripts/bench_login_storm.py --storm 16 --seconds 5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import quantiles
+
+import requests
+import socketio
+
+from bench_cluster import wait_for_port
+
+ROOT = Path(__file__).resolve().parents[1]
+PASSWORD = "bench-pass"
+
+
+def register(base_url: str) -> tuple[str, requests.Session]:
+    session = requests.Session()
+    name = uuid.uuid4().hex[:12]
+    form = {"username": name, "email": f"{name}@bench.local", "password": PASSWORD}
+    session.post(f"{base_url}/register", data=form, allow_redirects=False).raise_for_status()
+    return name, session
+
+
+def probe(client: socketio.Client, replies: threading.Event, seconds: float) -> list[float]:
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        replies.clear()
+        started = time.perf_counter()
+        client.emit("player_action", {})
+        replies.wait(10)  # a timeout is recorded too, as a lower bound
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.05)
+    return latencies
+
+
+def storm(base_url: str, names: list[str], stop: threading.Event) -> int:
+    logins = 0
+    session = requests.Session()
+    while not stop.is_set():
+        for name in names:
+            session.post(f"{base_url}/login", data={"username": name, "password": PASSWORD}, allow_redirects=False)
+            logins += 1
+            if stop.is_set():
+                break
+    return logins
+
+
+def summary(latencies: list[float]) -> str:
+    cuts = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return (
+        f"n={len(latencies):<4} p50 {cuts[49] * 1000:7.1f} ms  p95 {cuts[94] * 1000:7.1f} ms"
+        f"  max {max(latencies) * 1000:7.1f} ms"
+    )
+
+
+def run(threads: int, storm_clients: int, seconds: float, port: int) -> None:
+    scratch = tempfile.mkdtemp(prefix="vn-bench-login-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{scratch}/game.db",
+        "CACHE_DIR": f"{scratch}/cache",
+        "SESSION_CACHE_DIR": f"{scratch}/sessions",
+        "PASSWORD_HASH_THREADS": str(threads),
+        "LOGIN_RATE_LIMIT": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "serve.py"), "--workers", "1", "--port", str(port), "--host", "127.0.0.1"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_port(port)
+        with ThreadPoolExecutor(8) as pool:
+            names = [name for name, _ in pool.map(lambda _: register(base_url), range(storm_clients))]
+        _, session = register(base_url)
+
+        replies = threading.Event()
+        client = socketio.Client(http_session=session)
+        client.on("expression_change", lambda data: replies.set())
+        client.on("batch", lambda data: replies.set())
+        client.connect(base_url, transports=["polling"], wait_timeout=10)
+        client.emit("join_game", {})
+        time.sleep(0.5)
+
+        idle = probe(client, replies, seconds)
+        stop = threading.Event()
+        with ThreadPoolExecutor(storm_clients) as pool:
+            futures = [pool.submit(storm, base_url, [name], stop) for name in names]
+            loaded = probe(client, replies, seconds)
+            stop.set()
+            logins = sum(future.result() for future in futures)
+        client.disconnect()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    label = "inline" if threads == 0 else f"tpool x{threads}"
+    print(f"{label}: {logins / seconds:.1f} login/s selama storm")
+    print(f"  idle  {summary(idle)}")
+    print(f"  storm {summary(loaded)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--storm", type=int, default=16, help="klien yang login terus-menerus")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--threads", type=int, default=4, help="PASSWORD_HASH_THREADS untuk mode offload")
+    parser.add_argument("--port", type=int, default=5097)
+    args = parser.parse_args()
+    for threads in (0, args.threads):
+        run(threads, args.storm, args.seconds, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Virtual players through register -> login -> (scene -> choice)* -> save -> load for all ten chapters.
+
+    python scripts/bench_player_loop.py --players 20                          # in-process test client
+    python scripts/bench_player_loop.py --server --workers 2 --players 32    # serve.py + Socket.IO clients
+    python scripts/bench_player_loop.py --save-baseline bench/baseline.json
+    python scripts/bench_player_loop.py --compare bench/baseline.json --tolerance 0.2
+
+Latency is reported per step as p50/p95/p99 plus overall requests/sec. ``--compare`` exits with
+status 1 when a step's p95 or the overall throughput is worse than the baseline by more than the
+tolerance, so it can gate CI. Only compare runs made on the same machine with the same options.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import quantiles
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+START_SCENE = "ch1_scene_1"
+PASSWORD = "bench-pass"
+STEPS = ("register", "login", "socket_join", "scene", "choice", "save", "load")
+
+Timings = dict[str, list[float]]
+
+
+class Player:
+    """One scripted playthrough; ``request`` and ``join`` hide whether the app is in-process or remote."""
+
+    def __init__(self, request: Callable[..., tuple[int, Any]], join: Callable[[], Callable[[], int]]):
+        self.request = request
+        self.join = join
+        self.timings: Timings = defaultdict(list)
+        self.socket_events = 0
+
+    def timed(self, step: str, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        status, body = self.request(*args, **kwargs)
+        self.timings[step].append(time.perf_counter() - started)
+        if status >= 400:
+            raise RuntimeError(f"{step}: HTTP {status} {body!r}"[:300])
+        return body
+
+    def play(self) -> Timings:
+        name = uuid.uuid4().hex[:12]
+        account = {"username": name, "email": f"{name}@bench.local", "password": PASSWORD}
+        self.timed("register", "POST", "/register", form=account)
+        self.request("GET", "/logout")
+        self.timed("login", "POST", "/login", form={"username": name, "password": PASSWORD})
+        self.request("DELETE", "/api/state")  # new game, as game.js does
+
+        started = time.perf_counter()
+        leave = self.join()
+        self.timings["socket_join"].append(time.perf_counter() - started)
+
+        scene_id: str | None = START_SCENE
+        while scene_id is not None:
+            scene = self.timed("scene", "GET", f"/api/scene/{scene_id}")
+            choices = scene.get("choices") or []
+            if not choices:
+                break
+            # Rotate through the choices so different stat paths (and achievements) get exercised.
+            choice = choices[len(self.timings["choice"]) % len(choices)]
+            result = self.timed("choice", "POST", "/api/choice", json={"scene_id": scene_id, "choice_id": choice["id"]})
+            next_scene = result.get("next_scene")
+            if next_scene is not None and not next_scene.startswith("ch"):
+                next_scene = None  # ending_selector and friends end the run
+            next_chapter = int(next_scene[2:].split("_", 1)[0]) if next_scene else None
+            if next_chapter != scene.get("chapter"):
+                chapter = next_chapter or scene.get("chapter")
+                payload = {"slot": 1, "scene_id": next_scene or scene_id, "chapter": chapter}
+                self.timed("save", "POST", "/api/save", json=payload)
+                self.timed("load", "GET", "/api/load/1")
+            scene_id = next_scene
+        self.socket_events = leave()
+        return self.timings
+
+
+def run_inprocess(players: int) -> tuple[Timings, float, int]:
+    from app import app, socketio
+
+    app.config["LOGIN_RATE_LIMIT"] = False  # every virtual player logs in from the same address
+    timings: Timings = defaultdict(list)
+    events = 0
+    started = time.perf_counter()
+    for _ in range(players):
+        with app.test_client() as client:
+            def request(method: str, path: str, json: Any = None, form: Any = None) -> tuple[int, Any]:
+                response = client.open(path, method=method, json=json, data=form)
+                return response.status_code, response.get_json(silent=True)
+
+            def join() -> Callable[[], int]:
+                socket = socketio.test_client(app, flask_test_client=client)
+                socket.emit("join_game", {})
+
+                def leave() -> int:
+                    received = len(socket.get_received())
+                    socket.disconnect()
+                    return received
+
+                return leave
+
+            player = Player(request, join)
+            for step, values in player.play().items():
+                timings[step] += values
+            events += player.socket_events
+    return timings, time.perf_counter() - started, events
+
+
+def remote_player(base_url: str, transports: list[str]) -> tuple[Timings, int]:
+    import requests
+    import socketio
+
+    session = requests.Session()
+
+    def request(method: str, path: str, json: Any = None, form: Any = None) -> tuple[int, Any]:
+        response = session.request(method, base_url + path, json=json, data=form, allow_redirects=False)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    client = socketio.Client(http_session=session)
+    received: list[str] = []
+    joined = threading.Event()
+
+    @client.on("*")
+    def on_event(event: str, data: Any) -> None:
+        received.append(event)
+        joined.set()
+
+    def join() -> Callable[[], int]:
+        client.connect(base_url, transports=transports, wait_timeout=10)
+        client.emit("join_game", {})
+        if not joined.wait(10):
+            raise RuntimeError("socket_join: scene_update tidak diterima")
+
+        def leave() -> int:
+            client.disconnect()
+            return len(received)
+
+        return leave
+
+    player = Player(request, join)
+    try:
+        return player.play(), player.socket_events
+    finally:
+        client.disconnect()
+
+
+def run_server(
+    players: int, clients: int, base_url: str | None, workers: int, port: int, transports: list[str]
+) -> tuple[Timings, float, int]:
+    from bench_cluster import wait_for_port
+
+    server = None
+    if base_url is None:
+        scratch = tempfile.mkdtemp(prefix="vn-bench-loop-")
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{scratch}/game.db", "CACHE_DIR": f"{scratch}/cache"}
+        env["SESSION_CACHE_DIR"] = f"{scratch}/sessions"
+        env["LOGIN_RATE_LIMIT"] = "0"  # every virtual player logs in from 127.0.0.1
+        command = [sys.executable, str(ROOT / "serve.py"), "--workers", str(workers), "--port", str(port)]
+        server = subprocess.Popen(
+            [*command, "--host", "127.0.0.1", "--allow-local-emits"],  # every player's emits stay on its worker
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+
+    timings: Timings = defaultdict(list)
+    events = 0
+    try:
+        if server is not None:
+            wait_for_port(port)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            for player_timings, received in pool.map(lambda _: remote_player(base_url, transports), range(players)):
+                for step, values in player_timings.items():
+                    timings[step] += values
+                events += received
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+    return timings, elapsed, events
+
+
+def summarize(timings: Timings, elapsed: float) -> dict[str, Any]:
+    steps = {}
+    for step in STEPS:
+        values = sorted(timings.get(step, ()))
+        if not values:
+            continue
+        cuts = quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+        steps[step] = {
+            "count": len(values),
+            "p50_ms": round(cuts[49] * 1000, 3),
+            "p95_ms": round(cuts[94] * 1000, 3),
+            "p99_ms": round(cuts[98] * 1000, 3),
+        }
+    total = sum(len(values) for values in timings.values())
+    return {"requests": total, "seconds": round(elapsed, 3), "rps": round(total / elapsed, 1), "steps": steps}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Regressions of ``current`` against ``baseline``: slower p95 per step, or lower throughput."""
+    regressions = []
+    for step, stats in current["steps"].items():
+        before = baseline["steps"].get(step)
+        if before and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{step}: p95 {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+    if current["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput: {baseline['rps']:.1f} -> {current['rps']:.1f} req/s")
+    return regressions
+
+
+def print_report(report: dict[str, Any], baseline: dict[str, Any] | None = None) -> None:
+    print(f"{report['mode']}: {report['players']} players, {report['requests']} requests in {report['seconds']:.2f}s"
+          f" = {report['rps']:.1f} req/s, {report['socket_events']} socket events")
+    print(f"{'step':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'base p95':>10}")
+    for step, stats in report["steps"].items():
+        before = (baseline or {}).get("steps", {}).get(step, {}).get("p95_ms")
+        base = f"{before:>10.2f}" if before is not None else f"{'-':>10}"
+        print(f"{step:<12}{stats['count']:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"{base}")
+
+
+def git_revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--server", action="store_true", help="jalankan serve.py dan pakai klien HTTP + Socket.IO")
+    parser.add_argument("--url", help="server yang sudah berjalan, mis. http://127.0.0.1:5000 (implies --server)")
+    parser.add_argument("--clients", type=int, default=8, help="pemain bersamaan pada mode server")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--transport", action="append", help="transport Socket.IO (default: polling)")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.server or args.url:
+        mode = "server"
+        timings, elapsed, events = run_server(
+            args.players, args.clients, args.url, args.workers, args.port, args.transport or ["polling"]
+        )
+    else:
+        mode = "inprocess"
+        # A scratch database keeps benchmark accounts out of data/game.db; set before app is imported.
+        scratch = tempfile.mkdtemp(prefix="vn-bench-loop-")
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{scratch}/game.db")
+        from app import app, db
+
+        with app.app_context():
+            db.create_all()
+        timings, elapsed, events = run_inprocess(args.players)
+
+    report = {
+        "mode": mode,
+        "players": args.players,
+        "socket_events": events,
+        **summarize(timings, elapsed),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+    }
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline disimpan ke {args.save_baseline}")
+    if baseline is not None:
+        if baseline.get("mode") != mode or baseline.get("players") != args.players:
+            print("peringatan: baseline dibuat dengan mode/jumlah pemain berbeda")
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESI {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"tidak ada regresi di atas {args.tolerance:.0%} dibanding {baseline.get('revision', '?')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark save codecs on states produced by replaying choices through every chapter."""
+from __future__ import annotations
+
+import copy
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from story_engine.save_manager import CODECS, SaveManager  # noqa: E402
+from story_engine.story_loader import TERMINAL_SCENES, StoryLoader  # noqa: E402
+
+
+def playthrough(loader: StoryLoader, seed: int) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    state: dict[str, Any] = {"stats": {}, "flags": {}, "inventory": ["choco"]}
+    scene_id = "ch1_scene_1"
+    snapshots = []
+    while scene_id not in TERMINAL_SCENES:
+        choice = rng.choice(loader.get_scene(scene_id)["choices"])
+        scene_id = loader.process_choice(scene_id, choice["id"], state)["next_scene"]
+        snapshots.append(copy.deepcopy(state))
+    return snapshots
+
+
+def main(players: int = 20) -> None:
+    loader = StoryLoader(ROOT / "story_data")
+    runs = [playthrough(loader, seed) for seed in range(players)]
+    states = [state for run in runs for state in run]
+
+    print(f"{len(states)} autosaves from {players} playthroughs")
+    print(f"{'codec':<12}{'bytes/save':>12}{'pack/s':>12}{'unpack/s':>12}")
+    legacy_bytes = sum(len(json.dumps(state, ensure_ascii=False)) for state in states)
+    print(f"{'legacy':<12}{legacy_bytes / len(states):>12.0f}{'':>12}{'':>12}")
+    for name in CODECS:
+        for delta in (False, True):
+            manager = SaveManager(codec=name, delta=delta)
+            started = time.perf_counter()
+            columns = []
+            for run in runs:
+                payload = base = None
+                for state in run:
+                    payload, base = manager.pack_slot(state, payload, base)
+                    columns.append((payload, base))
+            pack_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for payload, base in columns:
+                manager.unpack_state(payload, manager.unpack_state(base) if base else None)
+            unpack_time = time.perf_counter() - started
+
+            stored = sum(len(payload) for payload, _ in columns) / len(columns)
+            label = f"{name}+delta" if delta else name
+            print(f"{label:<12}{stored:>12.0f}{len(columns) / pack_time:>12.0f}{len(columns) / unpack_time:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
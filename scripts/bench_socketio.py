@@ -0,0 +1,47 @@
+"""Fan-out benchmark: many sockets per process receiving bursts of per-room events."""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from app import app, emitter, socketio  # noqa: E402
+
+
+def run(sockets: int, events_per_room: int, rounds: int, batched: bool) -> tuple[float, int]:
+    clients = []
+    for n in range(sockets):
+        client = socketio.test_client(app)
+        room = f"bench-{n}"
+        socketio.server.enter_room(socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/"), room)
+        clients.append((client, room))
+
+    emitter.enabled = batched
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for _, room in clients:
+            for n in range(events_per_room):
+                emitter.emit("achievement_unlocked", {"achievement": f"ach_{n:02d}"}, room=room)
+        emitter.flush()
+    elapsed = time.perf_counter() - started
+
+    frames = sum(len(client.get_received()) for client, _ in clients)
+    for client, _ in clients:
+        client.disconnect()
+    return elapsed, frames
+
+
+def main(sockets: int = 500, events_per_room: int = 4, rounds: int = 10) -> None:
+    events = sockets * events_per_room * rounds
+    print(f"{sockets} sockets, {events_per_room} events/room, {rounds} rounds ({events} events)")
+    for batched in (False, True):
+        elapsed, frames = run(sockets, events_per_room, rounds, batched)
+        label = "batched" if batched else "unbatched"
+        print(f"{label:<10} frames={frames:>7} {events / elapsed:>10.0f} events/s {elapsed * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Dict game state versus the compact GameState after a full ten-chapter playthrough.
+
+Compares per-session memory, save payload size and encode/decode time.
+"""
+from __future__ import annotations
+
+import pickle
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from story_engine.flag_manager import GameState, StateLayout, story_state_names  # noqa: E402
+from story_engine.save_manager import SaveManager  # noqa: E402
+from story_engine.story_loader import StoryLoader  # noqa: E402
+
+
+def allocated(build: Callable[[], Any], count: int = 1000) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [build() for _ in range(count)]
+    size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    del keep
+    return size / count
+
+
+def per_call(fn: Callable[[], Any], number: int = 2000) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    loader = StoryLoader(ROOT / "story_data")
+    layout = StateLayout.load(ROOT / "story_data" / "state_layout.json")
+    layout.intern(*story_state_names(loader.iter_scenes()))
+    plain: dict[str, Any] = {"stats": {}, "flags": {}, "inventory": []}
+    for scene in loader.iter_scenes():
+        loader.process_choice(scene["id"], scene["choices"][0]["id"], plain)
+    compact = GameState.from_dict(layout, plain)
+    blob = compact.to_bytes()
+
+    print(f"{len(plain['flags'])} flag, {len(plain['stats'])} stat")
+    print(f"memori/sesi   dict {allocated(lambda: pickle.loads(pickle.dumps(plain))):>8.0f} B"
+          f"   compact {allocated(lambda: GameState.from_bytes(layout, blob)):>8.0f} B")
+    print(f"cache blob    dict {len(pickle.dumps(plain)):>8} B   compact {len(blob):>8} B")
+    for codec in ("json", "zlib"):
+        legacy, compact_saves = SaveManager(codec=codec), SaveManager(codec=codec, layout=layout)
+        legacy_payload, compact_payload = legacy.pack_state(plain), compact_saves.pack_state(plain)
+        print(f"save {codec:<8} dict {len(legacy_payload):>8} B   compact {len(compact_payload):>8} B")
+        print(f"  encode      dict {per_call(lambda: legacy.pack_state(plain)):>8.1f} us"
+              f"   compact {per_call(lambda: compact_saves._encode_bytes(compact.to_bytes())):>8.1f} us")
+        print(f"  decode      dict {per_call(lambda: legacy.unpack_state(legacy_payload)):>8.1f} us"
+              f"   compact {per_call(lambda: GameState.from_bytes(layout, blob)):>8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Incremental, parallel build of background image variants.
+
+Every source in static/images/backgrounds is decoded once and written as
+WebP variants with content-hashed names. A manifest records each source's
+hash so unchanged sources are skipped on the next run.
+
+    python scripts/build_assets.py [--workers N] [--force]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from utils.image_processor import BACKGROUND_VARIANTS, file_digest, render_variants  # noqa: E402
+
+SOURCE_DIR = ROOT / "static" / "images" / "backgrounds"
+OUT_DIR = ROOT / "static" / "images" / "variants"
+CONFIG_DIGEST = hashlib.sha256(repr(BACKGROUND_VARIANTS).encode("utf-8")).hexdigest()[:12]
+
+
+def build_one(source: Path, digest: str, out_dir: Path) -> tuple[str, dict[str, Any]]:
+    stat = source.stat()
+    entry = {
+        "sha256": digest,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "config": CONFIG_DIGEST,
+        "variants": render_variants(source, out_dir),
+    }
+    return source.name, entry
+
+
+def is_fresh(source: Path, entry: dict[str, Any] | None, out_dir: Path) -> tuple[bool, str | None]:
+    """Return ``(fresh, digest)``; size+mtime short-circuit hashing for untouched files."""
+    if entry is None or entry.get("config") != CONFIG_DIGEST:
+        return False, None
+    if not all((out_dir / v["file"]).exists() for v in entry["variants"].values()):
+        return False, None
+    stat = source.stat()
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True, entry["sha256"]
+    digest = file_digest(source)
+    return digest == entry["sha256"], digest
+
+
+def build(
+    source_dir: Path = SOURCE_DIR, out_dir: Path = OUT_DIR, workers: int | None = None, force: bool = False
+) -> dict[str, int]:
+    manifest_path = out_dir / "manifest.json"
+    manifest: dict[str, Any] = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    sources = sorted(p for p in source_dir.iterdir() if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".webp"})
+
+    todo: list[tuple[Path, str]] = []
+    for source in sources:
+        fresh, digest = (False, None) if force else is_fresh(source, manifest.get(source.name), out_dir)
+        if not fresh:
+            todo.append((source, digest or file_digest(source)))
+
+    stale_files = {
+        v["file"] for source, _ in todo if source.name in manifest for v in manifest[source.name]["variants"].values()
+    }
+    removed = [name for name in manifest if not (source_dir / name).exists()]
+    for name in removed:
+        stale_files.update(v["file"] for v in manifest.pop(name)["variants"].values())
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for name, entry in pool.map(build_one, *zip(*todo), [out_dir] * len(todo)):
+                manifest[name] = entry
+
+    # Replaced atomically: AssetManifest.refresh() reloads the file whenever its mtime changes.
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+    # Only after the new manifest is live, so a running server never points at a deleted file.
+    live_files = {v["file"] for entry in manifest.values() for v in entry["variants"].values()}
+    for name in stale_files - live_files:
+        (out_dir / name).unlink(missing_ok=True)
+    return {"sources": len(sources), "built": len(todo), "removed": len(removed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    result = build(workers=args.workers, force=args.force)
+    print(f"{result['built']}/{result['sources']} source dibangun, {result['removed']} dihapus "
+          f"dalam {time.perf_counter() - started:.2f}s")
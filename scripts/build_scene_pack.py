@@ -0,0 +1,19 @@
+"""Build the packed scene file used by StoryLoader's lazy mode."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from story_engine.scene_pack import build_scene_pack  # noqa: E402
+from story_engine.story_loader import StoryLoader  # noqa: E402
+
+if __name__ == "__main__":
+    out_path = Path(sys.argv[1]) if len(sys.argv) > 1 else ROOT / "instance" / "scenes.pack"
+    # Loading eagerly first validates every next_scene reference before the pack is written.
+    loader = StoryLoader(ROOT / "story_data")
+    count = build_scene_pack(loader.iter_scenes(), out_path)
+    print(f"{count} scene ditulis ke {out_path}")
+    print(f"Jalankan app dengan STORY_PACK={out_path} untuk mode lazy.")
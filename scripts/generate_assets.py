@@ -1,4 +1,6 @@
 """Generate placeholder assets for development."""
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from PIL import Image, ImageDraw
@@ -14,7 +16,18 @@ def create_placeholder(path: Path, text: str, size=(1280, 720)):
     image.save(path)
 
 
-if __name__ == "__main__":
+def placeholder_jobs():
     for chapter in range(1, 11):
         for scene in range(1, 11):
-            create_placeholder(ROOT / "static/images/backgrounds" / f"chapter_{chapter}_bg_{scene}.png", f"Chapter {chapter} Scene {scene}")
+            path = ROOT / "static/images/backgrounds" / f"chapter_{chapter}_bg_{scene}.png"
+            # Placeholders are deterministic, so an existing file never needs re-rendering.
+            if not path.exists():
+                yield path, f"Chapter {chapter} Scene {scene}"
+
+
+if __name__ == "__main__":
+    jobs = list(placeholder_jobs())
+    if jobs:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+            list(pool.map(create_placeholder, *zip(*jobs)))
+    print(f"{len(jobs)} placeholder dibuat")
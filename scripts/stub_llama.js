@@ -0,0 +1,42 @@
+// Stand-in for the llama.cpp /completion endpoint, for testing server.js without a model.
+//   PORT=8081 STUB_TOKEN_MS=30 node scripts/stub_llama.js
+const http = require("http");
+
+const PORT = process.env.PORT || 8081;
+const TOKEN_MS = Number(process.env.STUB_TOKEN_MS || 30);
+const FIRST_TOKEN_MS = Number(process.env.STUB_FIRST_TOKEN_MS || 200);
+const REPLY = "Tentu, aku di sini. Ceritakan pelan-pelan apa yang sedang kamu pikirkan.";
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+http
+  .createServer(async (req, res) => {
+    let body = "";
+    for await (const chunk of req) body += chunk;
+    const payload = JSON.parse(body || "{}");
+    const tokens = REPLY.split(/(?<= )/).slice(0, payload.n_predict || 256);
+    const started = Date.now();
+    await sleep(FIRST_TOKEN_MS);
+
+    if (!payload.stream) {
+      await sleep(TOKEN_MS * tokens.length);
+      res.writeHead(200, { "Content-Type": "application/json" });
+      res.end(JSON.stringify({
+        content: tokens.join(""),
+        tokens_predicted: tokens.length,
+        timings: { predicted_ms: TOKEN_MS * tokens.length },
+        prompt_length: payload.prompt.length,
+        elapsed_ms: Date.now() - started,
+      }));
+      return;
+    }
+
+    res.writeHead(200, { "Content-Type": "text/event-stream" });
+    for (const token of tokens) {
+      if (res.destroyed) return;
+      res.write(`data: ${JSON.stringify({ content: token, stop: false })}\n\n`);
+      await sleep(TOKEN_MS);
+    }
+    res.end(`data: ${JSON.stringify({ content: "", stop: true, tokens_predicted: tokens.length })}\n\n`);
+  })
+  .listen(PORT, "127.0.0.1", () => console.log(`Stub llama.cpp di http://127.0.0.1:${PORT}/completion`));
@@ -0,0 +1,210 @@
+"""Production entry point: preforked eventlet workers behind a sticky dispatcher.
+
+The master binds the public port, accepts connections and hands each socket to
+a worker over a Unix socketpair. Socket.IO requests are routed by their
+Engine.IO ``sid`` and every worker only issues sids that hash back to itself,
+so a session always lands on the worker that owns it. Other requests are
+spread round-robin. Routing looks at the first request of a connection only, so
+workers close every connection after one response (no keep-alive). Emits from
+one worker reach sockets held by another only through ``SOCKETIO_MESSAGE_QUEUE``,
+which is therefore required for more than one worker. The write-behind queue
+(``WRITE_BEHIND``) lives in each worker's memory and a read only flushes its own
+worker's queue, so it is refused with more than one worker. The master restarts
+workers that die.
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python serve.py --workers 4 --port 5000
+"""
+from __future__ import annotations
+
+import os
+
+# Must be set before app is imported: workers share cache and session state through the filesystem.
+os.environ.setdefault("CACHE_TYPE", "FileSystemCache")
+os.environ.setdefault("SESSION_STORE", "cache")
+# Workers share one SQLite file; WAL keeps their readers from queuing behind each other's writes.
+os.environ.setdefault("DB_PROFILE", "sqlite-tuned")
+
+import argparse  # noqa: E402
+import gc  # noqa: E402
+import itertools  # noqa: E402
+import json  # noqa: E402
+import re  # noqa: E402
+import signal  # noqa: E402
+import sys  # noqa: E402
+import zlib  # noqa: E402
+from typing import Any  # noqa: E402
+
+import eventlet  # noqa: E402
+import eventlet.wsgi  # noqa: E402
+from eventlet import greenio, hubs  # noqa: E402
+
+# Preloading the app parses the story data once; forked workers share those pages copy-on-write.
+from app import app, bootstrap, db, logger, socketio, write_queue  # noqa: E402
+
+real_socket = eventlet.patcher.original("socket")
+SID_PATTERN = re.compile(rb"[?&]sid=([^&\s]+)")
+
+
+def worker_for(sid: bytes, workers: int) -> int:
+    return zlib.crc32(sid) % workers
+
+
+class HandoffListener:
+    """Stand-in for a listening socket that yields connections passed by the master."""
+
+    family = real_socket.AF_INET
+
+    def __init__(self, channel: Any, address: tuple[str, int]):
+        self.channel = channel
+        self.address = address
+
+    def getsockname(self) -> tuple[str, int]:
+        return self.address
+
+    def accept(self) -> tuple[Any, tuple[str, int]]:
+        while True:
+            try:
+                msg, fds, _, _ = real_socket.recv_fds(self.channel, 512, 1)
+            except BlockingIOError:
+                hubs.trampoline(self.channel.fileno(), read=True)
+                continue
+            if not fds:
+                raise SystemExit  # master closed the channel
+            host, port = json.loads(msg)
+            return greenio.GreenSocket(real_socket.socket(fileno=fds[0])), (host, port)
+
+    def close(self) -> None:
+        self.channel.close()
+
+
+def run_worker(index: int, workers: int, channel: Any, address: tuple[str, int]) -> None:
+    with app.app_context():
+        db.engine.dispose()  # never reuse pooled connections inherited from the master
+    eio = socketio.server.eio
+    generate_id = eio.generate_id
+
+    def sticky_id() -> str:
+        while True:
+            sid = generate_id()
+            if worker_for(sid.encode("ascii"), workers) == index:
+                return sid
+
+    eio.generate_id = sticky_id
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    channel.setblocking(False)
+    try:
+        # No keep-alive: a reused connection would carry requests for sids owned by other workers.
+        eventlet.wsgi.server(HandoffListener(channel, address), app, log_output=False, keepalive=False)
+    finally:
+        write_queue.stop()
+
+
+def dispatch(conn: Any, addr: tuple[str, int], channels: list[Any], round_robin: Any) -> None:
+    conn.settimeout(5)
+    head = b""
+    try:
+        # Peek until the request line is complete so the sid can be read without consuming it.
+        while b"\r\n" not in head and len(head) < 4096:
+            head = conn.recv(4096, real_socket.MSG_PEEK)
+            if not head:
+                return
+            if b"\r\n" not in head:
+                eventlet.sleep(0.005)
+        match = SID_PATTERN.search(head.split(b"\r\n", 1)[0])
+        index = worker_for(match.group(1), len(channels)) if match else next(round_robin) % len(channels)
+        real_socket.send_fds(channels[index], [json.dumps(addr[:2]).encode("utf-8")], [conn.fileno()])
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def spawn_worker(index: int, workers: int, address: tuple[str, int], close: list[Any]) -> tuple[int, Any]:
+    """Fork worker ``index``; returns its pid and the master's end of its channel."""
+    parent, child = real_socket.socketpair(real_socket.AF_UNIX, real_socket.SOCK_SEQPACKET)
+    pid = os.fork()
+    if pid == 0:
+        # A worker restarted later is forked from the running master: drop its hub (pending accepts and
+        # dispatches stay with the master) and every master socket before serving.
+        hubs.use_hub()
+        parent.close()
+        for sock in close:
+            sock.close()
+        run_worker(index, workers, child, address)
+        os._exit(0)
+    child.close()
+    return pid, parent
+
+
+def accept_loop(listener: Any, channels: list[Any]) -> None:
+    pool = eventlet.GreenPool()
+    round_robin = itertools.count()
+    while True:
+        conn, addr = listener.accept()
+        pool.spawn_n(dispatch, conn, addr, channels, round_robin)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("--workers", type=int, help="default: jumlah CPU bila ada message queue, selain itu 1")
+    parser.add_argument(
+        "--allow-local-emits",
+        action="store_true",
+        help="izinkan >1 worker tanpa message queue (benchmark); emit ke socket di worker lain hilang",
+    )
+    args = parser.parse_args()
+    has_queue = bool(app.config["SOCKETIO_MESSAGE_QUEUE"])
+    workers = args.workers or ((os.cpu_count() or 1) if has_queue else 1)
+    if workers > 1 and not has_queue and not args.allow_local_emits:
+        parser.error("--workers > 1 butuh SOCKETIO_MESSAGE_QUEUE (mis. redis://localhost:6379/0)")
+    if workers > 1 and app.config["WRITE_BEHIND"]:
+        # A /api/load on one worker cannot flush a save still queued in another.
+        parser.error("WRITE_BEHIND hanya didukung dengan --workers 1")
+    address = (args.host, args.port)
+
+    bootstrap()
+    with app.app_context():
+        db.engine.dispose()
+    gc.freeze()  # keep the preloaded heap out of the collector so it stays shared after fork
+
+    channels: list[Any] = []
+    pids: dict[int, int] = {}
+    for index in range(workers):
+        pid, channel = spawn_worker(index, workers, address, channels)
+        channels.append(channel)
+        pids[pid] = index
+
+    listener = eventlet.listen(address)
+    logger.info("serve.py: %d workers on %s:%d", workers, args.host, args.port)
+    print(f"{workers} worker berjalan di http://{args.host}:{args.port}")
+    eventlet.spawn_n(accept_loop, listener, channels)
+    # Only flag it: an exception raised in whatever greenthread the signal interrupts could kill accept_loop.
+    stopping: list[int] = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        while not stopping:
+            eventlet.sleep(1)
+            # Forked from the main greenlet, so the new worker starts clean (see spawn_worker).
+            while pids:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                index = pids.pop(pid)
+                logger.error("serve.py: worker %d (pid %d) mati (status %d), dijalankan ulang", index, pid, status)
+                channels[index].close()
+                pid, channels[index] = spawn_worker(index, workers, address, [listener, *channels])
+                pids[pid] = index
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        for channel in channels:
+            channel.close()
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
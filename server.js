@@ -4,8 +4,18 @@ const path = require("path");
 
 const PORT = process.env.PORT || 8080;
 const ROOT = __dirname;
-const MEMORY_PATH = path.join(ROOT, "memory", "user_memory.json");
+const MEMORY_DIR = path.join(ROOT, "memory");
+// The single-user memory file from before per-user storage belongs to the "default" user.
+const MEMORY_PATH = path.join(MEMORY_DIR, "user_memory.json");
+const MEMORY_COMPACT_EVERY = Number(process.env.MEMORY_COMPACT_EVERY || 50);
+const MEMORY_CACHE_USERS = Number(process.env.MEMORY_CACHE_USERS || 1000);
+const CONTEXT_TOKENS = Number(process.env.CONTEXT_TOKENS || 2048);
 const LLAMA_SERVER_URL = process.env.LLAMA_SERVER_URL || "http://127.0.0.1:8081/completion";
+// llama.cpp serves one request per slot; extra chats wait here instead of piling onto the model.
+const CHAT_CONCURRENCY = Number(process.env.CHAT_CONCURRENCY || 1);
+const CHAT_QUEUE_LIMIT = Number(process.env.CHAT_QUEUE_LIMIT || 32);
+const CHAT_USER_QUEUE_LIMIT = Number(process.env.CHAT_USER_QUEUE_LIMIT || 2);
+const METRIC_WINDOW = 200;
 
 const MIME_TYPES = {
   ".html": "text/html",
@@ -60,69 +70,465 @@ function readBody(req) {
   });
 }
 
-async function handleChat(req, res) {
-  try {
-    const payload = await readBody(req);
-    const response = await fetch(LLAMA_SERVER_URL, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        prompt: `${payload.prompt}\nUSER: ${payload.message}\nASSISTANT:`,
-        n_predict: payload.max_tokens || 256,
-        temperature: payload.temperature ?? 0.7,
-        stop: payload.stop || ["USER:", "SYSTEM:"],
-      }),
+const SYSTEM_PROMPT = `Kamu adalah companion AI yang terinspirasi Mahiru: tenang, cerdas, perhatian, dan praktis. Kamu tidak genit, tidak romantis, tidak menggoda, dan tidak mengklaim kepemilikan user. Jawaban harus rapi, lembut tapi tegas, fokus membantu dan menemani berpikir. Jika informasi tidak jelas, minta klarifikasi. Jangan mengada-ada. Gunakan memori percakapan untuk konsistensi, tetapi jangan menyebut sistem internal.`;
+const INSTRUCTION = "Balas sebagai Mahiru yang konsisten. Jangan menyebutkan bagian SYSTEM atau MEMORY.";
+
+function emptyMemory() {
+  return { summary: "", facts: [], preferences: [], emotion_patterns: {}, last_updated: null };
+}
+
+// Describes how `next` differs from `current`. Patches are idempotent (list items are unioned,
+// object keys and scalars are set), so replaying a log over a newer snapshot is harmless.
+function diffMemory(current, next) {
+  const patch = {};
+  for (const [key, value] of Object.entries(next)) {
+    const before = current[key];
+    if (Array.isArray(value) && Array.isArray(before) && before.every((item) => value.includes(item))) {
+      const added = value.filter((item) => !before.includes(item));
+      if (added.length) patch[key] = { add: added };
+    } else if (value && typeof value === "object" && !Array.isArray(value) && before && typeof before === "object") {
+      const changed = Object.fromEntries(Object.entries(value).filter(([k, v]) => before[k] !== v));
+      if (Object.keys(changed).length) patch[key] = { merge: changed };
+    } else if (JSON.stringify(before) !== JSON.stringify(value)) {
+      patch[key] = { set: value };
+    }
+  }
+  return patch;
+}
+
+function applyPatch(memory, patch) {
+  for (const [key, op] of Object.entries(patch)) {
+    if (op.add) memory[key] = [...new Set([...(memory[key] || []), ...op.add])];
+    else if (op.merge) memory[key] = { ...(memory[key] || {}), ...op.merge };
+    else memory[key] = op.set;
+  }
+  return memory;
+}
+
+// Per-user memory as a compact snapshot plus an append-only patch log. Each update appends one
+// line; every MEMORY_COMPACT_EVERY patches the log is folded into the snapshot.
+class MemoryStore {
+  constructor(dir, compactEvery, maxUsers) {
+    this.dir = dir;
+    this.compactEvery = compactEvery;
+    this.maxUsers = maxUsers;
+    this.users = new Map();
+    this.locks = new Map();
+  }
+
+  paths(userId) {
+    if (userId === "default") return { snapshot: MEMORY_PATH, log: MEMORY_PATH.replace(/\.json$/, ".log") };
+    const base = path.join(this.dir, "users", userId);
+    return { snapshot: `${base}.json`, log: `${base}.log` };
+  }
+
+  // Runs `task` after every earlier operation for the same user, so appends and compaction never interleave.
+  exclusive(userId, task) {
+    const run = (this.locks.get(userId) || Promise.resolve()).then(task);
+    const tail = run.catch(() => {});
+    this.locks.set(userId, tail);
+    tail.then(() => {
+      if (this.locks.get(userId) === tail) this.locks.delete(userId);
     });
+    return run;
+  }
 
-    if (!response.ok) {
-      sendJSON(res, 502, { reply: "Model lokal tidak tersedia." });
-      return;
+  // LRU over loaded users. Everything is on disk, so an evicted user is simply read back on the next request;
+  // users with an operation in flight are kept so their entry is never replaced mid-update.
+  remember(userId, entry) {
+    this.users.delete(userId);
+    this.users.set(userId, entry);
+    for (const id of this.users.keys()) {
+      if (this.users.size <= this.maxUsers) break;
+      if (!this.locks.has(id)) this.users.delete(id);
     }
+    return entry;
+  }
+
+  async read(userId) {
+    if (this.users.has(userId)) return this.remember(userId, this.users.get(userId));
+    const { snapshot, log } = this.paths(userId);
+    const memory = { ...emptyMemory(), ...JSON.parse(await fs.promises.readFile(snapshot, "utf8").catch(() => "{}")) };
+    const lines = (await fs.promises.readFile(log, "utf8").catch(() => "")).split("\n").filter(Boolean);
+    lines.forEach((line) => applyPatch(memory, JSON.parse(line)));
+    return this.remember(userId, { memory, pending: lines.length });
+  }
+
+  load(userId) {
+    return this.exclusive(userId, async () => (await this.read(userId)).memory);
+  }
+
+  update(userId, next) {
+    return this.exclusive(userId, async () => {
+      const entry = await this.read(userId);
+      const patch = diffMemory(entry.memory, next);
+      if (!Object.keys(patch).length) return false;
+      const { snapshot, log } = this.paths(userId);
+      await fs.promises.mkdir(path.dirname(log), { recursive: true });
+      await fs.promises.appendFile(log, `${JSON.stringify(patch)}\n`);
+      applyPatch(entry.memory, patch);
+      entry.pending += 1;
+      if (entry.pending >= this.compactEvery) {
+        const tmp = `${snapshot}.tmp`;
+        await fs.promises.writeFile(tmp, JSON.stringify(entry.memory));
+        await fs.promises.rename(tmp, snapshot);
+        await fs.promises.writeFile(log, "");
+        entry.pending = 0;
+      }
+      return true;
+    });
+  }
+}
+
+const memoryStore = new MemoryStore(MEMORY_DIR, MEMORY_COMPACT_EVERY, MEMORY_CACHE_USERS);
+
+// The id is whatever the client sends, not an authenticated identity: anyone who knows (or guesses) an id can
+// read and overwrite that user's memory via /api/memory?user_id=. Fine for a local companion; put real
+// authentication in front of this before exposing it to other people.
+function userIdOf(req, payload = {}) {
+  const url = new URL(req.url, "http://localhost");
+  const userId = String(payload.user_id || url.searchParams.get("user_id") || req.headers["x-user-id"] || "default");
+  return /^[A-Za-z0-9_-]{1,64}$/.test(userId) ? userId : null;
+}
+
+// Rough count for budgeting; llama tokenizers average about four characters per token on this text.
+function estimateTokens(text) {
+  return Math.ceil(text.length / 4);
+}
+
+// Keeps the newest items that fit in `budget` tokens, in their original order.
+function fitNewest(items, budget) {
+  let used = 0;
+  let start = items.length;
+  while (start > 0 && used + estimateTokens(items[start - 1]) <= budget) {
+    used += estimateTokens(items[start - 1]);
+    start -= 1;
+  }
+  return items.slice(start);
+}
+
+// Layout, most stable first so llama.cpp's prompt cache can reuse the previous turn's prefix:
+// system prompt and instruction, long-term memory, conversation so far, then the per-turn note
+// and the new message.
+function buildContext(memory, history, note, message, maxTokens) {
+  const budget = CONTEXT_TOKENS - maxTokens;
+  const summary = memory.summary || "Belum ada ringkasan.";
+  const head = `SYSTEM: ${SYSTEM_PROMPT}\nINSTRUCTION: ${INSTRUCTION}\nMEMORY SUMMARY: ${summary}\n`;
+  const tail = `${note ? `NOTE: ${note}\n` : ""}USER: ${message}\nASSISTANT:`;
+  let remaining = budget - estimateTokens(head) - estimateTokens(tail);
+
+  const facts = fitNewest(memory.facts || [], Math.max(0, Math.floor(remaining * 0.2)));
+  const preferences = fitNewest(memory.preferences || [], Math.max(0, Math.floor(remaining * 0.15)));
+  const memoryBlock = `LONG TERM FACTS: ${facts.join("; ") || "Tidak ada fakta tersimpan."}\n`
+    + `LONG TERM PREFERENCES: ${preferences.join("; ") || "Tidak ada preferensi tersimpan."}\n`;
+  remaining -= estimateTokens(memoryBlock);
+
+  const turns = (history || []).map((turn) => `${turn.role}: ${turn.text}\n`);
+  let kept = fitNewest(turns, Math.max(0, remaining));
+  if (kept.length < turns.length) {
+    // Trim to three quarters of the budget so the next few turns append to an unchanged prefix.
+    kept = fitNewest(turns, Math.max(0, Math.floor(remaining * 0.75)));
+  }
+  return `${head}${memoryBlock}${kept.join("")}${tail}`;
+}
+
+class QueueFullError extends Error {}
+class UpstreamError extends Error {}
+
+// Picks the user with the fewest running chats, then the one served least recently, so one
+// chatty user cannot starve the others.
+class FairQueue {
+  constructor(concurrency, limit, userLimit) {
+    this.concurrency = concurrency;
+    this.limit = limit;
+    this.userLimit = userLimit;
+    this.active = 0;
+    this.size = 0;
+    this.users = new Map();
+    this.running = new Map();
+    this.lastServed = new Map();
+    this.served = 0;
+  }
+
+  run(userId, task, signal) {
+    const pending = this.users.get(userId) || [];
+    if (this.size >= this.limit || pending.length >= this.userLimit) {
+      return Promise.reject(new QueueFullError());
+    }
+    return new Promise((resolve, reject) => {
+      const job = { task, resolve, reject, queuedAt: Date.now() };
+      pending.push(job);
+      this.users.set(userId, pending);
+      this.size += 1;
+      signal.addEventListener("abort", () => this.cancel(userId, job), { once: true });
+      this.drain();
+    });
+  }
+
+  cancel(userId, job) {
+    const pending = this.users.get(userId);
+    const index = pending ? pending.indexOf(job) : -1;
+    if (index === -1) return;
+    pending.splice(index, 1);
+    if (!pending.length) this.users.delete(userId);
+    this.size -= 1;
+    job.reject(new Error("dibatalkan"));
+  }
+
+  next() {
+    let chosen = null;
+    let best = null;
+    for (const userId of this.users.keys()) {
+      const rank = [this.running.get(userId) || 0, this.lastServed.get(userId) ?? -1];
+      if (best === null || rank[0] < best[0] || (rank[0] === best[0] && rank[1] < best[1])) {
+        chosen = userId;
+        best = rank;
+      }
+    }
+    const pending = this.users.get(chosen);
+    const job = pending.shift();
+    if (!pending.length) this.users.delete(chosen);
+    this.lastServed.set(chosen, (this.served += 1));
+    return [chosen, job];
+  }
+
+  drain() {
+    while (this.active < this.concurrency && this.size > 0) {
+      const [userId, job] = this.next();
+      this.size -= 1;
+      this.active += 1;
+      this.running.set(userId, (this.running.get(userId) || 0) + 1);
+      const waited = Date.now() - job.queuedAt;
+      Promise.resolve()
+        .then(() => job.task(waited))
+        .then(job.resolve, job.reject)
+        .finally(() => {
+          this.active -= 1;
+          const running = this.running.get(userId) - 1;
+          if (running) {
+            this.running.set(userId, running);
+          } else {
+            this.running.delete(userId);
+            if (!this.users.has(userId)) this.lastServed.delete(userId);
+          }
+          this.drain();
+        });
+    }
+  }
+}
+
+const chatQueue = new FairQueue(CHAT_CONCURRENCY, CHAT_QUEUE_LIMIT, CHAT_USER_QUEUE_LIMIT);
+const chatMetrics = { completed: 0, failed: 0, rejected: 0, ttftMs: [], tokensPerSec: [], queueWaitMs: [] };
 
-    const data = await response.json();
-    const reply = data.content || data.reply || "(Tidak ada jawaban)";
-    sendJSON(res, 200, { reply });
+function recordMetric(name, value) {
+  const samples = chatMetrics[name];
+  samples.push(value);
+  if (samples.length > METRIC_WINDOW) samples.shift();
+}
+
+function percentile(samples, p) {
+  if (!samples.length) return null;
+  const sorted = [...samples].sort((a, b) => a - b);
+  return Math.round(sorted[Math.min(sorted.length - 1, Math.floor((p / 100) * sorted.length))] * 10) / 10;
+}
+
+function summarize(samples) {
+  return { p50: percentile(samples, 50), p95: percentile(samples, 95), samples: samples.length };
+}
+
+function handleChatMetrics(req, res) {
+  sendJSON(res, 200, {
+    active: chatQueue.active,
+    queued: chatQueue.size,
+    completed: chatMetrics.completed,
+    failed: chatMetrics.failed,
+    rejected: chatMetrics.rejected,
+    ttft_ms: summarize(chatMetrics.ttftMs),
+    tokens_per_sec: summarize(chatMetrics.tokensPerSec),
+    queue_wait_ms: summarize(chatMetrics.queueWaitMs),
+  });
+}
+
+async function buildPrompt(payload, userId) {
+  // Clients that still send a fully built prompt get the old concatenation.
+  if (typeof payload.prompt === "string") return `${payload.prompt}\nUSER: ${payload.message}\nASSISTANT:`;
+  const memory = await memoryStore.load(userId);
+  return buildContext(memory, payload.history, payload.note, payload.message, payload.max_tokens || 256);
+}
+
+async function completionRequest(payload, userId, stream, signal) {
+  return fetch(LLAMA_SERVER_URL, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    signal,
+    body: JSON.stringify({
+      prompt: await buildPrompt(payload, userId),
+      cache_prompt: true,
+      n_predict: payload.max_tokens || 256,
+      temperature: payload.temperature ?? 0.7,
+      stop: payload.stop || ["USER:", "SYSTEM:"],
+      stream,
+    }),
+  });
+}
+
+// Yields each parsed `data:` event of a server-sent event stream.
+async function* readEvents(body) {
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for await (const chunk of body) {
+    buffer += decoder.decode(chunk, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const event = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = event.split("\n").filter((line) => line.startsWith("data:")).map((line) => line.slice(5).trim());
+      if (data.length) yield JSON.parse(data.join("\n"));
+    }
+  }
+}
+
+function sendEvent(res, event, data) {
+  res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+}
+
+async function streamCompletion(payload, userId, res, signal) {
+  const started = Date.now();
+  const response = await completionRequest(payload, userId, true, signal);
+  if (!response.ok) throw new UpstreamError(`upstream ${response.status}`);
+
+  res.writeHead(200, { "Content-Type": "text/event-stream", "Cache-Control": "no-cache", Connection: "keep-alive" });
+  let reply = "";
+  let tokens = 0;
+  let firstTokenAt = null;
+  for await (const event of readEvents(response.body)) {
+    if (event.content) {
+      firstTokenAt ??= Date.now();
+      tokens += 1;
+      reply += event.content;
+      sendEvent(res, "token", { content: event.content });
+    }
+    if (event.stop) break;
+  }
+  const finished = Date.now();
+  return { reply, tokens, ttftMs: (firstTokenAt ?? finished) - started, genMs: finished - (firstTokenAt ?? started) };
+}
+
+async function bufferedCompletion(payload, userId, signal) {
+  const started = Date.now();
+  const response = await completionRequest(payload, userId, false, signal);
+  if (!response.ok) throw new UpstreamError(`upstream ${response.status}`);
+  const data = await response.json();
+  const finished = Date.now();
+  // Without streaming the first token reaches the user together with the last one.
+  return {
+    reply: data.content || data.reply || "",
+    tokens: data.tokens_predicted || 0,
+    ttftMs: finished - started,
+    genMs: data.timings?.predicted_ms,
+  };
+}
+
+async function handleChat(req, res) {
+  const controller = new AbortController();
+  res.on("close", () => {
+    if (!res.writableFinished) controller.abort();
+  });
+
+  let payload;
+  try {
+    payload = await readBody(req);
   } catch (error) {
-    sendJSON(res, 500, { reply: "Model lokal belum siap." });
+    sendJSON(res, 400, { reply: "Permintaan tidak valid." });
+    return;
+  }
+  const stream = payload.stream === true || (req.headers.accept || "").includes("text/event-stream");
+  const userId = userIdOf(req, payload);
+  if (userId === null) {
+    sendJSON(res, 400, { reply: "user_id tidak valid." });
+    return;
+  }
+
+  try {
+    const result = await chatQueue.run(
+      userId,
+      (waitedMs) => {
+        recordMetric("queueWaitMs", waitedMs);
+        const { signal } = controller;
+        return stream ? streamCompletion(payload, userId, res, signal) : bufferedCompletion(payload, userId, signal);
+      },
+      controller.signal,
+    );
+    chatMetrics.completed += 1;
+    recordMetric("ttftMs", result.ttftMs);
+    if (result.tokens && result.genMs > 0) recordMetric("tokensPerSec", (result.tokens * 1000) / result.genMs);
+
+    const reply = result.reply || "(Tidak ada jawaban)";
+    if (stream) {
+      sendEvent(res, "done", { reply, tokens: result.tokens, ttft_ms: result.ttftMs });
+      res.end();
+    } else {
+      sendJSON(res, 200, { reply });
+    }
+  } catch (error) {
+    if (error instanceof QueueFullError) {
+      chatMetrics.rejected += 1;
+      res.writeHead(429, { "Content-Type": "application/json", "Retry-After": "2" });
+      res.end(JSON.stringify({ reply: "Model sedang sibuk, coba lagi sebentar." }));
+      return;
+    }
+    if (controller.signal.aborted) return;
+    chatMetrics.failed += 1;
+    if (res.headersSent) {
+      sendEvent(res, "error", { reply: "Model lokal terputus." });
+      res.end();
+    } else if (error instanceof UpstreamError) {
+      sendJSON(res, 502, { reply: "Model lokal tidak tersedia." });
+    } else {
+      sendJSON(res, 500, { reply: "Model lokal belum siap." });
+    }
   }
 }
 
 async function handleMemory(req, res) {
+  const userId = userIdOf(req);
+  if (userId === null) {
+    sendJSON(res, 400, { ok: false });
+    return;
+  }
+
   if (req.method === "GET") {
-    fs.readFile(MEMORY_PATH, "utf8", (err, data) => {
-      if (err) {
-        sendJSON(res, 200, {
-          summary: "",
-          facts: [],
-          preferences: [],
-          emotion_patterns: {},
-          last_updated: null,
-        });
-        return;
-      }
-      res.writeHead(200, { "Content-Type": "application/json" });
-      res.end(data);
-    });
+    try {
+      sendJSON(res, 200, await memoryStore.load(userId));
+    } catch (error) {
+      sendJSON(res, 200, emptyMemory());
+    }
     return;
   }
 
   if (req.method === "POST") {
+    let payload;
     try {
-      const payload = await readBody(req);
-      fs.writeFile(MEMORY_PATH, JSON.stringify(payload, null, 2), (err) => {
-        if (err) {
-          sendJSON(res, 500, { ok: false });
-          return;
-        }
-        sendJSON(res, 200, { ok: true });
-      });
+      payload = await readBody(req);
     } catch (error) {
       sendJSON(res, 400, { ok: false });
+      return;
+    }
+    try {
+      const written = await memoryStore.update(userId, payload);
+      sendJSON(res, 200, { ok: true, written });
+    } catch (error) {
+      sendJSON(res, 500, { ok: false });
     }
   }
 }
 
 const server = http.createServer((req, res) => {
+  if (req.url.startsWith("/api/chat/metrics")) {
+    handleChatMetrics(req, res);
+    return;
+  }
+
   if (req.url.startsWith("/api/chat")) {
     handleChat(req, res);
     return;
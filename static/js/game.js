@@ -6,29 +6,59 @@ const ui = new UIManager();
 const audio = new AudioManager();
 const socket = new SocketHandler();
 
-let currentScene = 'ch1_scene_1';
+const START_SCENE = 'ch1_scene_1';
+let currentScene = START_SCENE;
 let gameState = { stats: {}, flags: {}, inventory: [] };
+const sceneCache = new Map();
+
+function prefetchScenes(hints) {
+  const ids = (hints || []).map((hint) => hint.id).filter((id) => !sceneCache.has(id));
+  if (!ids.length) return;
+  ids.forEach((id) => sceneCache.set(id, null));
+  fetch(`/api/scenes?ids=${ids.join(',')}`).then((res) => res.json()).then((data) => {
+    Object.entries(data.scenes || {}).forEach(([id, scene]) => {
+      sceneCache.set(id, scene);
+      ui.preloadBackground(scene);
+    });
+  }).catch(() => ids.forEach((id) => sceneCache.delete(id)));
+}
 
 async function loadScene(sceneId) {
-  const res = await fetch(`/api/scene/${sceneId}`);
-  const scene = await res.json();
+  let scene = sceneCache.get(sceneId);
+  if (!scene) {
+    const res = await fetch(`/api/scene/${sceneId}`);
+    scene = await res.json();
+  }
+  prefetchScenes(scene.prefetch);
   currentScene = scene.id;
+  ui.setBackground(scene);
   ui.setSpeaker(scene.speaker || 'Narator');
   ui.setDialogue(scene.dialogue || '...');
   ui.renderChoices(scene.choices || [], async (choiceId) => {
     const resp = await fetch('/api/choice', {
       method: 'POST', headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ scene_id: currentScene, choice_id: choiceId, state: gameState })
+      body: JSON.stringify({ scene_id: currentScene, choice_id: choiceId })
     });
     const data = await resp.json();
-    gameState = data.state || gameState;
+    if (resp.status === 409) {
+      // The server is at another scene (e.g. after a load in another tab) or the session expired.
+      alert(data.error);
+      if (data.scene_id) loadScene(data.scene_id);
+      return;
+    }
+    if (data.changes) {
+      Object.assign(gameState.stats, data.changes.stats);
+      Object.assign(gameState.flags, data.changes.flags);
+    }
+    prefetchScenes(data.prefetch);
     if (data.next_scene) loadScene(data.next_scene);
   });
   if (scene.music) audio.playBgm(scene.music);
 }
 
 document.getElementById('quick-save').addEventListener('click', async () => {
-  await fetch('/api/save', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ slot: 1, scene_id: currentScene, chapter: 1, state: gameState }) });
+  const res = await fetch('/api/save', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ slot: 1, scene_id: currentScene, chapter: 1 }) });
+  if (!res.ok) return alert((await res.json()).error || 'Quick save gagal');
   alert('Quick save sukses');
 });
 
@@ -41,4 +71,5 @@ document.getElementById('quick-load').addEventListener('click', async () => {
 });
 
 socket.init();
-loadScene(currentScene);
+// Every visit starts a new game; progress is resumed with Quick Load.
+fetch('/api/state', { method: 'DELETE' }).then(() => loadScene(START_SCENE));
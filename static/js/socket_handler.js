@@ -1,7 +1,16 @@
 export class SocketHandler {
-  constructor() { this.socket = io(); }
+  constructor() {
+    this.socket = io();
+    this.handlers = {};
+  }
+  on(event, handler) {
+    this.handlers[event] = handler;
+    this.socket.on(event, handler);
+  }
   init() {
     this.socket.emit('join_game', { session_id: crypto.randomUUID() });
-    this.socket.on('achievement_unlocked', ({ achievement }) => alert(`Achievement: ${achievement}`));
+    // The server coalesces several events for one room into a single batch frame.
+    this.socket.on('batch', (events) => events.forEach(({ event, data }) => this.handlers[event]?.(data)));
+    this.on('achievement_unlocked', ({ achievement }) => alert(`Achievement: ${achievement}`));
   }
 }
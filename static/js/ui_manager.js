@@ -1,6 +1,21 @@
 export class UIManager {
   setSpeaker(name) { document.getElementById('speaker').textContent = name; }
   setDialogue(text) { document.getElementById('dialog-text').textContent = text; }
+  backgroundUrl(scene) {
+    // Smallest variant that still covers the viewport; falls back to the original file.
+    const needed = window.innerWidth * (window.devicePixelRatio || 1);
+    const variants = scene.background_variants || [];
+    const pick = variants.find((v) => v.width >= needed) || variants[variants.length - 1];
+    return pick ? pick.url : scene.background && `/static/images/backgrounds/${scene.background}`;
+  }
+  setBackground(scene) {
+    const url = this.backgroundUrl(scene);
+    if (url) document.getElementById('background').style.backgroundImage = `url(${url})`;
+  }
+  preloadBackground(scene) {
+    const url = this.backgroundUrl(scene);
+    if (url) new Image().src = url;
+  }
   renderChoices(choices, onClick) {
     const root = document.getElementById('choices');
     root.innerHTML = '';
@@ -1,15 +1,36 @@
 """Achievement tracker and evaluator."""
 from __future__ import annotations
 
+import hashlib
 import json
+from bisect import bisect_right
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Mapping
 
 
 class AchievementSystem:
     def __init__(self, source: Path):
         with source.open("r", encoding="utf-8") as f:
             self.achievements: dict[str, dict[str, Any]] = json.load(f)
+        # Changes whenever the rules do, so callers know when unlocks must be backfilled with evaluate().
+        self.version = hashlib.sha1(json.dumps(self.achievements, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self._thresholds = self._compile_rules(self.achievements)
+
+    @staticmethod
+    def _compile_rules(achievements: dict[str, dict[str, Any]]) -> dict[str, tuple[list[int], list[str]]]:
+        """Group rules per stat into parallel ``(minimums, keys)`` lists sorted by minimum."""
+        grouped: dict[str, list[tuple[int, str]]] = {}
+        for key, data in achievements.items():
+            rule = data.get("rule", {})
+            stat_name = rule.get("stat")
+            if stat_name:
+                grouped.setdefault(stat_name, []).append((int(rule.get("min", 0)), key))
+
+        thresholds: dict[str, tuple[list[int], list[str]]] = {}
+        for stat_name, rules in grouped.items():
+            rules.sort(key=lambda rule: rule[0])
+            thresholds[stat_name] = ([minimum for minimum, _ in rules], [key for _, key in rules])
+        return thresholds
 
     def list_all(self) -> dict[str, dict[str, Any]]:
         return self.achievements
@@ -17,10 +38,26 @@ class AchievementSystem:
     def evaluate(self, state: dict[str, Any]) -> list[str]:
         unlocked: list[str] = []
         stats = state.get("stats", {})
-        for key, data in self.achievements.items():
-            rule = data.get("rule", {})
-            stat_name = rule.get("stat")
-            minimum = int(rule.get("min", 0))
-            if stat_name and int(stats.get(stat_name, 0)) >= minimum:
-                unlocked.append(key)
+        for stat_name, (minimums, keys) in self._thresholds.items():
+            unlocked.extend(keys[: bisect_right(minimums, int(stats.get(stat_name, 0)))])
         return unlocked
+
+    def evaluate_delta(
+        self, previous: Mapping[str, Any], current: Mapping[str, Any], changed: Iterable[str] | None = None
+    ) -> list[str]:
+        """Return achievements whose threshold was crossed going from ``previous`` to ``current`` stats.
+
+        Only the stats named in ``changed`` are looked at (default: all of ``current``). Thresholds
+        the stats already met before, including ``min <= 0``, are left to :meth:`evaluate`.
+        """
+        crossed: list[str] = []
+        for stat_name in current if changed is None else changed:
+            rules = self._thresholds.get(stat_name)
+            if rules is None or stat_name not in current:
+                continue
+            old, new = int(previous.get(stat_name, 0)), int(current[stat_name])
+            if new <= old:
+                continue
+            minimums, keys = rules
+            crossed.extend(keys[bisect_right(minimums, old) : bisect_right(minimums, new)])
+        return crossed
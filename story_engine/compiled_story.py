@@ -0,0 +1,54 @@
+"""Compiled story artifact: validated scenes, the flattened choice index and metadata in one file.
+
+Written by ``flask compile-story`` and loaded by ``StoryLoader(compiled_path=...)`` with a single
+unpickle, skipping JSON parsing and graph compilation at startup. Only load artifacts you built.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Mapping
+
+FORMAT = 1
+
+
+def story_digest(*parts: Any) -> str:
+    """Content version of the story; unlike the loader's mtime fingerprint it survives a fresh checkout."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def write_compiled_story(
+    out_path: Path,
+    scenes: dict[str, dict[str, Any]],
+    choices: Mapping[tuple[str, str], Any],
+    characters: dict[str, Any],
+    endings: dict[str, Any],
+) -> str:
+    """Write the artifact atomically and return its version."""
+    version = story_digest(scenes, characters, endings)
+    artifact = {
+        "format": FORMAT,
+        "version": version,
+        "scenes": scenes,
+        "choices": dict(choices),
+        "characters": characters,
+        "endings": endings,
+    }
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    tmp_path.write_bytes(pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(tmp_path, out_path)
+    return version
+
+
+def read_compiled_story(path: Path) -> dict[str, Any]:
+    artifact = pickle.loads(path.read_bytes())
+    if not isinstance(artifact, dict) or artifact.get("format") != FORMAT:
+        raise ValueError(f"{path} bukan compiled story format {FORMAT}; jalankan ulang flask compile-story")
+    return artifact
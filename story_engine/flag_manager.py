@@ -1,13 +1,312 @@
-"""Simple in-memory flag manager."""
+"""Compact per-player flag and stat state.
+
+Flag and stat names are interned into dense indexes by a :class:`StateLayout`; a
+:class:`GameState` then keeps flags as integer bitsets and stats as a fixed-layout
+``array('q')``. The layout is append-only (``story_data/state_layout.json``, extended by
+``flask compile-story``), so an index never changes meaning and old compact saves stay readable.
+Names the layout does not know, non-boolean flags and non-integer stats are kept in plain dicts,
+so conversion to and from the dict format is lossless.
+"""
 from __future__ import annotations
 
+import json
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping, NamedTuple
+
+BINARY_VERSION = 1
+_HEADER = struct.Struct("<BHHHH")  # version, len(true flags), len(false flags), stat count, len(stat mask)
+_INT64 = (-(1 << 63), (1 << 63) - 1)
+_STATS, _FLAGS = 1, 2
+_SECTION_KEYS = ("stats", "flags")
+
+
+class StateEffect(NamedTuple):
+    """A compiled choice in layout indexes; names the layout lacks stay in the ``extra_*`` fields."""
+
+    stat_deltas: tuple[tuple[int, int], ...]
+    set_mask: int
+    clear_mask: int
+    extra_stats: tuple[tuple[str, int], ...]
+    extra_flags: tuple[tuple[str, Any], ...]
+
+
+class StateLayout:
+    def __init__(self, flags: Iterable[str] = (), stats: Iterable[str] = ()):
+        self.flags: list[str] = []
+        self.stats: list[str] = []
+        self.flag_index: dict[str, int] = {}
+        self.stat_index: dict[str, int] = {}
+        self.intern(flags, stats)
+        self.compile = lru_cache(maxsize=4096)(self._compile)
+
+    def intern(self, flags: Iterable[str] = (), stats: Iterable[str] = ()) -> bool:
+        """Append unseen names in sorted order; existing indexes never move. Returns whether it grew."""
+        new_flags = sorted(set(flags) - self.flag_index.keys())
+        new_stats = sorted(set(stats) - self.stat_index.keys())
+        for name in new_flags:
+            self.flag_index[name] = len(self.flags)
+            self.flags.append(name)
+        for name in new_stats:
+            self.stat_index[name] = len(self.stats)
+            self.stats.append(name)
+        return bool(new_flags or new_stats)
+
+    @classmethod
+    def load(cls, path: Path) -> StateLayout:
+        if not path.exists():
+            return cls()
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(data.get("flags", []), data.get("stats", []))
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({"flags": self.flags, "stats": self.stats}, indent=1) + "\n", encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _compile(self, stat_deltas: tuple[tuple[str, int], ...], set_flags: tuple[tuple[str, Any], ...]) -> StateEffect:
+        indexed, extra_stats = [], []
+        for name, delta in stat_deltas:
+            if name in self.stat_index:
+                indexed.append((self.stat_index[name], delta))
+            else:
+                extra_stats.append((name, delta))
+        set_mask = clear_mask = 0
+        extra_flags = []
+        for name, value in set_flags:
+            if name in self.flag_index and isinstance(value, bool):
+                if value:
+                    set_mask |= 1 << self.flag_index[name]
+                else:
+                    clear_mask |= 1 << self.flag_index[name]
+            else:
+                extra_flags.append((name, value))
+        return StateEffect(tuple(indexed), set_mask, clear_mask, tuple(extra_stats), tuple(extra_flags))
+
+
+def story_state_names(scenes: Iterable[Mapping[str, Any]]) -> tuple[set[str], set[str]]:
+    """Every flag a scene sets and every stat a choice changes."""
+    flags: set[str] = set()
+    stats: set[str] = set()
+    for scene in scenes:
+        flags.update(scene.get("set_flags", {}))
+        for choice in scene.get("choices", []):
+            stats.update(choice.get("stat_changes", {}))
+    return flags, stats
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _int_bytes(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+class GameState:
+    """One player's state; ``stats`` has one slot per layout stat and ``stat_mask`` marks the ones set.
+
+    ``scene_id`` is the scene the player is at, tracked for the server-side session only: it is kept by
+    the binary form but is not part of the dict form, so saves are unaffected.
+    """
+
+    __slots__ = (
+        "layout",
+        "flags",
+        "false_flags",
+        "stats",
+        "stat_mask",
+        "extra_flags",
+        "extra_stats",
+        "other",
+        "sections",
+        "scene_id",
+    )
+
+    def __init__(self, layout: StateLayout):
+        self.layout = layout
+        self.flags = 0
+        self.false_flags = 0
+        self.stats = array("q", bytes(8 * len(layout.stats)))
+        self.stat_mask = 0
+        self.extra_flags: dict[str, Any] = {}
+        self.extra_stats: dict[str, Any] = {}
+        self.other: dict[str, Any] = {"inventory": []}
+        self.sections = _STATS | _FLAGS  # which of "stats"/"flags" the dict form has, even when empty
+        self.scene_id: str | None = None
+
+    @classmethod
+    def from_dict(cls, layout: StateLayout, data: Mapping[str, Any]) -> GameState:
+        state = cls(layout)
+        flags, stats = data.get("flags"), data.get("stats")
+        state.sections = (_STATS if isinstance(stats, dict) else 0) | (_FLAGS if isinstance(flags, dict) else 0)
+        state.other = {
+            key: value for key, value in data.items() if key not in _SECTION_KEYS or not isinstance(value, dict)
+        }
+        for name, value in (flags if isinstance(flags, dict) else {}).items():
+            state.set_flag(name, value)
+        for name, value in (stats if isinstance(stats, dict) else {}).items():
+            state.set_stat(name, value)
+        return state
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {}
+        if self.sections & _STATS:
+            data["stats"] = self.stats_dict()
+        if self.sections & _FLAGS:
+            data["flags"] = self.flags_dict()
+        return {**data, **self.other}
+
+    def stats_dict(self) -> dict[str, Any]:
+        names = self.layout.stats
+        return {**{names[i]: self.stats[i] for i in _bits(self.stat_mask)}, **self.extra_stats}
+
+    def flags_dict(self) -> dict[str, Any]:
+        names = self.layout.flags
+        flags = {names[i]: True for i in _bits(self.flags)}
+        flags.update((names[i], False) for i in _bits(self.false_flags))
+        flags.update(self.extra_flags)
+        return flags
+
+    def _grow(self) -> None:
+        # The layout only grows at startup, but a state can outlive it in a shared session cache.
+        self.stats.extend([0] * (len(self.layout.stats) - len(self.stats)))
+
+    def get_flag(self, name: str, default: Any = False) -> Any:
+        index = self.layout.flag_index.get(name)
+        if index is None:
+            return self.extra_flags.get(name, default)
+        if self.flags >> index & 1:
+            return True
+        return False if self.false_flags >> index & 1 else default
+
+    def set_flag(self, name: str, value: Any = True) -> None:
+        self.sections |= _FLAGS
+        index = self.layout.flag_index.get(name)
+        if index is None or not isinstance(value, bool):
+            self.extra_flags[name] = value
+            value = None
+        else:
+            self.extra_flags.pop(name, None)
+        if index is None:
+            return
+        bit = 1 << index
+        if value is None:
+            self.flags, self.false_flags = self.flags & ~bit, self.false_flags & ~bit
+        elif value:
+            self.flags, self.false_flags = self.flags | bit, self.false_flags & ~bit
+        else:
+            self.flags, self.false_flags = self.flags & ~bit, self.false_flags | bit
+
+    def get_stat(self, name: str, default: Any = 0) -> Any:
+        index = self.layout.stat_index.get(name)
+        if index is None:
+            return self.extra_stats.get(name, default)
+        return self.stats[index] if self.stat_mask >> index & 1 else default
+
+    def set_stat(self, name: str, value: Any) -> None:
+        self.sections |= _STATS
+        index = self.layout.stat_index.get(name)
+        if index is None or type(value) is not int or not _INT64[0] <= value <= _INT64[1]:
+            self.extra_stats[name] = value
+            if index is not None:
+                self.stat_mask &= ~(1 << index)
+            return
+        self.extra_stats.pop(name, None)
+        if index >= len(self.stats):
+            self._grow()
+        self.stats[index] = value
+        self.stat_mask |= 1 << index
+
+    def apply(self, effect: StateEffect) -> None:
+        self.sections = _STATS | _FLAGS
+        if effect.stat_deltas and len(self.stats) < len(self.layout.stats):
+            self._grow()
+        for index, delta in effect.stat_deltas:
+            if self.stat_mask >> index & 1:
+                self.stats[index] += delta
+            else:
+                # Same as the dict path: int(stats.get(name, 0)) + delta, even for a non-integer value.
+                self.set_stat(self.layout.stats[index], int(self.extra_stats.get(self.layout.stats[index], 0)) + delta)
+        for name, delta in effect.extra_stats:
+            self.extra_stats[name] = int(self.extra_stats.get(name, 0)) + delta
+        if self.extra_flags:
+            for index in _bits(effect.set_mask | effect.clear_mask):
+                self.extra_flags.pop(self.layout.flags[index], None)
+        self.flags = (self.flags | effect.set_mask) & ~effect.clear_mask
+        self.false_flags = (self.false_flags | effect.clear_mask) & ~effect.set_mask
+        self.extra_flags.update(effect.extra_flags)
+
+    def to_bytes(self) -> bytes:
+        used = self.stat_mask.bit_length()
+        stats = array("q", (self.stats[i] if self.stat_mask >> i & 1 else 0 for i in range(used)))
+        if sys.byteorder == "big":
+            stats.byteswap()
+        true_flags, false_flags, mask = _int_bytes(self.flags), _int_bytes(self.false_flags), _int_bytes(self.stat_mask)
+        header = _HEADER.pack(BINARY_VERSION, len(true_flags), len(false_flags), len(stats), len(mask))
+        rest = [self.sections, self.extra_flags, self.extra_stats, self.other]
+        if self.scene_id is not None:
+            rest.append(self.scene_id)
+        tail = json.dumps(rest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return b"".join((header, true_flags, false_flags, mask, stats.tobytes(), tail))
+
+    @classmethod
+    def from_bytes(cls, layout: StateLayout, raw: bytes) -> GameState:
+        try:
+            version, n_true, n_false, n_stats, n_mask = _HEADER.unpack_from(raw)
+        except (struct.error, TypeError) as exc:
+            raise ValueError("State biner terlalu pendek") from exc
+        if version != BINARY_VERSION:
+            raise ValueError(f"State biner versi {version} tidak dikenal")
+        pos = _HEADER.size
+        fields = []
+        for length in (n_true, n_false, n_mask):
+            fields.append(int.from_bytes(raw[pos : pos + length], "little"))
+            pos += length
+        state = cls(layout)
+        state.flags, state.false_flags, state.stat_mask = fields
+        if (state.flags | state.false_flags).bit_length() > len(layout.flags) or n_stats > len(layout.stats):
+            raise ValueError("State biner memakai layout yang lebih baru dari story ini")
+        stats = array("q")
+        stats.frombytes(raw[pos : pos + 8 * n_stats])
+        if len(stats) != n_stats or state.stat_mask.bit_length() > n_stats:
+            raise ValueError("Stat state biner rusak")
+        if sys.byteorder == "big":
+            stats.byteswap()
+        state.stats[: len(stats)] = stats
+        rest = json.loads(raw[pos + 8 * n_stats :])
+        if (
+            not isinstance(rest, list)
+            or len(rest) not in (4, 5)
+            or type(rest[0]) is not int
+            or not all(isinstance(part, dict) for part in rest[1:4])
+            or not isinstance(rest[4] if len(rest) > 4 else "", str)
+        ):
+            raise ValueError("Ekor state biner rusak")
+        state.sections, state.extra_flags, state.extra_stats, state.other = rest[:4]
+        state.scene_id = rest[4] if len(rest) > 4 else None
+        return state
+
 
 class FlagManager:
-    def __init__(self) -> None:
-        self.flags: dict[str, bool] = {}
+    """Flag access for one player's :class:`GameState`."""
+
+    def __init__(self, state: GameState | None = None) -> None:
+        self.state = state if state is not None else GameState(StateLayout())
+
+    @property
+    def flags(self) -> dict[str, Any]:
+        return self.state.flags_dict()
 
     def set(self, key: str, value: bool = True) -> None:
-        self.flags[key] = value
+        self.state.set_flag(key, value)
 
     def get(self, key: str, default: bool = False) -> bool:
-        return self.flags.get(key, default)
+        return self.state.get_flag(key, default)
@@ -3,16 +3,35 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping
 
 
 class InventorySystem:
     def __init__(self, item_file: Path):
         with item_file.open("r", encoding="utf-8") as f:
             self.items = json.load(f)
+        self.catalogue: Mapping[str, Mapping[str, Any]] = MappingProxyType(
+            {item_id: MappingProxyType(data) for item_id, data in self.items.items()}
+        )
+        # Each item's catalogue fields pre-encoded as the body of a JSON object, ready to splice.
+        self._fragments = {
+            item_id: json.dumps(data, ensure_ascii=False, sort_keys=True)[1:-1] + ","
+            for item_id, data in self.items.items()
+            if data
+        }
 
     def enrich_inventory(self, entries: list[dict[str, int]]):
         payload = []
         for entry in entries:
-            item_data = self.items.get(entry["item_id"], {})
+            item_data = self.catalogue.get(entry["item_id"], {})
             payload.append({**entry, **item_data})
         return payload
+
+    def render_inventory(self, rows: Iterable[tuple[str, int]]) -> str:
+        """JSON text of the enriched inventory for ``(item_id, qty)`` rows, without building dicts."""
+        fragments = self._fragments
+        return "[" + ",".join(
+            f'{{{fragments.get(item_id, "")}"item_id":{json.dumps(item_id, ensure_ascii=False)},"qty":{int(qty)}}}'
+            for item_id, qty in rows
+        ) + "]"
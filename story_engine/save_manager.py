@@ -1,15 +1,159 @@
-"""Save and load state utility."""
+"""Save and load state utility.
+
+Payloads are text with a one-character codec header so they fit the existing
+``SaveSlot.payload`` column. Legacy saves are plain JSON and start with ``{``.
+"""
 from __future__ import annotations
 
+import base64
 import json
-from typing import Any
+import zlib
+from typing import Any, Callable, NamedTuple
+
+from story_engine.flag_manager import GameState, StateLayout
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+DELTA_TAG = "d"
+COMPACT_TAG = "c"
+_MISSING = object()
+
+
+class SaveCodec(NamedTuple):
+    tag: str
+    compress: Callable[[bytes], bytes] | None
+    decompress: Callable[[bytes], bytes] | None
+
+
+CODECS: dict[str, SaveCodec] = {
+    "json": SaveCodec("j", None, None),
+    "zlib": SaveCodec("z", lambda raw: zlib.compress(raw, 9), zlib.decompress),
+}
+if zstandard is not None:
+    CODECS["zstd"] = SaveCodec(
+        "s", zstandard.ZstdCompressor(level=10).compress, zstandard.ZstdDecompressor().decompress
+    )
+CODECS_BY_TAG = {codec.tag: codec for codec in CODECS.values()}
+
+
+def diff_state(state: dict[str, Any], base: dict[str, Any]) -> dict[str, Any]:
+    """Describe ``state`` relative to ``base``; dict sections such as stats/flags are diffed per key."""
+    delta: dict[str, Any] = {"set": {}, "patch": {}, "drop": {}, "unset": [key for key in base if key not in state]}
+    for key, value in state.items():
+        old = base.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = {k: v for k, v in value.items() if old.get(k, _MISSING) != v}
+            removed = [k for k in old if k not in value]
+            if changed:
+                delta["patch"][key] = changed
+            if removed:
+                delta["drop"][key] = removed
+        elif old != value:
+            delta["set"][key] = value
+    return {k: v for k, v in delta.items() if v}
+
+
+def apply_delta(base: dict[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    state = {key: dict(value) if isinstance(value, dict) else value for key, value in base.items()}
+    for key in delta.get("unset", []):
+        state.pop(key, None)
+    state.update(delta.get("set", {}))
+    for key, changed in delta.get("patch", {}).items():
+        state.setdefault(key, {}).update(changed)
+    for key, removed in delta.get("drop", {}).items():
+        for k in removed:
+            state[key].pop(k, None)
+    return state
 
 
 class SaveManager:
-    def pack_state(self, state: dict[str, Any]) -> str:
-        return json.dumps(state, ensure_ascii=False)
+    def __init__(
+        self, codec: str = "zlib", delta: bool = False, delta_ratio: float = 0.5, layout: StateLayout | None = None
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"Codec save tidak dikenal: {codec}")
+        self.codec = CODECS[codec]
+        self.delta = delta
+        self.delta_ratio = delta_ratio
+        # With a layout, full snapshots are written as GameState bytes instead of JSON.
+        self.layout = layout
+
+    def _encode_bytes(self, raw: bytes) -> str:
+        packed = raw if self.codec.compress is None else self.codec.compress(raw)
+        return self.codec.tag + base64.b85encode(packed).decode("ascii")
+
+    def _encode(self, data: dict[str, Any]) -> str:
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        if self.codec.compress is None:
+            return self.codec.tag + raw
+        return self.codec.tag + base64.b85encode(self.codec.compress(raw.encode("utf-8"))).decode("ascii")
+
+    def _decode_compact(self, payload: str) -> dict[str, Any]:
+        codec = CODECS_BY_TAG.get(payload[:1])
+        if codec is None or self.layout is None:
+            raise ValueError("Save compact membutuhkan codec dan layout state yang dikenal")
+        try:
+            raw = base64.b85decode(payload[1:])
+            raw = raw if codec.decompress is None else codec.decompress(raw)
+        except Exception as exc:
+            raise ValueError("Save rusak") from exc
+        return GameState.from_bytes(self.layout, raw).to_dict()
+
+    @staticmethod
+    def _decode(payload: str) -> dict[str, Any]:
+        if payload[:1] == "{":
+            data = json.loads(payload)
+        elif (codec := CODECS_BY_TAG.get(payload[:1])) is None:
+            raise ValueError(f"Header save tidak dikenal: {payload[:1]!r}")
+        elif codec.decompress is None:
+            data = json.loads(payload[1:])
+        else:
+            try:
+                raw = codec.decompress(base64.b85decode(payload[1:]))
+            except Exception as exc:  # zlib.error / ZstdError carry no common base
+                raise ValueError("Save rusak") from exc
+            data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("Save harus berupa object")
+        return data
 
-    def unpack_state(self, payload: str) -> dict[str, Any]:
+    def pack_state(self, state: dict[str, Any], portable: bool = False) -> str:
+        """Encode a full snapshot; ``portable`` payloads do not depend on this story's state layout."""
+        if self.layout is None or portable:
+            return self._encode(state)
+        return COMPACT_TAG + self._encode_bytes(GameState.from_dict(self.layout, state).to_bytes())
+
+    def pack_delta(self, state: dict[str, Any], base: dict[str, Any]) -> str:
+        return DELTA_TAG + self._encode(diff_state(state, base))
+
+    def unpack_state(self, payload: str, base: dict[str, Any] | None = None) -> dict[str, Any]:
         if not payload:
             return {}
-        return json.loads(payload)
+        if payload[0] == DELTA_TAG:
+            if base is None:
+                raise ValueError("Save delta membutuhkan snapshot dasar")
+            return apply_delta(base, self._decode(payload[1:]))
+        if payload[0] == COMPACT_TAG:
+            return self._decode_compact(payload[1:])
+        return self._decode(payload)
+
+    def pack_slot(
+        self, state: dict[str, Any], previous_payload: str | None = None, previous_base: str | None = None
+    ) -> tuple[str, str | None]:
+        """Return the ``(payload, base_payload)`` columns for a slot write.
+
+        In delta mode the slot keeps its last full snapshot as base and only the
+        difference is written, until the delta outgrows ``delta_ratio`` of a full save.
+        """
+        full = self.pack_state(state)
+        if not self.delta or not previous_payload:
+            return full, None
+
+        base_payload = previous_base or previous_payload
+        delta = self.pack_delta(state, self.unpack_state(base_payload))
+        if len(delta) <= len(full) * self.delta_ratio:
+            return delta, base_payload
+        return full, None
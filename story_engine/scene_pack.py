@@ -0,0 +1,78 @@
+"""Packed scene file with an offset table, decoded lazily through mmap.
+
+Layout: ``MAGIC | version:u16 | count:u32`` followed by ``count`` table entries
+``id_len:u16 | id | offset:u64 | length:u32`` and then the UTF-8 JSON body of
+every scene at its recorded absolute offset.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable
+
+MAGIC = b"VNPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ENTRY_ID = struct.Struct("<H")
+ENTRY_POS = struct.Struct("<QI")
+
+
+def build_scene_pack(scenes: Iterable[dict[str, Any]], out_path: Path) -> int:
+    """Write ``scenes`` into a pack file and return the number of scenes written."""
+    blobs = [(scene["id"].encode("utf-8"), json.dumps(scene, ensure_ascii=False).encode("utf-8")) for scene in scenes]
+    offset = HEADER.size + sum(ENTRY_ID.size + len(scene_id) + ENTRY_POS.size for scene_id, _ in blobs)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(blobs)))
+        for scene_id, body in blobs:
+            f.write(ENTRY_ID.pack(len(scene_id)) + scene_id + ENTRY_POS.pack(offset, len(body)))
+            offset += len(body)
+        for _, body in blobs:
+            f.write(body)
+    return len(blobs)
+
+
+class ScenePack:
+    def __init__(self, path: Path, cache_size: int = 128):
+        self.path = path
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._table = self._read_table()
+        self.get = lru_cache(maxsize=cache_size)(self._decode)
+
+    def _read_table(self) -> dict[str, tuple[int, int]]:
+        magic, version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} bukan scene pack v{VERSION}")
+
+        table: dict[str, tuple[int, int]] = {}
+        pos = HEADER.size
+        for _ in range(count):
+            (id_len,) = ENTRY_ID.unpack_from(self._mm, pos)
+            pos += ENTRY_ID.size
+            scene_id = self._mm[pos : pos + id_len].decode("utf-8")
+            pos += id_len
+            table[scene_id] = ENTRY_POS.unpack_from(self._mm, pos)
+            pos += ENTRY_POS.size
+        return table
+
+    def _decode(self, scene_id: str) -> dict[str, Any] | None:
+        entry = self._table.get(scene_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(self._mm[offset : offset + length])
+
+    def __contains__(self, scene_id: object) -> bool:
+        return scene_id in self._table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def close(self) -> None:
+        self.get.cache_clear()
+        self._mm.close()
@@ -0,0 +1,90 @@
+"""Server-side game state per user, so clients do not round-trip the full state."""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class MemorySessionStore:
+    """In-process LRU store; entries also expire ``ttl`` seconds after they were last used."""
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def get(self, user_id: int) -> dict[str, Any] | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires, state = entry
+        now = self.clock()
+        if expires < now:
+            del self._entries[user_id]
+            return None
+        self._entries[user_id] = (now + self.ttl, state)
+        self._entries.move_to_end(user_id)
+        return state
+
+    def set(self, user_id: int, state: dict[str, Any]) -> None:
+        self._entries[user_id] = (self.clock() + self.ttl, state)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheSessionStore:
+    """Store backed by a flask_caching ``Cache`` so state can be shared between workers.
+
+    ``dumps``/``loads`` convert states to something cheap to store, e.g. ``GameState`` bytes.
+    """
+
+    def __init__(
+        self,
+        cache: Any,
+        ttl: float = 3600,
+        prefix: str = "session-state",
+        dumps: Callable[[Any], Any] | None = None,
+        loads: Callable[[Any], Any] | None = None,
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.prefix = prefix
+        self.dumps = dumps
+        self.loads = loads
+
+    def get(self, user_id: int) -> Any:
+        key = f"{self.prefix}:{user_id}"
+        stored = self.cache.get(key)
+        if stored is None:
+            return None
+        # Cache backends have no "touch"; writing it back gives the same sliding expiry as the memory store.
+        self.cache.set(key, stored, timeout=int(self.ttl))
+        if self.loads is None or isinstance(stored, dict):
+            return stored
+        return self.loads(stored)
+
+    def set(self, user_id: int, state: Any) -> None:
+        stored = state if self.dumps is None or isinstance(state, dict) else self.dumps(state)
+        self.cache.set(f"{self.prefix}:{user_id}", stored, timeout=int(self.ttl))
+
+    def delete(self, user_id: int) -> None:
+        self.cache.delete(f"{self.prefix}:{user_id}")
+
+
+def create_session_store(backend: str, cache: Any = None, **options: Any) -> MemorySessionStore | CacheSessionStore:
+    # In-process states are kept as live objects; only the cache backend needs dumps/loads.
+    dumps, loads = options.pop("dumps", None), options.pop("loads", None)
+    if backend == "memory":
+        return MemorySessionStore(**options)
+    if backend == "cache":
+        return CacheSessionStore(cache, ttl=options.get("ttl", 3600), dumps=dumps, loads=loads)
+    raise ValueError(f"Backend session state tidak dikenal: {backend}")
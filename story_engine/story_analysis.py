@@ -0,0 +1,220 @@
+"""Whole-graph stat and flag analysis: reachable endings, stat bounds per scene, achievements.
+
+Instead of enumerating paths (exponential in the number of branches), every scene carries one
+``[low, high]`` interval per stat and two flag bitsets: flags set on *some* path and on *every*
+path. Edges live in flat ``src``/``dst``/``delta`` arrays and are relaxed one strongly connected
+component at a time, in topological order. Outside of loops every edge is relaxed exactly once,
+so an acyclic story costs O(scenes + choices). Only the edges inside a loop are relaxed in
+rounds, at most O(k * edges) for a loop of k scenes; bounds that still grow after k rounds are
+widened to infinity.
+
+Bounds are per stat, so "reachable" means every requirement is individually attainable. An
+"unreachable" verdict is always exact.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping
+
+Interval = tuple[float, float]
+
+
+@dataclass
+class StoryAnalysis:
+    stats: tuple[str, ...]
+    scene_bounds: dict[str, dict[str, Interval]] = field(default_factory=dict)
+    exit_bounds: dict[str, Interval] = field(default_factory=dict)
+    exit_flags: dict[str, str] = field(default_factory=dict)
+    unreachable_scenes: list[str] = field(default_factory=list)
+    endings: dict[str, bool] = field(default_factory=dict)
+    achievements: dict[str, bool] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        def bounds(intervals: Mapping[str, Interval]) -> dict[str, list[float | None]]:
+            return {stat: [None if math.isinf(v) else v for v in interval] for stat, interval in intervals.items()}
+
+        return {
+            "endings": self.endings,
+            "achievements": self.achievements,
+            "unreachable_scenes": self.unreachable_scenes,
+            "exit_bounds": bounds(self.exit_bounds),
+            "exit_flags": self.exit_flags,
+            "scene_bounds": {scene_id: bounds(b) for scene_id, b in self.scene_bounds.items()},
+        }
+
+
+def _components(succ: list[list[int]]) -> list[list[int]]:
+    """Strongly connected components of nodes ``0..len(succ)-1`` in topological order (iterative Tarjan)."""
+    order = [-1] * len(succ)
+    low = [0] * len(succ)
+    on_stack = [False] * len(succ)
+    stack: list[int] = []
+    components: list[list[int]] = []
+    counter = 0
+    for root in range(len(succ)):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(succ[v]):
+                work[-1] = (v, i + 1)
+                w = succ[v][i]
+                if order[w] == -1:
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w]:
+                    low[v] = min(low[v], order[w])
+                continue
+            work.pop()
+            if work:
+                low[work[-1][0]] = min(low[work[-1][0]], low[v])
+            if low[v] == order[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                components.append(component)
+    components.reverse()  # Tarjan finishes sinks first
+    return components
+
+
+def analyze_story(
+    scenes: Mapping[str, dict[str, Any]],
+    start_scene: str,
+    achievements: Mapping[str, dict[str, Any]],
+    endings: Mapping[str, dict[str, Any]],
+    terminal_scenes: Iterable[str] = (),
+) -> StoryAnalysis:
+    terminal = set(terminal_scenes)
+    all_choices = [choice for scene in scenes.values() for choice in scene.get("choices", [])]
+    stat_names = {stat for choice in all_choices for stat in choice.get("stat_changes", {})}
+    stat_names |= {a.get("rule", {}).get("stat") for a in achievements.values()} - {None}
+    stat_names |= {stat for e in endings.values() for stat in e.get("requirements", {}).get("stats", {})}
+    stats = tuple(sorted(stat_names))
+    flag_names = {flag for scene in scenes.values() for flag in scene.get("set_flags", {})}
+    flag_names |= {flag for e in endings.values() for flag in e.get("requirements", {}).get("flags", {})}
+    flag_bit = {flag: 1 << n for n, flag in enumerate(sorted(flag_names))}
+
+    # Node n is the n-th scene; the extra last node collects every way out of the story.
+    order = list(scenes)
+    index = {scene_id: n for n, scene_id in enumerate(order)}
+    exit_node = len(order)
+    src: list[int] = []
+    dst: list[int] = []
+    deltas: list[tuple[int, ...]] = []
+    set_mask = [0] * len(order)
+    for scene_id in order:
+        scene = scenes[scene_id]
+        u = index[scene_id]
+        for flag, value in scene.get("set_flags", {}).items():
+            if value:
+                set_mask[u] |= flag_bit[flag]
+        choices = scene.get("choices", [])
+        for choice in choices:
+            target = choice.get("next_scene")
+            if target in index or target is None or target in terminal:
+                changes = choice.get("stat_changes", {})
+                src.append(u)
+                dst.append(index.get(target, exit_node))
+                deltas.append(tuple(int(changes.get(stat, 0)) for stat in stats))
+        if not choices:
+            src.append(u)
+            dst.append(exit_node)
+            deltas.append((0,) * len(stats))
+
+    size = exit_node + 1
+    low: list[list[float] | None] = [None] * size
+    high: list[list[float] | None] = [None] * size
+    may = [0] * size
+    must = [0] * size
+    if start_scene in index:
+        s = index[start_scene]
+        low[s], high[s] = [0.0] * len(stats), [0.0] * len(stats)
+
+    def relax(edge: int, widen: bool) -> bool:
+        u, v, delta = src[edge], dst[edge], deltas[edge]
+        if low[u] is None:
+            return False
+        cand_low = [a + d for a, d in zip(low[u], delta)]
+        cand_high = [a + d for a, d in zip(high[u], delta)]
+        cand_may, cand_must = may[u] | set_mask[u], must[u] | set_mask[u]
+        if low[v] is None:
+            low[v], high[v], may[v], must[v] = cand_low, cand_high, cand_may, cand_must
+            return True
+        merged_low = [min(a, b) for a, b in zip(low[v], cand_low)]
+        merged_high = [max(a, b) for a, b in zip(high[v], cand_high)]
+        if widen:
+            merged_low = [-math.inf if m < a else a for m, a in zip(merged_low, low[v])]
+            merged_high = [math.inf if m > a else a for m, a in zip(merged_high, high[v])]
+        merged_may, merged_must = may[v] | cand_may, must[v] & cand_must
+        if (merged_low, merged_high, merged_may, merged_must) == (low[v], high[v], may[v], must[v]):
+            return False
+        low[v], high[v], may[v], must[v] = merged_low, merged_high, merged_may, merged_must
+        return True
+
+    out_edges: list[list[int]] = [[] for _ in range(size)]
+    for edge, u in enumerate(src):
+        out_edges[u].append(edge)
+    # In topological order every edge into a component has been relaxed before the component is reached.
+    for component in _components([[dst[edge] for edge in edges] for edges in out_edges]):
+        members = set(component)
+        inner = [edge for u in component for edge in out_edges[u] if dst[edge] in members]
+        rounds, changed = 0, bool(inner)
+        while changed:
+            rounds += 1
+            # A path inside the component has fewer than len(component) edges; later growth comes from a loop.
+            widen, changed = rounds > len(component), False
+            for edge in inner:
+                changed = relax(edge, widen) or changed
+        for u in component:
+            for edge in out_edges[u]:
+                if dst[edge] not in members:
+                    relax(edge, False)
+
+    analysis = StoryAnalysis(stats=stats)
+    for scene_id in scenes:
+        n = index[scene_id]
+        if low[n] is None:
+            analysis.unreachable_scenes.append(scene_id)
+        else:
+            analysis.scene_bounds[scene_id] = dict(zip(stats, zip(low[n], high[n])))
+    if low[exit_node] is not None:
+        analysis.exit_bounds = dict(zip(stats, zip(low[exit_node], high[exit_node])))
+        for flag, bit in flag_bit.items():
+            if must[exit_node] & bit:
+                analysis.exit_flags[flag] = "always"
+            elif may[exit_node] & bit:
+                analysis.exit_flags[flag] = "sometimes"
+
+    # Achievements unlock the moment a stat crosses the threshold, so the peak anywhere counts.
+    reached = [n for n in range(size) if high[n] is not None]
+    for key, data in achievements.items():
+        rule = data.get("rule", {})
+        stat = rule.get("stat")
+        column = stats.index(stat) if stat in stats else None
+        peak = max((high[n][column] for n in reached), default=-math.inf) if column is not None else -math.inf
+        analysis.achievements[key] = peak >= int(rule.get("min", 0))
+
+    # Ending requirements are minimums checked on the way out of the story.
+    for key, data in endings.items():
+        requirements = data.get("requirements", {})
+        ok = low[exit_node] is not None
+        for stat, minimum in requirements.get("stats", {}).items():
+            ok = ok and analysis.exit_bounds[stat][1] >= minimum
+        for flag, value in requirements.get("flags", {}).items():
+            bit = flag_bit[flag]
+            ok = ok and (bool(may[exit_node] & bit) if value else not must[exit_node] & bit)
+        analysis.endings[key] = bool(ok)
+    return analysis
@@ -1,56 +1,189 @@
 """Story loader and parser for chapter scene JSON files."""
 from __future__ import annotations
 
+import hashlib
 import json
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, NamedTuple
+
+from story_engine.compiled_story import read_compiled_story
+from story_engine.flag_manager import GameState
+from story_engine.scene_pack import ScenePack
+
+# Pseudo scenes that end a route; the client resolves them outside the chapter files.
+TERMINAL_SCENES = frozenset({"ending_selector"})
+
+
+class CompiledChoice(NamedTuple):
+    next_scene: str | None
+    chapter: int
+    stat_deltas: tuple[tuple[str, int], ...]
+    set_flags: tuple[tuple[str, Any], ...]
+
+
+def compile_choices(scene: dict[str, Any]) -> dict[str, CompiledChoice]:
+    chapter = scene.get("chapter", 1)
+    set_flags = tuple(scene.get("set_flags", {}).items())
+    return {
+        choice["id"]: CompiledChoice(
+            next_scene=choice.get("next_scene"),
+            chapter=chapter,
+            stat_deltas=tuple((key, int(val)) for key, val in choice.get("stat_changes", {}).items()),
+            set_flags=set_flags,
+        )
+        for choice in scene.get("choices", [])
+    }
 
 
 class StoryLoader:
-    def __init__(self, base_path: Path):
+    def __init__(
+        self,
+        base_path: Path,
+        pack_path: Path | None = None,
+        cache_size: int = 128,
+        compiled_path: Path | None = None,
+    ):
         self.base_path = base_path
         self.chapter_path = base_path / "chapters"
-        self.characters = self._load_json(base_path / "characters" / "characters.json")
-        self.endings = self._load_json(base_path / "endings" / "endings.json")
-        self._scene_cache = self._build_scene_index()
+        self._pack: ScenePack | None = None
+        self.prefetch_hints = lru_cache(maxsize=cache_size)(self._prefetch_hints)
+        if compiled_path is not None and pack_path is None:
+            # Already validated by `flask compile-story`; nothing left to parse or check.
+            artifact = read_compiled_story(compiled_path)
+            self.characters, self.endings = artifact["characters"], artifact["endings"]
+            self._scene_cache = artifact["scenes"]
+            self._choice_index = MappingProxyType(artifact["choices"])
+            self.version = artifact["version"]
+            return
+
+        self.characters = self.load_json(base_path / "characters" / "characters.json")
+        self.endings = self.load_json(base_path / "endings" / "endings.json")
+        if pack_path is None:
+            self._scene_cache = self._build_scene_index()
+            self._choice_index = self.compile_graph(self._scene_cache)
+        else:
+            # Lazy mode: scenes come from a prebuilt pack and only the working set stays decoded.
+            self._pack = self._scene_cache = ScenePack(pack_path, cache_size)
+            self._packed_choices = lru_cache(maxsize=cache_size)(self._compile_packed_scene)
+        self.version = self._fingerprint(pack_path)
+
+    def _fingerprint(self, pack_path: Path | None) -> str:
+        """Cheap story-data version derived from file names, sizes and mtimes."""
+        sources = [pack_path] if pack_path is not None else sorted(self.chapter_path.glob("chapter_*.json"))
+        sources += [self.base_path / "characters" / "characters.json", self.base_path / "endings" / "endings.json"]
+        digest = hashlib.sha1()
+        for path in sources:
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+        return digest.hexdigest()[:12]
 
     @staticmethod
-    def _load_json(path: Path) -> dict[str, Any]:
+    def load_json(path: Path) -> dict[str, Any]:
         with path.open("r", encoding="utf-8") as f:
             return json.load(f)
 
     def _build_scene_index(self) -> dict[str, dict[str, Any]]:
         scene_index: dict[str, dict[str, Any]] = {}
         for chapter_file in sorted(self.chapter_path.glob("chapter_*.json")):
-            chapter_data = self._load_json(chapter_file)
+            chapter_data = self.load_json(chapter_file)
             for scene in chapter_data.get("scenes", []):
                 scene_index[scene["id"]] = scene
         return scene_index
 
+    @staticmethod
+    def compile_graph(scenes: Mapping[str, dict[str, Any]]) -> Mapping[tuple[str, str], CompiledChoice]:
+        """Flatten every scene's choices into one read-only ``(scene_id, choice_id)`` table."""
+        index: dict[tuple[str, str], CompiledChoice] = {}
+        for scene_id, scene in scenes.items():
+            for choice_id, choice in compile_choices(scene).items():
+                next_scene = choice.next_scene
+                if next_scene is not None and next_scene not in scenes and next_scene not in TERMINAL_SCENES:
+                    raise ValueError(f"{scene_id}/{choice_id}: next_scene {next_scene!r} tidak ditemukan")
+                index[(scene_id, choice_id)] = choice
+        return MappingProxyType(index)
+
+    def _compile_packed_scene(self, scene_id: str) -> dict[str, CompiledChoice]:
+        scene = self._scene_cache.get(scene_id)
+        return compile_choices(scene) if scene is not None else {}
+
+    @property
+    def lazy(self) -> bool:
+        return self._pack is not None
+
+    def iter_scenes(self) -> Iterator[dict[str, Any]]:
+        if self._pack is not None:
+            raise RuntimeError("iter_scenes tidak tersedia dalam mode lazy")
+        return iter(self._scene_cache.values())
+
     def get_scene(self, scene_id: str) -> dict[str, Any] | None:
         return self._scene_cache.get(scene_id)
 
-    def process_choice(self, scene_id: str, choice_id: str, state: dict[str, Any]) -> dict[str, Any]:
-        scene = self.get_scene(scene_id)
-        if not scene:
-            return {"error": "Scene tidak ditemukan"}
+    def _prefetch_hints(self, scene_id: str, depth: int = 2) -> tuple[dict[str, Any], ...]:
+        """Scenes reachable within ``depth`` choices, most likely first.
 
-        choices = {choice["id"]: choice for choice in scene.get("choices", [])}
-        choice = choices.get(choice_id)
-        if not choice:
+        Every choice is equally likely unless it carries a ``weight``; a scene reached along several
+        branches sums their probabilities. The result is cached and must be treated as read-only.
+        """
+        reached: dict[str, list[float]] = {}
+        frontier = {scene_id: 1.0}
+        for level in range(1, depth + 1):
+            following: dict[str, float] = {}
+            for current, probability in frontier.items():
+                choices = (self.get_scene(current) or {}).get("choices", [])
+                total = sum(float(choice.get("weight", 1)) for choice in choices)
+                for choice in choices:
+                    next_scene = choice.get("next_scene")
+                    if next_scene is None or next_scene == scene_id or self.get_scene(next_scene) is None:
+                        continue
+                    share = probability * float(choice.get("weight", 1)) / total
+                    following[next_scene] = following.get(next_scene, 0.0) + share
+            for next_scene, probability in following.items():
+                entry = reached.setdefault(next_scene, [0.0, level])
+                entry[0] += probability
+            frontier = following
+
+        hints = []
+        for next_scene, (probability, level) in sorted(reached.items(), key=lambda item: (-item[1][0], item[1][1])):
+            scene = self.get_scene(next_scene)
+            hints.append({
+                "id": next_scene,
+                "depth": level,
+                "probability": round(min(probability, 1.0), 4),
+                "background": scene.get("background"),
+                "music": scene.get("music"),
+                "sprites": sorted({f"{c['id']}_{c['expression']}.png" for c in scene.get("characters", [])}),
+            })
+        return tuple(hints)
+
+    def get_choice(self, scene_id: str, choice_id: str) -> CompiledChoice | None:
+        if self._pack is not None:
+            return self._packed_choices(scene_id).get(choice_id)
+        return self._choice_index.get((scene_id, choice_id))
+
+    def process_choice(self, scene_id: str, choice_id: str, state: dict[str, Any] | GameState) -> dict[str, Any]:
+        choice = self.get_choice(scene_id, choice_id)
+        if choice is None:
+            if self.get_scene(scene_id) is None:
+                return {"error": "Scene tidak ditemukan"}
             return {"error": "Choice tidak valid"}
 
+        if isinstance(state, GameState):
+            state.apply(state.layout.compile(choice.stat_deltas, choice.set_flags))
+            return {"next_scene": choice.next_scene, "state": state, "chapter": choice.chapter}
+
         stats = state.setdefault("stats", {})
         flags = state.setdefault("flags", {})
-        for key, val in choice.get("stat_changes", {}).items():
-            stats[key] = int(stats.get(key, 0)) + int(val)
+        for key, val in choice.stat_deltas:
+            stats[key] = int(stats.get(key, 0)) + val
 
-        flags.update(scene.get("set_flags", {}))
+        flags.update(choice.set_flags)
 
         return {
-            "next_scene": choice.get("next_scene"),
+            "next_scene": choice.next_scene,
             "state": state,
-            "chapter": scene.get("chapter", 1),
+            "chapter": choice.chapter,
         }
 
     def get_gallery_data(self) -> dict[str, Any]:
@@ -10,7 +10,7 @@ from app import app, db
 
 @pytest.fixture
 def client():
-    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:')
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', LOGIN_RATE_LIMIT=False)
     with app.app_context():
         db.create_all()
         with app.test_client() as client:
@@ -1,4 +1,4 @@
-from app import User, db
+from app import User, UserSetting, app, db, socketio, write_queue
 from werkzeug.security import generate_password_hash
 
 
@@ -18,3 +18,261 @@ def test_scene_after_login(client):
     login(client)
     rv = client.get('/api/scene/ch1_scene_1')
     assert rv.status_code == 200
+
+
+def test_choice_unlocks_crossed_achievements_once(client):
+    login(client)
+    body = {'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1', 'state': {'stats': {'rina_affection': 2}}}
+    rv = client.post('/api/choice', json=body)
+    assert rv.status_code == 200
+    assert rv.get_json()['state']['stats']['rina_affection'] == 7
+    client.post('/api/choice', json=body)
+    unlocked = [a['id'] for a in client.get('/api/achievements').get_json() if a['unlocked']]
+    assert unlocked == ['ach_01', 'ach_02']
+
+
+def test_achievements_are_backfilled_after_a_load(client):
+    login(client)
+    client.delete('/api/state')
+    choice = {'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1'}
+    client.post('/api/choice', json=choice)
+    client.post('/api/save', json={'slot': 2, 'scene_id': 'ch1_scene_1', 'state': {'stats': {'rina_affection': 10}}})
+    client.get('/api/load/2')
+    client.post('/api/choice', json=choice)
+    unlocked = [a['id'] for a in client.get('/api/achievements').get_json() if a['unlocked']]
+    # 10 -> 15 only crosses ach_04 and ach_05; the rest were already earned by the loaded stats.
+    assert unlocked == ['ach_01', 'ach_02', 'ach_03', 'ach_04', 'ach_05']
+
+
+def test_scene_is_served_with_etag_and_304(client):
+    login(client)
+    rv = client.get('/api/scene/ch1_scene_1')
+    etag = rv.headers['ETag']
+    assert rv.get_json()['id'] == 'ch1_scene_1'
+    assert 'max-age' in rv.headers['Cache-Control']
+
+    rv = client.get('/api/scene/ch1_scene_1', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+
+    rv = client.get('/api/scene/ch1_scene_1', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['ETag'] != etag
+    assert client.get('/api/scene/nope').status_code == 404
+
+
+def test_write_behind_coalesces_and_flushes_on_load(client, monkeypatch):
+    login(client)
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'rahasia')
+    app.config['WRITE_BEHIND'] = True
+    try:
+        for trust in (1, 2, 3):
+            client.post('/api/save', json={'slot': 2, 'state': {'stats': {'trust': trust}}})
+        client.post('/api/settings', json={'music_volume': 0.3})
+        metrics = client.get('/api/metrics/write-queue', headers={'Authorization': 'Bearer rahasia'}).get_json()
+        assert metrics['depth'] == 2 and metrics['coalesced'] == 2
+
+        rv = client.get('/api/load/2')
+        assert rv.get_json()['state'] == {'stats': {'trust': 3}}
+        assert UserSetting.query.one().music_volume == 0.3
+        assert write_queue.metrics()['depth'] == 0
+    finally:
+        app.config['WRITE_BEHIND'] = False
+        write_queue.stop()
+
+
+def test_bad_write_behind_save_is_rejected_and_cannot_poison_the_queue(client):
+    login(client)
+    app.config['WRITE_BEHIND'] = True
+    try:
+        assert client.post('/api/save', json={'slot': 1, 'chapter': 'x'}).status_code == 400
+        assert client.post('/api/settings', json={'text_speed': 'fast'}).status_code == 400
+        write_queue.put(('save', 1, 3), {'chapter': 'x'})  # as if it slipped past validation
+        client.post('/api/save', json={'slot': 1, 'chapter': 2, 'state': {'stats': {'trust': 4}}})
+
+        rv = client.get('/api/load/1')
+        assert rv.status_code == 200 and rv.get_json()['state'] == {'stats': {'trust': 4}}
+        assert client.get('/api/load/3').status_code == 404
+        assert write_queue.metrics()['depth'] == 0
+    finally:
+        app.config['WRITE_BEHIND'] = False
+        write_queue.stop()
+
+
+def test_server_state_is_never_replaced_by_an_empty_one(client):
+    import app as app_module
+
+    login(client)
+    client.delete('/api/state')
+    choice = {'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1'}
+    assert client.post('/api/choice', json=choice).status_code == 200
+    rv = client.post('/api/choice', json=choice)
+    assert rv.status_code == 409 and rv.get_json()['scene_id'] == 'ch1_scene_2'
+    client.post('/api/save', json={'slot': 1, 'scene_id': 'ch1_scene_1'})
+    assert client.get('/api/load/1').get_json()['scene_id'] == 'ch1_scene_2'
+
+    app_module.session_states.delete(1)  # expired or evicted
+    assert client.post('/api/save', json={'slot': 1}).status_code == 409
+    assert client.post('/api/choice', json=choice).status_code == 409
+    assert client.get('/api/load/1').get_json()['state']['stats']['rina_affection'] == 5
+
+
+def test_choice_uses_server_side_state(client):
+    login(client)
+    client.delete('/api/state')
+    rv = client.post('/api/choice', json={'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1'})
+    body = rv.get_json()
+    assert 'state' not in body
+    assert body['changes'] == {'stats': {'rina_affection': 5, 'family_trust': 3}, 'flags': {'ch1_s1_seen': True}}
+
+    client.post('/api/choice', json={'scene_id': 'ch1_scene_2', 'choice_id': 'ch1_scene_2_choice_1'})
+    state = client.get('/api/state').get_json()
+    assert state['stats']['rina_affection'] == 10
+
+    client.post('/api/save', json={'slot': 3, 'scene_id': 'ch1_scene_3'})
+    client.delete('/api/state')
+    assert client.get('/api/load/3').get_json()['state'] == state
+    assert client.get('/api/state').get_json() == state
+
+
+def test_achievements_arrive_as_one_socket_frame(client):
+    login(client)
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join_game', {'session_id': 's1'})
+    assert ws.get_received()[0]['name'] == 'scene_update'
+
+    body = {'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1', 'state': {'stats': {'rina_affection': 1}}}
+    client.post('/api/choice', json=body)
+    frames = ws.get_received()
+    assert [frame['name'] for frame in frames] == ['batch']
+    assert [e['data']['achievement'] for e in frames[0]['args'][0]] == ['ach_01', 'ach_02']
+    ws.disconnect()
+
+
+def test_scene_lists_background_variants_served_immutable(client, tmp_path, monkeypatch):
+    import app as app_module
+    from PIL import Image
+    from scripts.build_assets import build
+    from utils.asset_manifest import AssetManifest
+
+    source_dir = tmp_path / 'src'
+    source_dir.mkdir()
+    Image.new('RGB', (1280, 720), color=(30, 30, 80)).save(source_dir / 'chapter_1_bg_1.png')
+    build(source_dir, tmp_path / 'out', workers=1)
+    monkeypatch.setattr(app_module, 'asset_manifest', AssetManifest(tmp_path / 'out'))
+
+    login(client)
+    variants = client.get('/api/scene/ch1_scene_1').get_json()['background_variants']
+    assert [v['name'] for v in variants] == ['thumb', '640w', '1280w']
+    rv = client.get(variants[0]['url'])
+    assert rv.status_code == 200 and len(rv.data) == variants[0]['bytes']
+    assert 'immutable' in rv.headers['Cache-Control'] and 'public' in rv.headers['Cache-Control']
+
+    rv = client.get('/variants/manifest.json')
+    max_age = f"max-age={app.config['STORY_CACHE_MAX_AGE']}"
+    assert 'immutable' not in rv.headers['Cache-Control'] and max_age in rv.headers['Cache-Control']
+    assert client.get('/variants/manifest.json', headers={'If-None-Match': rv.headers['ETag']}).status_code == 304
+
+
+def test_prefetch_hints_and_bulk_scenes(client):
+    login(client)
+    client.delete('/api/state')
+    hints = client.get('/api/scene/ch1_scene_1').get_json()['prefetch']
+    assert [h['id'] for h in hints] == ['ch1_scene_2', 'ch1_scene_3']
+    rv = client.post('/api/choice', json={'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1'})
+    assert rv.get_json()['prefetch'][0]['id'] == 'ch1_scene_3'
+
+    bulk = client.get('/api/scenes?ids=ch1_scene_2,ch1_scene_3,missing').get_json()
+    assert sorted(bulk['scenes']) == ['ch1_scene_2', 'ch1_scene_3']
+    assert bulk['missing'] == ['missing']
+    assert bulk['scenes']['ch1_scene_2'] == client.get('/api/scene/ch1_scene_2').get_json()
+    assert client.get('/api/scenes').status_code == 400
+
+
+def test_voice_lines_come_only_from_cache(client, tmp_path, monkeypatch):
+    import app as app_module
+    from utils.text_to_speech import VoiceCache
+
+    cache = VoiceCache(tmp_path, engine=lambda text, lang, voice: b'ID3' + text.encode())
+    monkeypatch.setattr(app_module, 'voice_cache', cache)
+    login(client)
+    scene = client.get('/api/scene/ch1_scene_1').get_json()
+    assert client.get(scene['voice']).status_code == 404
+
+    cache.render(scene['dialogue'], app.config['TTS_LANG'], app.config['TTS_VOICE'])
+    rv = client.get(scene['voice'])
+    assert rv.status_code == 200 and rv.data == b'ID3' + scene['dialogue'].encode()
+    assert 'immutable' in rv.headers['Cache-Control']
+
+
+def test_metrics_report_latency_queries_and_emits_per_endpoint(client, monkeypatch):
+    login(client)
+    assert client.get('/metrics').status_code == 404  # off unless a token is configured
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'rahasia')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer salah'}).status_code == 401
+    body = {'scene_id': 'ch1_scene_1', 'choice_id': 'ch1_scene_1_choice_1', 'state': {'stats': {'rina_affection': 2}}}
+    client.post('/api/choice', json=body)
+    client.post('/api/save', json={'slot': 1, 'state': {'stats': {'trust': 1}}})
+
+    rv = client.get('/metrics', headers={'Authorization': 'Bearer rahasia'})
+    assert rv.mimetype == 'text/plain'
+    text = rv.get_data(as_text=True)
+    assert 'vn_requests_total{endpoint="process_choice",method="POST",status="200"}' in text
+    assert 'vn_request_duration_seconds_count{endpoint="save_game"}' in text
+    save_queries = 'vn_db_queries_per_request_sum{endpoint="save_game"}'
+    queries = next(line for line in text.splitlines() if line.startswith(save_queries))
+    assert float(queries.split()[-1]) >= 1
+    assert 'vn_json_seconds_total{endpoint="process_choice"}' in text
+    assert 'vn_socketio_emits_total{event="achievement_unlocked"}' in text
+
+
+def test_login_is_rate_limited_per_username(client, monkeypatch):
+    import app as app_module
+    from utils.rate_limit import TokenBucket
+
+    login(client)
+    client.get('/logout')
+    monkeypatch.setitem(app.config, 'LOGIN_RATE_LIMIT', True)
+    monkeypatch.setattr(app_module, 'login_user_bucket', TokenBucket(rate=1 / 60, burst=2))
+    monkeypatch.setattr(app_module, 'login_ip_bucket', TokenBucket(rate=1, burst=100))
+    form = {'username': 'tester', 'password': 'salah'}
+    assert [client.post('/login', data=form).status_code for _ in range(2)] == [200, 200]
+    rv = client.post('/login', data={'username': 'tester', 'password': '123456'})
+    assert rv.status_code == 429 and 0 < int(rv.headers['Retry-After']) <= 60
+    assert client.post('/login', data={'username': 'other', 'password': 'x'}).status_code == 200
+    # Failures from one address do not lock the account for everyone else.
+    owner = {'REMOTE_ADDR': '10.0.0.2'}
+    rv = client.post('/login', data={'username': 'tester', 'password': '123456'}, environ_base=owner)
+    assert rv.status_code == 302
+
+
+def test_saves_export_and_import_in_memory(client, monkeypatch):
+    import io
+    import json
+    import zipfile
+
+    login(client)
+    for slot in (1, 2):
+        client.post('/api/save', json={'slot': slot, 'scene_id': 'ch1_scene_1', 'state': {'stats': {'trust': slot}}})
+    single = client.post('/api/export-save/2')
+    assert single.get_json()['slot'] == 2 and 'save_2.json' in single.headers['Content-Disposition']
+    archive = client.post('/api/export-saves').data
+    assert zipfile.ZipFile(io.BytesIO(archive)).namelist() == ['save_1.json', 'save_2.json']
+
+    client.post('/api/save', json={'slot': 1, 'state': {'stats': {'trust': 99}}})
+    rv = client.post('/api/import-save', data={'file': (io.BytesIO(archive), 'saves.zip')})
+    assert rv.get_json() == {'status': 'imported', 'slots': [1, 2]}
+    assert client.get('/api/load/1').get_json()['state']['stats'] == {'trust': 1}
+
+    rv = client.post('/api/import-save', data={'file': (io.BytesIO(b'{"slot": 3}'), 'save.json')})
+    assert rv.status_code == 400
+    malformed = [(1, 'c'), (1, 'cj'), (1, 'cj0RR'), (1, 'j[1]'), (-5, '{}'), (10**9, '{}'), (True, '{}')]
+    for slot, payload in malformed:
+        document = json.dumps({'slot': slot, 'payload': payload}).encode()
+        rv = client.post('/api/import-save', data={'file': (io.BytesIO(document), 'save.json')})
+        assert rv.status_code == 400, payload
+    assert client.get('/api/load/1').get_json()['state']['stats'] == {'trust': 1}
+    monkeypatch.setitem(app.config, 'SAVE_IMPORT_MAX_BYTES', 100)
+    rv = client.post('/api/import-save', data={'file': (io.BytesIO(archive), 'saves.zip')})
+    assert rv.status_code == 413
@@ -0,0 +1,24 @@
+import json
+
+from PIL import Image
+
+from scripts.build_assets import build
+
+
+def test_build_assets_is_incremental(tmp_path):
+    source_dir, out_dir = tmp_path / 'src', tmp_path / 'out'
+    source_dir.mkdir()
+    for n in range(2):
+        Image.new('RGB', (1280, 720), color=(n * 90, 30, 80)).save(source_dir / f'bg_{n}.png')
+
+    assert build(source_dir, out_dir, workers=2) == {'sources': 2, 'built': 2, 'removed': 0}
+    manifest = json.loads((out_dir / 'manifest.json').read_text())
+    variants = manifest['bg_0.png']['variants']
+    assert set(variants) == {'1280w', '640w', 'thumb'}
+    assert (out_dir / variants['thumb']['file']).exists()
+
+    assert build(source_dir, out_dir, workers=2)['built'] == 0
+    Image.new('RGB', (1280, 720), color=(1, 2, 3)).save(source_dir / 'bg_1.png')
+    (source_dir / 'bg_0.png').unlink()
+    assert build(source_dir, out_dir, workers=2) == {'sources': 1, 'built': 1, 'removed': 1}
+    assert len(list(out_dir.glob('*.webp'))) == 3
@@ -0,0 +1,16 @@
+from scripts.bench_player_loop import compare, run_inprocess, summarize
+
+
+def test_player_loop_covers_all_chapters_and_flags_regressions(client):
+    timings, elapsed, events = run_inprocess(players=1)
+    assert len(timings['choice']) == 100
+    assert len(timings['save']) == len(timings['load']) == 10
+    assert events > 0
+
+    report = summarize(timings, elapsed)
+    assert set(report['steps']['scene']) == {'count', 'p50_ms', 'p95_ms', 'p99_ms'}
+    assert compare(report, report, tolerance=0.2) == []
+
+    slower = {**report, 'rps': report['rps'] / 2, 'steps': {**report['steps']}}
+    slower['steps']['save'] = {**report['steps']['save'], 'p95_ms': report['steps']['save']['p95_ms'] * 2}
+    assert [line.split(':')[0] for line in compare(slower, report, tolerance=0.2)] == ['save', 'throughput']
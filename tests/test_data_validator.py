@@ -0,0 +1,54 @@
+import json
+
+from utils.data_validator import validate_story
+
+
+def test_validate_story_reports_broken_content(tmp_path):
+    scenes = [
+        {'id': 's1', 'chapter': 1, 'dialogue': 'a', 'choices': [
+            {'id': 'c1', 'text': 'x', 'next_scene': 's2', 'stat_changes': {'trust': 1}},
+            {'id': 'c1', 'text': 'y', 'next_scene': 'nowhere'},
+            {'id': 'c3', 'text': 'z', 'next_scene': 's3'},
+        ]},
+        {'id': 's2', 'chapter': 1, 'dialogue': 'b', 'choices': ['oops']},
+        {'id': 's3', 'chapter': 1, 'dialogue': 'c', 'choices': 'oops'},
+        {'id': 'orphan', 'chapter': '1', 'choices': []},
+    ]
+    (tmp_path / 'chapter_1.json').write_text(json.dumps({'scenes': scenes}))
+    (tmp_path / 'chapter_2.json').write_text('{not json')
+    achievements = {'a1': {'rule': {'stat': 'trust', 'min': 1}}, 'a2': {'rule': {'stat': 'courage', 'min': 1}}}
+
+    report = validate_story(tmp_path.glob('chapter_*.json'), 's1', achievements, {}, workers=1)
+    assert not report.ok
+    joined = '\n'.join(report.errors)
+    assert "choice id 'c1' duplikat" in joined
+    assert "next_scene 'nowhere' tidak ditemukan" in joined
+    assert "field 'dialogue' wajib ada" in joined and "field 'chapter' bertipe salah" in joined
+    assert 'chapter_2.json: tidak bisa dibaca' in joined
+    assert 's2: choice #0 bukan object' in joined and "field 'choices' bertipe salah" in joined
+    assert 's3: choice' not in joined
+    assert report.warnings == [
+        'orphan: tidak bisa dicapai dari s1',
+        "achievement a2: stat 'courage' tidak pernah diubah pilihan mana pun",
+    ]
+
+
+def test_validate_story_reports_malformed_containers(tmp_path):
+    scenes = [
+        {'id': 's1', 'chapter': 1, 'dialogue': 'a', 'set_flags': 3, 'choices': [
+            {'id': 'c1', 'text': 'x', 'next_scene': 's2', 'stat_changes': 5},
+            {'id': ['c'], 'text': 'y', 'next_scene': ['s2']},
+        ]},
+        {'id': 's2', 'chapter': 1, 'dialogue': 'b', 'choices': 5},
+        {'id': ['s3'], 'chapter': 1, 'dialogue': 'c', 'choices': []},
+    ]
+    (tmp_path / 'chapter_1.json').write_text(json.dumps({'scenes': scenes}))
+
+    report = validate_story(tmp_path.glob('chapter_*.json'), 's1', {}, {}, workers=1)
+    joined = '\n'.join(report.errors)
+    assert 's1: set_flags harus berupa object' in joined
+    assert 's1/c1: stat_changes harus berisi angka bulat' in joined
+    assert "s1/['c']: field 'id' bertipe salah" in joined and "field 'next_scene' bertipe salah" in joined
+    assert "chapter_1.json: field 'choices' bertipe salah" in joined
+    assert "chapter_1.json: field 'id' bertipe salah" in joined
+    assert sorted(report.scenes) == ['s1', 's2']
@@ -0,0 +1,27 @@
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from utils.db_profile import RoutingSession, install_pragmas, read_only, sqlite_config, supports_profile
+
+
+def test_read_only_views_run_on_the_query_only_wal_pool(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'game.db'}"
+    assert supports_profile(uri) and not supports_profile('sqlite:///:memory:')
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=uri, **sqlite_config(uri, write_pool=2, read_pool=2))
+    db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            install_pragmas(engine, read_only=bind_key is not None)
+
+    def pragmas():
+        rows = [db.session.execute(text(f'PRAGMA {name}')).scalar() for name in ('journal_mode', 'query_only')]
+        db.session.rollback()
+        return rows
+
+    app.get('/read', endpoint='read')(read_only(pragmas))
+    app.get('/write', endpoint='write')(pragmas)
+    client = app.test_client()
+    assert client.get('/read').get_json() == ['wal', 1]
+    assert client.get('/write').get_json() == ['wal', 0]
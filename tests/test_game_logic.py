@@ -1,6 +1,97 @@
+from pathlib import Path
+
+import pytest
+
+from story_engine.achievement_system import AchievementSystem
+from story_engine.flag_manager import GameState, StateLayout, story_state_names
 from story_engine.relationship_system import RelationshipSystem
+from story_engine.save_manager import SaveManager
+from story_engine.session_store import MemorySessionStore
+from story_engine.story_loader import StoryLoader
 
 
 def test_relationship_level():
     system = RelationshipSystem()
     assert system.get_level(85) == 'Love'
+
+
+def test_achievement_delta_only_returns_crossed_thresholds():
+    system = AchievementSystem(Path('story_data/events/achievements.json'))
+    assert system.evaluate({'stats': {'rina_affection': 7}}) == ['ach_01', 'ach_02']
+    assert system.evaluate_delta({'rina_affection': 5}, {'rina_affection': 10}) == ['ach_02', 'ach_03']
+    assert system.evaluate_delta({'rina_affection': 10}, {'rina_affection': 8}) == []
+    assert system.evaluate_delta({}, {'trust': 50}) == []
+    assert system.evaluate_delta({'rina_affection': 5}, {'rina_affection': 10}, changed=['trust']) == []
+
+
+def test_save_codecs_and_delta_roundtrip():
+    manager = SaveManager(codec='zlib', delta=True)
+    state = {'stats': {'trust': 3}, 'flags': {f'ch1_s{n}_seen': True for n in range(1, 101)}, 'inventory': []}
+    assert manager.unpack_state('{"stats": {"trust": 1}}') == {'stats': {'trust': 1}}
+    full = manager.pack_state(state)
+    assert full[0] == 'z' and manager.unpack_state(full) == state
+
+    later = {'stats': {'trust': 8}, 'flags': {**state['flags'], 'ch2_s1_seen': True}, 'inventory': []}
+    payload, base = manager.pack_slot(later, full)
+    assert payload[0] == 'd' and base == full
+    assert manager.unpack_state(payload, manager.unpack_state(base)) == later
+
+
+def test_game_state_roundtrips_dicts_losslessly():
+    layout = StateLayout(['a_seen', 'b_seen'], ['trust'])
+    odd = {
+        'stats': {'trust': 0, 'mood': 'ok', 'big': 1 << 70},
+        'flags': {'b_seen': False, 'a_seen': True, 'legacy': True, 'route': 'rina'},
+        'inventory': ['choco'],
+        'extra': None,
+    }
+    for data in (odd, {'stats': {'trust': 3}}, {}, {'flags': None}):
+        state = GameState.from_dict(layout, data)
+        assert state.to_dict() == data
+        assert GameState.from_bytes(layout, state.to_bytes()).to_dict() == data
+    state.scene_id = 'ch1_scene_2'
+    assert GameState.from_bytes(layout, state.to_bytes()).scene_id == 'ch1_scene_2'
+
+
+def test_game_state_rejects_a_malformed_tail():
+    layout = StateLayout(['a'], ['trust'])
+    header = GameState(layout).to_bytes().split(b'[', 1)[0]
+    for tail in (b'{}', b'["x",{},{},{}]', b'[0,"a","b","c"]', b'[0,{},{},{},5]', b'[0,{}]'):
+        with pytest.raises(ValueError):
+            GameState.from_bytes(layout, header + tail)
+
+
+def test_game_state_choices_match_dict_state_over_whole_story():
+    loader = StoryLoader(Path('story_data'))
+    layout = StateLayout(*story_state_names(loader.iter_scenes()))
+    compact, plain = GameState.from_dict(layout, {'stats': {'trust': '5'}}), {'stats': {'trust': '5'}}
+    for scene in loader.iter_scenes():
+        for choice in scene['choices']:
+            assert loader.process_choice(scene['id'], choice['id'], compact)['next_scene'] == choice['next_scene']
+            loader.process_choice(scene['id'], choice['id'], plain)
+    assert compact.to_dict() == plain and compact.get_flag('ch10_s10_seen') is True
+
+    manager = SaveManager(codec='zlib', layout=layout)
+    payload = manager.pack_state(plain)
+    assert payload[0] == 'c' and manager.unpack_state(payload) == plain
+    assert len(payload) * 4 < len(SaveManager(codec='json').pack_state(plain))
+    assert manager.pack_state(plain, portable=True)[0] == 'z'
+
+
+def test_memory_session_store_expiry_slides_on_read():
+    now = [0.0]
+    store = MemorySessionStore(ttl=10, clock=lambda: now[0])
+    store.set(1, 'state')
+    for now[0] in (8.0, 16.0, 24.0):
+        assert store.get(1) == 'state'
+    now[0] = 35.0
+    assert store.get(1) is None
+
+
+def test_compact_saves_survive_a_later_layout_extension():
+    layout = StateLayout(['a'])
+    manager = SaveManager(codec='zlib', layout=layout)
+    state = {'flags': {'a': True, 'd': True}, 'stats': {}}
+    payload = manager.pack_state(state)  # 'd' is not interned, so it is stored by name
+    layout.intern(['b', 'c', 'd'])  # what flask compile-story does after new content
+    assert manager.unpack_state(payload) == state
@@ -0,0 +1,55 @@
+import os
+import signal
+import time
+
+from utils.instrumentation import Histogram, SamplingProfiler
+
+
+def busy(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    lines = histogram.render('latency', 'endpoint="x"')
+    assert lines[:3] == ['latency_bucket{endpoint="x",le="0.1"} 1', 'latency_bucket{endpoint="x",le="1.0"} 3',
+                         'latency_bucket{endpoint="x",le="+Inf"} 4']
+    assert lines[-1] == 'latency_count{endpoint="x"} 4'
+
+
+def test_profiler_collects_folded_stacks_for_the_active_greenlet_only():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    try:
+        busy(0.05)
+        assert profiler.end() == {}
+        profiler.begin()
+        busy(0.1)
+        samples = profiler.end()
+    finally:
+        profiler.stop()
+    assert sum(samples.values()) > 0
+    assert any(stack.endswith(':busy:' + stack.rsplit(':', 1)[-1]) for stack in samples)
+
+
+def test_profiler_restarts_its_timer_in_a_forked_child():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.ensure_started()
+    try:
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            before = signal.getitimer(signal.ITIMER_PROF)[1]
+            profiler.ensure_started()
+            os.write(write, b'%d%d' % (before > 0, signal.getitimer(signal.ITIMER_PROF)[1] > 0))
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read, 2) == b'01'
+        os.close(read)
+        os.close(write)
+    finally:
+        profiler.stop()
@@ -0,0 +1,55 @@
+import eventlet
+
+from app import app, apply_inventory_deltas, db
+from test_api import login
+
+
+def grant(deltas):
+    apply_inventory_deltas(1, deltas)
+    db.session.commit()
+
+
+def clone_client(client):
+    other = app.test_client()
+    other.set_cookie('session', client.get_cookie('session').value)
+    return other
+
+
+def test_batch_consumes_atomically_and_never_grants(client):
+    login(client)
+    grant({'choco': 3, 'bandage': 1})
+    ops = [{'item_id': 'choco', 'delta': 1}, {'item_id': 'old_photo', 'delta': 1}]
+    assert client.post('/api/inventory/batch', json={'ops': ops}).status_code == 403
+    assert client.post('/api/inventory/batch', json={'ops': [{'item_id': 'choco', 'delta': True}]}).status_code == 400
+
+    ops = [{'item_id': 'choco', 'delta': -1}, {'item_id': 'bandage', 'delta': -2}]
+    rv = client.post('/api/inventory/batch', json={'ops': ops})
+    assert rv.status_code == 409 and rv.get_json()['items'] == ['bandage']
+    assert client.post('/api/inventory/use', json={'item_id': 'bandage'}).status_code == 200
+    assert client.post('/api/inventory/use', json={'item_id': 'bandage'}).status_code == 404
+
+    inventory = client.get('/api/inventory').get_json()
+    assert inventory == [{'item_id': 'choco', 'qty': 3, 'name': 'Cokelat Favorit',
+                          'description': 'Menaikkan affection Rina', 'effect': {'rina_affection': 5}}]
+    assert client.post('/api/inventory/batch', json={'ops': [{'item_id': 'sword', 'delta': -1}]}).status_code == 400
+    for body in ({'ops': ['choco']}, {'ops': [{'item_id': ['choco'], 'delta': -1}]}, {'ops': 5}, [1]):
+        assert client.post('/api/inventory/batch', json=body).status_code == 400
+
+
+def test_concurrent_batches_do_not_lose_updates(client):
+    login(client)
+    grant({'choco': 50, 'old_photo': 200})
+
+    def hammer(n):
+        worker = clone_client(client)
+        ops = [{'item_id': 'choco', 'delta': -1}, {'item_id': 'old_photo', 'delta': -2}]
+        for _ in range(5):
+            assert worker.post('/api/inventory/batch', json={'ops': ops}).status_code == 200
+            eventlet.sleep(0)
+        return n
+
+    pool = eventlet.GreenPool(20)
+    assert sorted(pool.imap(hammer, range(10))) == list(range(10))
+
+    quantities = {row['item_id']: row['qty'] for row in client.get('/api/inventory').get_json()}
+    assert quantities == {'old_photo': 100}
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from sqlalchemy import event, text
+
+from app import SaveSlot, UserInventory, db, upgrade_schema
+from test_api import login
+
+
+def seed_saves(users, slots, offset=1000):
+    rows = [
+        {'user_id': offset + u, 'slot': s, 'payload': '{}', 'scene_id': 'ch1_scene_1', 'chapter': 1}
+        for u in range(users)
+        for s in range(1, slots + 1)
+    ]
+    db.session.execute(SaveSlot.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(client, rounds=40):
+    """Statements issued and the median seconds of one save plus load."""
+    statements, timings = [], []
+    client.get('/api/load/1')
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for i in range(rounds):
+            started = time.perf_counter()
+            client.post('/api/save', json={'slot': 1 + i % 20, 'state': {'stats': {'trust': i}}})
+            client.get(f'/api/load/{1 + i % 20}')
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return len(statements), statistics.median(timings)
+
+
+def test_save_load_query_count_and_latency_stay_flat(client):
+    login(client)
+    small_queries, small_latency = measure(client)
+    seed_saves(users=5000, slots=20)
+    large_queries, large_latency = measure(client)
+
+    assert large_queries == small_queries
+    # Loose on purpose: medians are stable, but a table scan over the 100k seeded rows costs several times more.
+    assert large_latency < small_latency * 2
+    plan = db.session.execute(
+        text('EXPLAIN QUERY PLAN SELECT * FROM save_slot WHERE user_id = 1 AND slot = 3')
+    ).all()
+    assert 'ix_save_slot_user_slot' in str(plan)
+
+
+def test_upgrade_schema_collapses_duplicates(client):
+    db.session.execute(text('DROP INDEX ix_save_slot_user_slot'))
+    db.session.execute(text('DROP INDEX ix_user_inventory_user_item'))
+    db.session.add_all([
+        SaveSlot(user_id=7, slot=1, payload='old'),
+        SaveSlot(user_id=7, slot=1, payload='new'),
+        UserInventory(user_id=7, item_id='choco', qty=2),
+        UserInventory(user_id=7, item_id='choco', qty=3),
+    ])
+    db.session.commit()
+
+    upgrade_schema()
+
+    assert [s.payload for s in SaveSlot.query.filter_by(user_id=7)] == ['new']
+    assert [i.qty for i in UserInventory.query.filter_by(user_id=7)] == [5]
+
+
+def test_dashboard_lists_slots_without_payloads(client):
+    login(client)
+    client.post('/api/save', json={'slot': 1, 'state': {'stats': {'trust': 1}}})
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        rv = client.get('/dashboard')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert b'Slot 1' in rv.data
+    assert not [s for s in statements if 'save_slot' in s and 'payload' in s]
@@ -0,0 +1,28 @@
+import pytest
+
+from utils.password_hasher import HasherBusy, PasswordHasher
+from utils.rate_limit import TokenBucket
+
+
+def test_token_bucket_refills_at_rate():
+    now = [0.0]
+    bucket = TokenBucket(rate=0.5, burst=2, clock=lambda: now[0])
+    assert [bucket.take('ip') for _ in range(3)] == [0, 0, 2.0]
+    assert bucket.take('other') == 0
+    now[0] = 2.0
+    assert bucket.take('ip') == 0 and bucket.take('ip') == 2.0
+
+
+def test_token_bucket_wait_does_not_spend():
+    bucket = TokenBucket(rate=0.5, burst=1, clock=lambda: 0.0)
+    assert bucket.wait('ip') == 0 and bucket.wait('ip') == 0
+    assert bucket.take('ip') == 0 and bucket.wait('ip') == 2.0
+
+
+def test_hasher_offloads_and_rejects_when_queue_is_full():
+    hasher = PasswordHasher(threads=1, max_queue=0)
+    assert hasher.verify(hasher.hash('rahasia'), 'rahasia')
+    hasher.waiting = 1
+    with pytest.raises(HasherBusy):
+        hasher.hash('rahasia')
+    assert hasher.stats['rejected'] == 1
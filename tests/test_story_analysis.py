@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+from story_engine.story_analysis import analyze_story
+from story_engine.story_loader import TERMINAL_SCENES, StoryLoader
+
+
+def test_story_data_endings_and_achievements():
+    loader = StoryLoader(Path('story_data'))
+    achievements = json.loads(Path('story_data/events/achievements.json').read_text())
+    scenes = {scene['id']: scene for scene in loader.iter_scenes()}
+    analysis = analyze_story(scenes, 'ch1_scene_1', achievements, loader.endings, TERMINAL_SCENES)
+
+    assert analysis.endings == {'good': True, 'normal': True, 'bad': True, 'secret': False}
+    assert all(analysis.achievements.values())
+    assert analysis.unreachable_scenes == []
+    assert analysis.scene_bounds['ch1_scene_2']['rina_affection'] == (-3, 5)
+
+
+def test_branching_lattice_is_not_enumerated():
+    # 3**400 distinct paths; the analysis touches each edge a constant number of times.
+    scenes = {}
+    for level in range(400):
+        for k in range(3):
+            targets = [f's{level + 1}_{n}' if level < 399 else 'end' for n in range(3)]
+            choices = [{'id': f'c{n}', 'next_scene': t, 'stat_changes': {'x': n - 1}} for n, t in enumerate(targets)]
+            scenes[f's{level}_{k}'] = {'id': f's{level}_{k}', 'choices': choices}
+    endings = {'high': {'requirements': {'stats': {'x': 400}}}, 'too_high': {'requirements': {'stats': {'x': 401}}}}
+    analysis = analyze_story(scenes, 's0_0', {}, endings, {'end'})
+    assert analysis.exit_bounds['x'] == (-400, 400)
+    assert analysis.endings == {'high': True, 'too_high': False}
+
+
+def test_cycles_widen_to_unbounded_and_track_flags():
+    scenes = {
+        'a': {'id': 'a', 'set_flags': {'met': True}, 'choices': [
+            {'id': 'loop', 'next_scene': 'b', 'stat_changes': {'x': 1}},
+            {'id': 'skip', 'next_scene': 'c'},
+        ]},
+        'b': {'id': 'b', 'set_flags': {'looped': True}, 'choices': [{'id': 'back', 'next_scene': 'a'}]},
+        'c': {'id': 'c', 'choices': []},
+    }
+    endings = {'far': {'requirements': {'stats': {'x': 1000}, 'flags': {'looped': True}}}}
+    analysis = analyze_story(scenes, 'a', {'ach': {'rule': {'stat': 'x', 'min': 50}}}, endings)
+    assert analysis.exit_bounds['x'][1] == float('inf')
+    assert analysis.exit_flags == {'met': 'always', 'looped': 'sometimes'}
+    assert analysis.endings == {'far': True} and analysis.achievements == {'ach': True}
+    assert analysis.to_dict()['exit_bounds']['x'] == [0, None]
+
+
+def test_loops_only_widen_what_they_reach():
+    # A long chain with one +1/-1 loop (net zero) and one +2 loop further on.
+    scenes = {f's{n}': {'id': f's{n}', 'choices': [{'id': 'next', 'next_scene': f's{n + 1}'}]} for n in range(300)}
+    scenes['s300'] = {'id': 's300', 'choices': []}
+    scenes['s100']['choices'].append({'id': 'up', 'next_scene': 'l1', 'stat_changes': {'x': 1}})
+    scenes['l1'] = {'id': 'l1', 'choices': [{'id': 'down', 'next_scene': 's100', 'stat_changes': {'x': -1}}]}
+    scenes['s200']['choices'].append({'id': 'up', 'next_scene': 'l2', 'stat_changes': {'y': 2}})
+    scenes['l2'] = {'id': 'l2', 'choices': [{'id': 'back', 'next_scene': 's200'}]}
+    endings = {'x_high': {'requirements': {'stats': {'x': 2}}}, 'y_high': {'requirements': {'stats': {'y': 10**6}}}}
+    achievements = {'x_one': {'rule': {'stat': 'x', 'min': 1}}, 'x_two': {'rule': {'stat': 'x', 'min': 2}}}
+    analysis = analyze_story(scenes, 's0', achievements, endings)
+    assert analysis.scene_bounds['s150'] == {'x': (0, 0), 'y': (0, 0)}
+    assert analysis.scene_bounds['s199']['y'] == (0, 0)
+    assert analysis.exit_bounds == {'x': (0, 0), 'y': (0, float('inf'))}
+    assert analysis.endings == {'x_high': False, 'y_high': True}
+    assert analysis.achievements == {'x_one': True, 'x_two': False}
@@ -1,5 +1,6 @@
 from pathlib import Path
 
+from story_engine.scene_pack import build_scene_pack
 from story_engine.story_loader import StoryLoader
 
 
@@ -8,3 +9,68 @@ def test_get_scene():
     scene = loader.get_scene('ch1_scene_1')
     assert scene is not None
     assert scene['chapter'] == 1
+
+
+def test_process_choice_uses_compiled_graph():
+    loader = StoryLoader(Path('story_data'))
+    state = {}
+    result = loader.process_choice('ch1_scene_1', 'ch1_scene_1_choice_1', state)
+    assert result['next_scene'] == 'ch1_scene_2'
+    assert state['stats'] == {'rina_affection': 5, 'family_trust': 3}
+    assert state['flags'] == {'ch1_s1_seen': True}
+    assert loader.process_choice('missing', 'x', {}) == {'error': 'Scene tidak ditemukan'}
+    assert loader.process_choice('ch1_scene_1', 'x', {}) == {'error': 'Choice tidak valid'}
+
+
+def test_lazy_pack_matches_eager_loader(tmp_path):
+    eager = StoryLoader(Path('story_data'))
+    pack_path = tmp_path / 'scenes.pack'
+    assert build_scene_pack(eager.iter_scenes(), pack_path) == 100
+
+    lazy = StoryLoader(Path('story_data'), pack_path=pack_path, cache_size=4)
+    assert lazy.get_scene('ch5_scene_3') == eager.get_scene('ch5_scene_3')
+    assert lazy.get_scene('missing') is None
+    args = ('ch5_scene_3', 'ch5_scene_3_choice_2')
+    assert lazy.process_choice(*args, {}) == eager.process_choice(*args, {})
+    assert lazy.process_choice('ch5_scene_3', 'x', {}) == {'error': 'Choice tidak valid'}
+    for n in range(1, 11):
+        lazy.get_scene(f'ch2_scene_{n}')
+    assert lazy._pack.get.cache_info().currsize == 4
+
+
+def test_prefetch_hints_are_ranked_by_branch_probability(tmp_path):
+    import json
+
+    def scene(scene_id, *targets):
+        choices = [{'id': f'{scene_id}_{n}', 'next_scene': t, 'weight': w} for n, (t, w) in enumerate(targets)]
+        return {'id': scene_id, 'chapter': 1, 'background': f'{scene_id}.png', 'characters': [], 'choices': choices}
+
+    (tmp_path / 'chapters').mkdir()
+    (tmp_path / 'characters').mkdir()
+    (tmp_path / 'endings').mkdir()
+    scenes = [scene('a', ('b', 3), ('c', 1)), scene('b', ('d', 1)), scene('c', ('d', 1))]
+    scenes += [scene('d', ('e', 1)), scene('e')]
+    (tmp_path / 'chapters' / 'chapter_1.json').write_text(json.dumps({'scenes': scenes}))
+    (tmp_path / 'characters' / 'characters.json').write_text('{}')
+    (tmp_path / 'endings' / 'endings.json').write_text('{}')
+
+    hints = StoryLoader(tmp_path).prefetch_hints('a', 2)
+    assert [(h['id'], h['depth'], h['probability']) for h in hints] == [('d', 2, 1.0), ('b', 1, 0.75), ('c', 1, 0.25)]
+    assert hints[0]['background'] == 'd.png'
+
+
+def test_compiled_story_matches_raw_loader(tmp_path):
+    from app import app
+
+    out = tmp_path / 'story.compiled'
+    result = app.test_cli_runner().invoke(args=['compile-story', '--out', str(out), '--workers', '2'])
+    assert result.exit_code == 0, result.output
+    assert "flag 'found_secret'" in result.output
+
+    raw = StoryLoader(Path('story_data'))
+    compiled = StoryLoader(Path('story_data'), compiled_path=out)
+    assert compiled.get_scene('ch7_scene_4') == raw.get_scene('ch7_scene_4')
+    assert compiled.characters == raw.characters
+    args = ('ch7_scene_4', 'ch7_scene_4_choice_1')
+    assert compiled.process_choice(*args, {}) == raw.process_choice(*args, {})
+    assert app.test_cli_runner().invoke(args=['compile-story', '--out', str(out), '--strict']).exit_code == 1
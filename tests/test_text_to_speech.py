@@ -0,0 +1,44 @@
+import os
+
+from utils.text_to_speech import VoiceCache
+
+
+def stub_engine(calls):
+    def engine(text, lang, voice):
+        calls.append(text)
+        return f'{lang}:{voice}:{text}'.encode() * 10
+    return engine
+
+
+def test_voice_cache_synthesizes_each_line_once(tmp_path):
+    calls = []
+    cache = VoiceCache(tmp_path, engine=stub_engine(calls), engine_name='stub')
+    lines = [('Halo', 'id', 'com'), ('Halo', 'id', 'com'), ('Dadah', 'id', 'com'), ('Halo', 'en', 'com')]
+    assert cache.prerender(lines, workers=4) == {'lines': 3, 'synthesized': 3, 'cached': 0}
+    assert cache.prerender(lines, workers=4)['cached'] == 3
+    assert sorted(calls) == ['Dadah', 'Halo', 'Halo']
+    assert cache.get(cache.key('Halo', 'id', 'com')).read_bytes().startswith(b'id:com:Halo')
+    assert cache.get('../secret.mp3') is None
+
+
+def test_voice_cache_evicts_least_recently_used(tmp_path):
+    cache = VoiceCache(tmp_path, engine=lambda text, lang, voice: b'x' * 100, engine_name='stub', max_bytes=250)
+    first, _ = cache.render('satu', 'id', 'com')
+    second, _ = cache.render('dua', 'id', 'com')
+    os.utime(second, ns=(1, 1))  # make "dua" the oldest, then touch "satu" via a cache hit
+    assert cache.get(first.name) == first
+    cache.render('tiga', 'id', 'com')
+    assert first.exists() and not second.exists()
+
+
+def test_voice_cache_recounts_files_written_by_other_processes(tmp_path):
+    def engine(text, lang, voice):
+        return b'x' * 100
+
+    worker = VoiceCache(tmp_path, engine=engine, engine_name='stub', max_bytes=250, rescan_interval=0)
+    other = VoiceCache(tmp_path, engine=engine, engine_name='stub', max_bytes=250)
+    other.render('satu', 'id', 'com')
+    other.render('dua', 'id', 'com')
+    worker.render('tiga', 'id', 'com')  # its own count is only 100, but the directory now holds 300
+    assert sum(path.stat().st_size for path in tmp_path.glob('*.mp3')) <= 250
+    assert worker.get(worker.key('tiga', 'id', 'com')) is not None
@@ -0,0 +1,51 @@
+"""Read-side view of the variant manifest written by scripts/build_assets.py."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+MANIFEST_NAME = "manifest.json"
+
+
+class AssetManifest:
+    """Maps a source background name to its content-hashed variants, reloading when the manifest changes."""
+
+    def __init__(self, directory: Path, url_prefix: str = "/variants"):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.version = "0"
+        self._entries: dict[str, list[dict[str, Any]]] = {}
+        self._mtime_ns: int | None = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        path = self.directory / MANIFEST_NAME
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns:
+            return
+        raw = json.loads(path.read_text(encoding="utf-8")) if mtime_ns is not None else {}
+        self._entries = {
+            source: sorted(
+                (
+                    {"name": name, "url": f"{self.url_prefix}/{v['file']}", **{k: v[k] for k in v if k != "file"}}
+                    for name, v in entry["variants"].items()
+                ),
+                key=lambda v: v["width"],
+            )
+            for source, entry in raw.items()
+        }
+        self._mtime_ns = mtime_ns
+        self.version = str(mtime_ns or 0)
+
+    def variants(self, source: str | None) -> list[dict[str, Any]]:
+        """Variants of ``source`` ordered smallest first, or ``[]`` when it has not been built."""
+        return self._entries.get(source or "", [])
+
+    def with_variants(self, scene: dict[str, Any] | None) -> dict[str, Any] | None:
+        if scene is None:
+            return None
+        return {**scene, "background_variants": self.variants(scene.get("background"))}
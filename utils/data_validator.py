@@ -1,7 +1,161 @@
 """JSON data validation helpers."""
-from typing import Any
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable
+
+SCENE_SCHEMA: dict[str, type | tuple[type, ...]] = {"id": str, "chapter": int, "dialogue": str, "choices": list}
+CHOICE_SCHEMA: dict[str, type | tuple[type, ...]] = {"id": str, "text": str, "next_scene": (str, type(None))}
 
 
 def validate_scene(scene: dict[str, Any]) -> bool:
     required = ["id", "chapter", "dialogue", "choices"]
     return all(key in scene for key in required)
+
+
+def _type_errors(data: dict[str, Any], schema: dict[str, Any], where: str) -> list[str]:
+    errors = []
+    for key, expected in schema.items():
+        if key not in data:
+            errors.append(f"{where}: field {key!r} wajib ada")
+        elif not isinstance(data[key], expected) or isinstance(data[key], bool):
+            errors.append(f"{where}: field {key!r} bertipe salah")
+    return errors
+
+
+def scene_errors(scene: dict[str, Any], where: str) -> list[str]:
+    """Schema problems of one scene, including duplicate choice ids within it."""
+    errors = _type_errors(scene, SCENE_SCHEMA, where)
+    where = f"{where}/{scene.get('id', '?')}"
+    seen: set[str] = set()
+    choices = scene.get("choices")
+    for n, choice in enumerate(choices if isinstance(choices, list) else []):  # a non-list is a type error above
+        if not isinstance(choice, dict):
+            errors.append(f"{where}: choice #{n} bukan object")
+            continue
+        errors += _type_errors(choice, CHOICE_SCHEMA, f"{where}/{choice.get('id', f'#{n}')}")
+        if isinstance(choice.get("id"), str):  # any other id is a type error above
+            if choice["id"] in seen:
+                errors.append(f"{where}: choice id {choice['id']!r} duplikat")
+            seen.add(choice["id"])
+        changes = choice.get("stat_changes", {})
+        if not isinstance(changes, dict) or not all(isinstance(v, int) for v in changes.values()):
+            errors.append(f"{where}/{choice.get('id')}: stat_changes harus berisi angka bulat")
+    if not isinstance(scene.get("set_flags", {}), dict):
+        errors.append(f"{where}: set_flags harus berupa object")
+    return errors
+
+
+def check_chapter(path: Path) -> tuple[list[dict[str, Any]], list[str]]:
+    """Parse one chapter file and return ``(scenes, errors)``; runs in a worker process."""
+    try:
+        scenes = json.loads(path.read_text(encoding="utf-8")).get("scenes", [])
+    except (OSError, ValueError, AttributeError) as exc:
+        return [], [f"{path.name}: tidak bisa dibaca ({exc})"]
+    errors: list[str] = []
+    for scene in scenes:
+        errors += scene_errors(scene, path.name) if isinstance(scene, dict) else [f"{path.name}: scene bukan object"]
+    return [scene for scene in scenes if isinstance(scene, dict)], errors
+
+
+@dataclass
+class StoryReport:
+    scenes: dict[str, dict[str, Any]] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def reachable_scenes(scenes: dict[str, dict[str, Any]], start: str) -> set[str]:
+    seen = {start} if start in scenes else set()
+    queue = deque(seen)
+    while queue:
+        choices = scenes[queue.popleft()].get("choices")
+        # Malformed choices are reported by scene_errors; here they just lead nowhere.
+        for choice in choices if isinstance(choices, list) else ():
+            if not isinstance(choice, dict):
+                continue
+            target = choice.get("next_scene")
+            if isinstance(target, str) and target in scenes and target not in seen:
+                seen.add(target)
+                queue.append(target)
+    return seen
+
+
+def validate_story(
+    chapter_files: Iterable[Path],
+    start_scene: str,
+    achievements: dict[str, Any],
+    endings: dict[str, Any],
+    terminal_scenes: Iterable[str] = (),
+    workers: int | None = None,
+) -> StoryReport:
+    """Validate every chapter (in parallel) and then the story graph as a whole.
+
+    Errors break the game at runtime (bad schema, duplicate ids, dangling ``next_scene``);
+    warnings are content that can never be seen (unreachable scenes, stats or flags that
+    achievements and endings test but no scene ever changes).
+    """
+    files = sorted(chapter_files)
+    report = StoryReport()
+    if workers == 1:
+        results = list(map(check_chapter, files))
+    else:
+        # Imported here so app.py's eventlet.monkey_patch() runs first; an unpatched selector in
+        # the pool's result thread would block the whole hub.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(check_chapter, files))
+
+    for path, (scenes, errors) in zip(files, results):
+        report.errors += errors
+        for scene in scenes:
+            if not isinstance(scene.get("id"), str):  # already a type error from scene_errors
+                continue
+            if scene.get("id") in report.scenes:
+                report.errors.append(f"{path.name}: scene id {scene['id']!r} duplikat")
+            report.scenes[scene.get("id")] = scene
+
+    terminal = set(terminal_scenes)
+    changed_stats: set[str] = set()
+    set_flags: set[str] = set()
+    # Containers of the wrong type were reported by scene_errors; they are skipped here.
+    for scene_id, scene in report.scenes.items():
+        if isinstance(scene.get("set_flags"), dict):
+            set_flags.update(scene["set_flags"])
+        choices = scene.get("choices")
+        for choice in choices if isinstance(choices, list) else ():
+            if not isinstance(choice, dict):
+                continue
+            if isinstance(choice.get("stat_changes"), dict):
+                changed_stats.update(choice["stat_changes"])
+            target = choice.get("next_scene")
+            if not isinstance(target, (str, type(None))):
+                continue
+            if target is not None and target not in report.scenes and target not in terminal:
+                report.errors.append(f"{scene_id}/{choice.get('id')}: next_scene {target!r} tidak ditemukan")
+
+    if start_scene not in report.scenes:
+        report.errors.append(f"scene awal {start_scene!r} tidak ditemukan")
+    unreachable = sorted(set(report.scenes) - reachable_scenes(report.scenes, start_scene))
+    report.warnings += [f"{scene_id}: tidak bisa dicapai dari {start_scene}" for scene_id in unreachable]
+
+    for key, data in achievements.items():
+        stat = data.get("rule", {}).get("stat")
+        if stat and stat not in changed_stats:
+            report.warnings.append(f"achievement {key}: stat {stat!r} tidak pernah diubah pilihan mana pun")
+    for key, data in endings.items():
+        requirements = data.get("requirements", {})
+        for stat in sorted(set(requirements.get("stats", {})) - changed_stats):
+            report.warnings.append(f"ending {key}: stat {stat!r} tidak pernah diubah pilihan mana pun")
+        for flag in sorted(set(requirements.get("flags", {})) - set_flags):
+            report.warnings.append(f"ending {key}: flag {flag!r} tidak pernah di-set scene mana pun")
+    return report
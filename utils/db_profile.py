@@ -0,0 +1,92 @@
+"""``sqlite-tuned`` database profile: WAL pragmas, eventlet-friendly pools and a read-only pool.
+
+Every connection gets WAL, ``synchronous=NORMAL``, a busy timeout and mmap through a ``connect``
+hook. Writers share a small fixed pool: SQLite admits one writer at a time anyway, and a
+greenthread waiting on the pool yields to the hub, whereas one waiting inside SQLite's busy
+handler stalls it. Keep it above one, since a request can hold a connection while the write-behind
+flush needs another. Views wrapped in :func:`read_only` run on a separate pool of ``query_only``
+connections, which WAL lets read while a write is in progress.
+"""
+from __future__ import annotations
+
+from functools import wraps
+from typing import Any, Callable
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+READ_BIND = "read"
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("cache_size", -16000),  # KiB
+)
+
+
+def supports_profile(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def sqlite_config(uri: str, write_pool: int = 4, read_pool: int = 8, pool_timeout: float = 30) -> dict[str, Any]:
+    """Flask-SQLAlchemy settings for the primary engine and the ``read`` bind."""
+    return {
+        "SQLALCHEMY_ENGINE_OPTIONS": {
+            "poolclass": QueuePool,
+            "pool_size": write_pool,
+            "max_overflow": 0,
+            "pool_timeout": pool_timeout,
+        },
+        "SQLALCHEMY_BINDS": {
+            READ_BIND: {
+                "url": uri,
+                "poolclass": QueuePool,
+                "pool_size": read_pool,
+                "max_overflow": 0,
+                "pool_timeout": pool_timeout,
+            },
+        },
+    }
+
+
+def install_pragmas(engine: Engine, read_only: bool = False) -> None:
+    pragmas = PRAGMAS + ((("query_only", "ON"),) if read_only else ())
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+class RoutingSession(Session):
+    """Sends everything but flushes to the ``read`` bind while a :func:`read_only` view runs."""
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, bind: Any = None, **kwargs: Any) -> Any:
+        if bind is None and not self._flushing and has_app_context() and g.get("db_read_only"):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Route this view's queries to the read pool; put it above ``login_required`` so the user lookup is too."""
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # Reset afterwards: an app context (and its g) can outlive one request, e.g. in tests.
+        g.db_read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.db_read_only = False
+
+    return wrapper
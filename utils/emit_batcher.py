@@ -0,0 +1,47 @@
+"""Coalesce Socket.IO events per room into a single ``batch`` frame."""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import eventlet
+
+BATCH_EVENT = "batch"
+
+
+class EmitBatcher:
+    def __init__(self, socketio: Any, tick: float = 0.02, enabled: bool = True):
+        self.socketio = socketio
+        self.tick = tick
+        self.enabled = enabled
+        self._pending: dict[str, list[dict[str, Any]]] = {}
+        self._scheduled: Any = None
+        self.stats = {"events": 0, "frames": 0}
+        self.on_emit: Callable[[str], None] | None = None
+
+    def emit(self, event: str, data: Any, room: str) -> None:
+        """Queue ``event`` for ``room``; it is sent on the next :meth:`flush` or after one tick."""
+        self.stats["events"] += 1
+        if self.on_emit is not None:
+            self.on_emit(event)
+        if not self.enabled:
+            self.stats["frames"] += 1
+            self.socketio.emit(event, data, room=room)
+            return
+
+        self._pending.setdefault(room, []).append({"event": event, "data": data})
+        if self._scheduled is None:
+            self._scheduled = eventlet.spawn_after(self.tick, self.flush)
+
+    def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        scheduled, self._scheduled = self._scheduled, None
+        if scheduled is not None:
+            scheduled.cancel()  # no-op when the scheduled flush is the one running
+        for room, events in pending.items():
+            # A lone event keeps its own name so simple listeners still work.
+            if len(events) == 1:
+                self.socketio.emit(events[0]["event"], events[0]["data"], room=room)
+            else:
+                self.socketio.emit(BATCH_EVENT, events, room=room)
+        self.stats["frames"] += len(pending)
+        return len(pending)
@@ -0,0 +1,35 @@
+"""Pre-encoded response bodies with strong ETags and compressed variants."""
+from __future__ import annotations
+
+import gzip
+import hashlib
+from typing import Any
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Preferred order when the client accepts several encodings.
+ENCODINGS = ("br", "gzip")
+
+
+def encode_variants(body: bytes) -> dict[str, Any]:
+    """Return ``{"etag": ..., "identity": body, "gzip": ..., "br": ...}`` for one response body."""
+    variants: dict[str, Any] = {
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    return variants
+
+
+def pick_variant(variants: dict[str, Any], accept_encodings: Any) -> tuple[str, bytes, str]:
+    """Choose the smallest acceptable encoding and return ``(encoding, body, etag)``."""
+    for encoding in ENCODINGS:
+        body = variants.get(encoding)
+        if body is not None and accept_encodings[encoding] and len(body) < len(variants["identity"]):
+            return encoding, body, f"{variants['etag']}-{encoding}"
+    return "identity", variants["identity"], variants["etag"]
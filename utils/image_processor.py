@@ -1,7 +1,58 @@
 """Image processing utility."""
+from __future__ import annotations
+
+import hashlib
+import io
+from pathlib import Path
+from typing import Any, NamedTuple
+
 from PIL import Image, ImageOps
 
 
+class Variant(NamedTuple):
+    name: str
+    width: int
+    height: int
+    format: str
+    quality: int = 80
+
+
+# Largest first: each variant is fitted from the previous one, so the source is decoded only once.
+BACKGROUND_VARIANTS = (
+    Variant("1280w", 1280, 720, "WEBP"),
+    Variant("640w", 640, 360, "WEBP"),
+    Variant("thumb", 256, 144, "WEBP", 60),
+)
+
+
 def resize_image(source: str, output: str, width: int, height: int) -> None:
     img = Image.open(source)
     ImageOps.fit(img, (width, height)).save(output)
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def render_variants(source: Path, out_dir: Path, variants: tuple[Variant, ...] = BACKGROUND_VARIANTS) -> dict[str, Any]:
+    """Decode ``source`` once and write every variant under a content-hashed file name."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rendered: dict[str, Any] = {}
+    with Image.open(source) as img:
+        current = img.convert("RGB")
+    for variant in variants:
+        current = ImageOps.fit(current, (variant.width, variant.height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        current.save(buffer, variant.format, quality=variant.quality, method=4)
+        data = buffer.getvalue()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        name = f"{source.stem}.{variant.name}.{digest}.{variant.format.lower()}"
+        (out_dir / name).write_bytes(data)
+        rendered[variant.name] = {
+            "file": name,
+            "width": variant.width,
+            "height": variant.height,
+            "format": variant.format.lower(),
+            "bytes": len(data),
+        }
+    return rendered
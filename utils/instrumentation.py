@@ -0,0 +1,208 @@
+"""Per-endpoint request metrics in Prometheus text format, plus an opt-in sampling profiler.
+
+Each request records its latency, SQL query count and time (SQLAlchemy cursor events), JSON
+encoding time and Socket.IO emits. Counters live in the process, so with serve.py every worker
+reports its own numbers. The profiler's CPU timer is started on the first request of each process:
+interval timers are not inherited across ``fork()``, so one started when serve.py's master imports
+the app would never fire in the workers.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import signal
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Callable
+
+import greenlet
+from flask import Flask, Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines, running = [], 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            running += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class SamplingProfiler:
+    """SIGPROF-driven stack sampler; samples are kept only for greenlets that are being profiled.
+
+    Under eventlet every request shares the main OS thread, so a sample is attributed to the
+    greenlet that was running when the CPU timer fired.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._active: dict[Any, Counter[str]] = {}
+        self._pid: int | None = None
+
+    def start(self) -> None:
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        if self._pid is None:
+            # Left running, the timer would kill the interpreter once shutdown resets SIGPROF to default.
+            atexit.register(self.stop)
+        self._pid = os.getpid()
+
+    def ensure_started(self) -> None:
+        """Start the timer unless it already runs in this process (a forked child has none)."""
+        if self._pid != os.getpid():
+            self.start()
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+
+    def _sample(self, signum: int, frame: Any) -> None:
+        samples = self._active.get(greenlet.getcurrent())
+        if samples is None or frame is None:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        samples[";".join(reversed(stack))] += 1
+
+    def begin(self) -> None:
+        self._active[greenlet.getcurrent()] = Counter()
+
+    def end(self) -> Counter[str]:
+        return self._active.pop(greenlet.getcurrent(), Counter())
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context() and "metrics_json" in g:
+                g.metrics_json += time.perf_counter() - started
+
+
+class Instrumentation:
+    def __init__(self, app: Flask, profile_dir: Path, slow_ms: float = 0, sample_interval: float = 0.005):
+        self.latency: dict[str, Histogram] = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries: dict[str, Histogram] = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.requests: Counter[tuple[str, str, int]] = Counter()
+        self.db_seconds: Counter[str] = Counter()
+        self.json_seconds: Counter[str] = Counter()
+        self.emits: Counter[str] = Counter()
+        self.request_emits: Counter[str] = Counter()
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.profile_dir = profile_dir
+        self.slow_ms = slow_ms
+        self.profiler = SamplingProfiler(sample_interval) if slow_ms > 0 else None
+
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        event.listen(Engine, "before_cursor_execute", self._before_query)
+        event.listen(Engine, "after_cursor_execute", self._after_query)
+
+    def _before(self) -> None:
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db = 0.0
+        g.metrics_json = 0.0
+        g.metrics_emits = 0
+        if self.profiler is not None:
+            self.profiler.ensure_started()
+            self.profiler.begin()
+
+    def _teardown(self, exc: BaseException | None) -> None:
+        if "metrics_start" not in g:
+            return
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or "unmatched"
+        status = 500 if exc is not None else getattr(g, "metrics_status", 200)
+        self.latency[endpoint].observe(elapsed)
+        self.queries[endpoint].observe(g.metrics_queries)
+        self.requests[(endpoint, request.method, status)] += 1
+        self.db_seconds[endpoint] += g.metrics_db
+        self.json_seconds[endpoint] += g.metrics_json
+        self.request_emits[endpoint] += g.metrics_emits
+        if self.profiler is not None:
+            samples = self.profiler.end()
+            if elapsed * 1000 >= self.slow_ms and samples:
+                self._dump_profile(endpoint, elapsed, samples)
+
+    def _dump_profile(self, endpoint: str, elapsed: float, samples: Counter[str]) -> None:
+        """Write collapsed stacks (flamegraph.pl / speedscope input) for one slow request."""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / f"{int(time.time() * 1000)}-{endpoint}-{elapsed * 1000:.0f}ms.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()), encoding="utf-8")
+
+    def _before_query(self, conn: Any, cursor: Any, statement: str, params: Any, context: Any, many: bool) -> None:
+        if has_request_context() and "metrics_start" in g:
+            context._metrics_started = time.perf_counter()
+
+    def _after_query(self, conn: Any, cursor: Any, statement: str, params: Any, context: Any, many: bool) -> None:
+        started = getattr(context, "_metrics_started", None)
+        if started is not None and has_request_context():
+            g.metrics_queries += 1
+            g.metrics_db += time.perf_counter() - started
+
+    def _after(self, response: Response) -> Response:
+        g.metrics_status = response.status_code
+        return response
+
+    def record_emit(self, event_name: str) -> None:
+        self.emits[event_name] += 1
+        if has_request_context() and "metrics_emits" in g:
+            g.metrics_emits += 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP vn_request_duration_seconds Request latency per endpoint.",
+            "# TYPE vn_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.latency.items()):
+            lines += histogram.render("vn_request_duration_seconds", f'endpoint="{endpoint}"')
+        lines += [
+            "# HELP vn_db_queries_per_request SQL statements per request.",
+            "# TYPE vn_db_queries_per_request histogram",
+        ]
+        for endpoint, histogram in sorted(self.queries.items()):
+            lines += histogram.render("vn_db_queries_per_request", f'endpoint="{endpoint}"')
+        lines += ["# HELP vn_requests_total Finished requests.", "# TYPE vn_requests_total counter"]
+        for (endpoint, method, status), count in sorted(self.requests.items()):
+            lines.append(f'vn_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+        for name, help_text, values in (
+            ("vn_db_seconds_total", "Time spent executing SQL.", self.db_seconds),
+            ("vn_json_seconds_total", "Time spent encoding JSON responses.", self.json_seconds),
+            ("vn_request_emits_total", "Socket.IO events emitted while handling requests.", self.request_emits),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{endpoint="{ep}"}} {round(value, 6)}' for ep, value in sorted(values.items())]
+        lines += ["# HELP vn_socketio_emits_total Socket.IO events emitted.", "# TYPE vn_socketio_emits_total counter"]
+        lines += [f'vn_socketio_emits_total{{event="{name}"}} {count}' for name, count in sorted(self.emits.items())]
+        for name, read in sorted(self.gauges.items()):
+            lines += [f"# TYPE {name} gauge", f"{name} {read()}"]
+        return "\n".join(lines) + "\n"
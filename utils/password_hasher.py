@@ -0,0 +1,50 @@
+"""Password hashing on real OS threads so PBKDF2 never blocks the eventlet hub."""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(RuntimeError):
+    """Raised instead of queueing when ``max_queue`` requests are already waiting for a thread."""
+
+
+class PasswordHasher:
+    """Bounded front for werkzeug hashing.
+
+    ``hashlib.pbkdf2_hmac`` releases the GIL, so work handed to ``eventlet.tpool`` runs in parallel
+    with the hub while the calling greenthread waits. At most ``threads`` hashes run at once and at
+    most ``max_queue`` more may wait; ``threads=0`` hashes inline, as before. tpool itself has
+    ``EVENTLET_THREADPOOL_SIZE`` (default 20) threads, so ``threads`` above that gains nothing.
+    """
+
+    def __init__(self, threads: int = 4, max_queue: int = 64):
+        self.threads = threads
+        self.max_queue = max_queue
+        self._slots = Semaphore(max(threads, 1))
+        self.waiting = 0
+        self.stats = {"hashed": 0, "verified": 0, "rejected": 0}
+
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.threads == 0:
+            return func(*args)
+        if self.waiting >= self.max_queue + self.threads:
+            self.stats["rejected"] += 1
+            raise HasherBusy("Antrean hashing password penuh")
+        self.waiting += 1
+        try:
+            with self._slots:
+                return tpool.execute(func, *args)
+        finally:
+            self.waiting -= 1
+
+    def hash(self, password: str) -> str:
+        self.stats["hashed"] += 1
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        self.stats["verified"] += 1
+        return self._run(check_password_hash, password_hash, password)
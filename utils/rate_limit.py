@@ -0,0 +1,45 @@
+"""In-process token bucket rate limiting."""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class TokenBucket:
+    """``burst`` tokens per key, refilled at ``rate`` tokens per second.
+
+    Buckets are kept in an LRU of ``max_keys`` entries; an evicted key simply starts full again.
+    Limits are per process, so with serve.py each worker enforces its own.
+    """
+
+    def __init__(
+        self, rate: float, burst: float, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def wait(self, key: Hashable, tokens: float = 1) -> float:
+        """Like :meth:`take` without spending anything."""
+        now = self.clock()
+        level, updated = self._buckets.get(key, (self.burst, now))
+        level = min(self.burst, level + (now - updated) * self.rate)
+        return 0.0 if level >= tokens else (tokens - level) / self.rate
+
+    def take(self, key: Hashable, tokens: float = 1) -> float:
+        """Spend ``tokens`` for ``key``; returns 0 when allowed, else seconds until it would be."""
+        now = self.clock()
+        level, updated = self._buckets.get(key, (self.burst, now))
+        level = min(self.burst, level + (now - updated) * self.rate)
+        if level < tokens:
+            self._buckets[key] = (level, now)
+            self._buckets.move_to_end(key)
+            return (tokens - level) / self.rate
+        self._buckets[key] = (level - tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
@@ -0,0 +1,95 @@
+"""Save export/import without temp files: a streamed zip writer and size-limited upload parsing."""
+from __future__ import annotations
+
+import json
+import zipfile
+from typing import IO, Any, Iterable, Iterator
+
+ZIP_MAGIC = b"PK\x03\x04"
+CHUNK = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class _Chunks:
+    """Write-only sink for :class:`zipfile.ZipFile`; having no ``seek`` makes it write data descriptors."""
+
+    def __init__(self) -> None:
+        self.parts: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def stream_zip(entries: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    """Yield a zip archive of ``(name, data)`` entries as they are produced; at most one entry is buffered."""
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:  # type: ignore[arg-type]
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.take()
+    yield sink.take()
+
+
+def read_limited(stream: IO[bytes], limit: int) -> bytes:
+    """Read ``stream`` in chunks, giving up as soon as more than ``limit`` bytes arrive."""
+    parts, size = [], 0
+    while chunk := stream.read(min(CHUNK, limit - size + 1)):
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(f"Lebih dari {limit} byte")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+def read_saves(stream: IO[bytes], limit: int, max_files: int) -> list[dict[str, Any]]:
+    """Exported saves from one ``.json`` export or a bulk ``.zip``; ``limit`` caps the total uncompressed size.
+
+    Raises :class:`UploadTooLarge` over the limit and :class:`ValueError` for anything malformed.
+    """
+    head = stream.read(len(ZIP_MAGIC))
+    stream.seek(0)
+    if head != ZIP_MAGIC:
+        return [_parse(read_limited(stream, limit))]
+
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as exc:
+        raise ValueError("Arsip save rusak") from exc
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if not members or len(members) > max_files:
+            raise ValueError(f"Arsip harus berisi 1-{max_files} save")
+        saves, budget = [], limit
+        for info in members:
+            # file_size comes from the archive itself, so the read is bounded as well.
+            if info.file_size > budget:
+                raise UploadTooLarge(f"Lebih dari {limit} byte setelah diekstrak")
+            try:
+                with archive.open(info) as member:
+                    raw = read_limited(member, budget)
+            except (zipfile.BadZipFile, NotImplementedError) as exc:
+                raise ValueError(f"{info.filename} tidak bisa dibaca") from exc
+            budget -= len(raw)
+            saves.append(_parse(raw))
+    return saves
+
+
+def _parse(raw: bytes) -> dict[str, Any]:
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("Bukan JSON save") from exc
+    if not isinstance(data, dict) or type(data.get("slot")) is not int or not isinstance(data.get("payload"), str):
+        raise ValueError("Save harus berisi slot (int) dan payload (string)")
+    return data
@@ -1,8 +1,119 @@
-"""Google TTS helper."""
-from gtts import gTTS
+"""Text-to-speech with a content-addressed, size-bounded audio cache.
+
+An engine is any ``(text, lang, voice) -> bytes`` callable; gTTS is the default and an
+offline engine or a test stub can be passed instead.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable
+
+Engine = Callable[[str, str, str], bytes]
+
+
+def gtts_engine(text: str, lang: str, voice: str = "com") -> bytes:
+    """Synthesize with gTTS; ``voice`` is the Google ``tld`` that selects the accent."""
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, tld=voice).write_to_fp(buffer)
+    return buffer.getvalue()
 
 
 def synthesize(text: str, lang: str, output_path: str) -> str:
-    tts = gTTS(text=text, lang=lang)
-    tts.save(output_path)
+    Path(output_path).write_bytes(gtts_engine(text, lang))
     return output_path
+
+
+class VoiceCache:
+    """Audio files named by ``sha256(engine, lang, voice, text)``, evicted least-recently-used beyond ``max_bytes``.
+
+    Several processes may share the directory, so the running size is only an estimate: it is
+    re-read from disk before every eviction and at least every ``rescan_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        engine: Engine = gtts_engine,
+        engine_name: str = "gtts",
+        max_bytes: int = 512 * 1024 * 1024,
+        suffix: str = ".mp3",
+        rescan_interval: float = 60,
+    ):
+        self.directory = directory
+        self.engine = engine
+        self.engine_name = engine_name
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+        self._evict(keep=None)
+
+    def key(self, text: str, lang: str, voice: str) -> str:
+        raw = "\0".join((self.engine_name, lang, voice, text))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + self.suffix
+
+    def get(self, name: str) -> Path | None:
+        """Cached file for a key from :meth:`key`; a hit refreshes its recency."""
+        if Path(name).name != name:
+            return None
+        path = self.directory / name
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def render(self, text: str, lang: str, voice: str) -> tuple[Path, bool]:
+        """Return ``(path, synthesized)``, calling the engine only on a miss."""
+        name = self.key(text, lang, voice)
+        cached = self.get(name)
+        if cached is not None:
+            return cached, False
+        audio = self.engine(text, lang, voice)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        path = self.directory / name
+        os.replace(tmp, path)
+        with self._lock:
+            self._total += len(audio)
+            if self._total > self.max_bytes or time.monotonic() - self._scanned_at > self.rescan_interval:
+                self._evict(keep=path)
+        return path, True
+
+    def _evict(self, keep: Path | None) -> None:
+        """Recount the directory, then delete the least recently used files until it fits."""
+        files = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another process in the meantime
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        files.sort()
+        self._total = sum(size for _, size, _ in files)
+        self._scanned_at = time.monotonic()
+        for _, size, path in files:
+            if self._total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            self._total -= size
+
+    def prerender(self, lines: Iterable[tuple[str, str, str]], workers: int = 8) -> dict[str, int]:
+        """Synthesize every distinct ``(text, lang, voice)`` on a thread pool; engines are I/O bound."""
+        unique = list(dict.fromkeys(lines))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            synthesized = sum(created for _, created in pool.map(lambda line: self.render(*line), unique))
+        return {"lines": len(unique), "synthesized": synthesized, "cached": len(unique) - synthesized}
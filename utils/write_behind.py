@@ -0,0 +1,85 @@
+"""Coalescing write-behind queue flushed from a background greenlet."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+import eventlet
+from eventlet import greenthread
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    def __init__(self, flush: Callable[[dict[Hashable, Any]], None], window: float = 0.5):
+        self._flush = flush
+        self.window = window
+        self._pending: dict[Hashable, Any] = {}
+        # Held for the whole flush so readers that flush first see every in-flight write committed.
+        self._lock = threading.Lock()
+        self._worker: Any = None
+        self.stats = {
+            "queued": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "flushed": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def put(self, key: Hashable, value: dict[str, Any], merge: bool = False) -> None:
+        """Queue ``value`` for ``key``; a pending value is replaced, or updated when ``merge`` is set."""
+        if self._worker is None:
+            self.start()
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = dict(value)
+        else:
+            self.stats["coalesced"] += 1
+            if merge:
+                pending.update(value)
+            else:
+                self._pending[key] = dict(value)
+        self.stats["queued"] += 1
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                self._flush(batch)
+            except Exception:
+                # Put the batch back unless newer writes for the same keys arrived meanwhile.
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                raise
+            elapsed = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["flushed"] += len(batch)
+        self.stats["last_flush_ms"] = elapsed
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed)
+        return len(batch)
+
+    def _run(self) -> None:
+        while self._worker is greenthread.getcurrent():
+            eventlet.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush gagal, dicoba lagi pada tick berikutnya")
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+
+    def stop(self) -> None:
+        # The worker exits after its current tick; flushing here waits for any batch it holds.
+        self._worker = None
+        self.flush()
+
+    def metrics(self) -> dict[str, Any]:
+        return {"depth": len(self._pending), "window_s": self.window, **self.stats}